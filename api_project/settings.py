@@ -2,6 +2,7 @@ from datetime import timedelta
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,6 +38,9 @@ DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="noreply@example.com")
 
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -48,6 +52,44 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
+# Request instrumentation (core/middleware.py); False removes the middleware entirely
+PERF_INSTRUMENTATION = config("PERF_INSTRUMENTATION", default=True, cast=bool)
+# Server-Timing exposes query counts and timings to every client, so it is on only in development
+PERF_SERVER_TIMING = config("PERF_SERVER_TIMING", default=DEBUG, cast=bool)
+PERF_SLOW_REQUEST_MS = config("PERF_SLOW_REQUEST_MS", default=500, cast=int)
+# Slow requests go here (stderr when empty); per-request lines log at INFO outside DEBUG
+PERF_SLOW_LOG_FILE = config("PERF_SLOW_LOG_FILE", default="")
+PERF_LOG_LEVEL = config("PERF_LOG_LEVEL", default="WARNING" if DEBUG else "INFO")
+
+# On-demand profiling of admin requests (core/profiling.py); False removes the middleware entirely
+PROFILING_ENABLED = config("PROFILING_ENABLED", default=True, cast=bool)
+PROFILE_TOKEN_MAX_AGE = config("PROFILE_TOKEN_MAX_AGE", default=3600, cast=int)
+PROFILE_MAX_STORED = config("PROFILE_MAX_STORED", default=50, cast=int)
+PROFILE_MAX_QUERIES = config("PROFILE_MAX_QUERIES", default=500, cast=int)
+
+# /metrics (core/metrics.py). With several worker processes set METRICS_DIR to a directory they
+# share (emptied on deploy) so every worker's samples are summed. The endpoint is opt-in: it answers
+# 404 until METRICS_TOKEN is set, and then only to "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_DIR = config("METRICS_DIR", default="")
+METRICS_FLUSH_SECONDS = config("METRICS_FLUSH_SECONDS", default=1, cast=float)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "slow_requests": (
+            {"class": "logging.FileHandler", "filename": PERF_SLOW_LOG_FILE}
+            if PERF_SLOW_LOG_FILE else {"class": "logging.StreamHandler"}
+        ),
+    },
+    "loggers": {
+        "core.performance": {"handlers": ["console"], "level": PERF_LOG_LEVEL, "propagate": False},
+        "core.performance.slow": {"handlers": ["slow_requests"], "level": "WARNING", "propagate": False},
+    },
+}
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -61,11 +103,14 @@ if not DEBUG:
     
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.RoleClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': config("API_PAGE_SIZE", default=50, cast=int),
+    'MAX_PAGE_SIZE': config("API_MAX_PAGE_SIZE", default=200, cast=int),
 }
 
 
@@ -91,18 +136,46 @@ WSGI_APPLICATION = 'api_project.wsgi.application'
 
 # Database configuration
 
-if DJANGO_LOCAL:
-    DATABASES = {
-        "default": dj_database_url.parse(config("DATABASE_URL"))
-    }
-else:
-    DATABASES = {
-        "default": dj_database_url.parse(
-            config("DATABASE_URL"),
-            conn_max_age=600,
-            ssl_require=True
-        )
-    }
+# psycopg 3 connection pool per process (PostgreSQL only); replaces persistent connections
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", default=2, cast=int)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", default=10, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=10, cast=float)
+
+
+def _database(url):
+    if DJANGO_LOCAL:
+        database = dj_database_url.parse(url)
+    else:
+        database = dj_database_url.parse(url, conn_max_age=600, ssl_require=True)
+    if DB_POOL and database["ENGINE"] == "django.db.backends.postgresql":
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured("DB_POOL=True needs the psycopg-pool package (pip install 'psycopg[pool]').")
+        database["CONN_MAX_AGE"] = 0
+        database.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE, "timeout": DB_POOL_TIMEOUT,
+        }
+    return database
+
+
+DATABASES = {"default": _database(config("DATABASE_URL"))}
+
+# Read replicas (comma-separated URLs) become aliases replica1, replica2, ...; core.db_routers
+# sends catalog reads of safe requests there. Tests read the replicas through the test database.
+DATABASE_REPLICAS = []
+for index, url in enumerate(config("DATABASE_REPLICA_URLS", default="", cast=Csv()), start=1):
+    DATABASE_REPLICAS.append(f"replica{index}")
+    DATABASES[f"replica{index}"] = {**_database(url), "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["core.db_routers.ReplicaRouter"]
+# Seconds a user's reads stay on the primary after they write; needs a cache shared by all workers
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+
+# SQLite's shared in-memory test database reports lock contention as errors
+# instead of waiting, so concurrency tests run against a file instead.
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -123,8 +196,31 @@ AUTH_PASSWORD_VALIDATORS = [
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.authentication.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.authentication.RoleTokenRefreshSerializer',
 }
 
+# Shared cache: locmem suits one dev process; with several gunicorn workers use
+# django.core.cache.backends.filebased.FileBasedCache (LOCATION = a directory) or
+# django.core.cache.backends.db.DatabaseCache (LOCATION = a table; run createcachetable)
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="lightpath-lite"),
+    }
+}
+
+# Seconds a cached route/trip response lives (writes invalidate it sooner)
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=300, cast=int)
+# ...and a trip search filtered on ?has_seats=, whose matches move with ticket sales
+RESPONSE_CACHE_SEATS_TTL = config("RESPONSE_CACHE_SEATS_TTL", default=15, cast=int)
+
+# Admin changelists show planner estimates instead of COUNT(*) above this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config("ADMIN_ESTIMATED_COUNT_THRESHOLD", default=10000, cast=int)
+
+# Seconds the slim projection of an authenticated user (ids, role, token version) stays cached
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=300, cast=int)
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -144,6 +240,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 OPENWEATHER_API_KEY = config('OPENWEATHER_API_KEY', default='')
 
+# Weather client (core/services.py); use core.services.StubWeatherBackend offline
+WEATHER_BACKEND = config("WEATHER_BACKEND", default="core.services.OpenWeatherBackend")
+WEATHER_TIMEOUT = (
+    config("WEATHER_CONNECT_TIMEOUT", default=2.0, cast=float),
+    config("WEATHER_READ_TIMEOUT", default=3.0, cast=float),
+)
+WEATHER_POOL_SIZE = config("WEATHER_POOL_SIZE", default=10, cast=int)
+WEATHER_CACHE_TTL = config("WEATHER_CACHE_TTL", default=600, cast=int)
+WEATHER_STALE_TTL = config("WEATHER_STALE_TTL", default=3600, cast=int)
+DEFAULT_CITY = config("DEFAULT_CITY", default="Accra")
+WEATHER_LATITUDE = config("WEATHER_LATITUDE", default=5.6037, cast=float)
+WEATHER_LONGITUDE = config("WEATHER_LONGITUDE", default=-0.1870, cast=float)
+WEATHER_INGEST_INTERVAL = config("WEATHER_INGEST_INTERVAL", default=900, cast=int)
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
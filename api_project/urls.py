@@ -3,7 +3,7 @@ from django.urls import path, include
 from django.http import HttpResponse, JsonResponse
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from core.views import AdminRouteListCreateView, RouteListCreateView, home
+from core.views import AdminRouteListCreateView, RouteListCreateView, home, metrics
 
 def index(request):
     return HttpResponse("Hey, there! Welcome to LightPath-Lite API!")
@@ -33,4 +33,7 @@ urlpatterns = [
 
     # API root
     path("api/", api_root, name="api_root"),
+
+    # Prometheus scrape target
+    path("metrics", metrics, name="metrics"),
 ]
@@ -1,6 +1,65 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import (User, Role, Passenger, Conductor, Bus, Route, Trip, Booking, Payment, Ticket, Weather)
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import (User, Role, Passenger, Conductor, Bus, Route, Trip, Booking, Payment, Ticket, Weather, SeatInventory, EmailOutbox,
+                     RouteRevenueDaily, RequestProfile)
+
+
+def estimated_count(queryset):
+    """
+    Planner statistics for an unfiltered table instead of COUNT(*), or None
+    where the backend has no cheap estimate.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+        elif connection.vendor == "sqlite":
+            # Rowids only grow, so the largest one bounds the row count via the index
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(model._meta.db_table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Changelist paginator that skips COUNT(*) on large, unfiltered tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 10000):
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Defaults for tables that grow with traffic: estimated counts, no
+    second "N total" count when filtering, and a modest page size.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PaymentStatusFilter(admin.SimpleListFilter):
+    # Static choices: no SELECT DISTINCT over payments on every changelist
+    title = "status"
+    parameter_name = "status"
+
+    def lookups(self, request, model_admin):
+        return Payment.STATUS_CHOICES
+
+    def queryset(self, request, queryset):
+        return queryset.filter(status=self.value()) if self.value() else queryset
 
 
 @admin.register(User)
@@ -8,9 +67,12 @@ class CustomUserAdmin(UserAdmin):
     model = User
     list_display = ("email", "role", "is_staff", "is_active", "date_joined")
     list_filter = ("role", "is_staff", "is_active")
+    list_select_related = ("role",)
     search_fields = ("email",)
     ordering = ("email",)
     readonly_fields = ("date_joined",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Role)
@@ -20,61 +82,107 @@ class RoleAdmin(admin.ModelAdmin):
 
 
 @admin.register(Passenger)
-class PassengerAdmin(admin.ModelAdmin):
+class PassengerAdmin(LargeTableAdmin):
     list_display = ("passenger_id", "user", "full_name", "username", "contact_number")
+    list_select_related = ("user",)
     search_fields = ("full_name", "username", "user__email")
+    raw_id_fields = ("user",)
 
 
 @admin.register(Conductor)
-class ConductorAdmin(admin.ModelAdmin):
+class ConductorAdmin(LargeTableAdmin):
     list_display = ("conductor_id", "user", "full_name", "contact_number")
-    search_fields = ("full_name", "user__email")
+    list_select_related = ("user",)
+    search_fields = ("full_name", "user__email", "employee_id")
+    raw_id_fields = ("user",)
 
 
 @admin.register(Bus)
-class BusAdmin(admin.ModelAdmin):
+class BusAdmin(LargeTableAdmin):
     list_display = ("bus_id", "registration_number", "capacity", "conductor")
+    list_select_related = ("conductor",)
     search_fields = ("registration_number", "conductor__full_name")
-    list_filter = ("conductor",)
+    autocomplete_fields = ("conductor",)
 
 
 @admin.register(Route)
-class RouteAdmin(admin.ModelAdmin):
+class RouteAdmin(LargeTableAdmin):
     list_display = ("route_id", "name", "start_point", "end_point")
     search_fields = ("name", "start_point", "end_point")
 
 
 @admin.register(Weather)
-class WeatherAdmin(admin.ModelAdmin):
+class WeatherAdmin(LargeTableAdmin):
     list_display = ("weather_id", "condition", "temperature", "timestamp")
     search_fields = ("condition",)
     list_filter = ("condition",)
+    date_hierarchy = "timestamp"
 
 
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(LargeTableAdmin):
     list_display = ("trip_id", "route", "bus", "conductor", "weather", "start_time", "end_time")
+    list_select_related = ("route", "bus", "conductor", "weather")
     search_fields = ("route__name", "bus__registration_number", "conductor__full_name")
-    list_filter = ("route", "conductor", "bus")
+    autocomplete_fields = ("route", "bus", "conductor", "weather")
+    date_hierarchy = "start_time"
+
+
+@admin.register(SeatInventory)
+class SeatInventoryAdmin(LargeTableAdmin):
+    list_display = ("trip", "capacity", "seats_sold")
+    list_select_related = ("trip__route",)
+    readonly_fields = ("seat_map",)
+    raw_id_fields = ("trip",)
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ("booking_id", "passenger", "trip", "booking_time")
+    list_select_related = ("passenger", "trip__route")
     search_fields = ("passenger__full_name", "trip__route__name")
-    list_filter = ("trip",)
+    autocomplete_fields = ("passenger", "trip")
+    date_hierarchy = "booking_time"
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = ("payment_id", "booking", "amount", "status", "payment_date")
+    list_select_related = ("booking__passenger",)
     search_fields = ("booking__passenger__full_name",)
-    list_filter = ("status",)
+    list_filter = (PaymentStatusFilter,)
+    raw_id_fields = ("booking",)
+    date_hierarchy = "payment_date"
 
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
-    list_display = ("ticket_id", "booking", "seat_number")
+class TicketAdmin(LargeTableAdmin):
+    list_display = ("ticket_id", "booking", "trip", "seat_number")
+    list_select_related = ("booking__passenger", "trip__route")
     search_fields = ("booking__passenger__full_name", "seat_number")
-    list_filter = ("booking__trip",)
+    raw_id_fields = ("booking", "trip")
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(LargeTableAdmin):
+    list_display = ("outbox_id", "recipient", "subject", "created_at", "sent_at", "attempts")
+    search_fields = ("recipient",)
+    readonly_fields = ("created_at",)
+    date_hierarchy = "created_at"
+
+
+@admin.register(RouteRevenueDaily)
+class RouteRevenueDailyAdmin(admin.ModelAdmin):
+    list_display = ("day", "route", "status", "amount", "payments")
+    list_filter = ("status",)
+    list_select_related = ("route",)
+    date_hierarchy = "day"
+
 
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ("profile_id", "method", "path", "status_code", "duration_ms", "query_count", "user", "created_at")
+    list_select_related = ("user",)
+    search_fields = ("path", "view_name")
+    exclude = ("stats", "queries")
+    readonly_fields = ("user", "method", "path", "view_name", "status_code", "duration_ms", "query_count", "created_at")
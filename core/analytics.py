@@ -0,0 +1,154 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, FloatField, Sum
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from . import response_cache
+from .models import Payment, RouteRevenueDaily, SeatInventory, Ticket, Trip
+
+
+# Incremental revenue rollup (RouteRevenueDaily)
+def stored_payment_key(payment_id):
+    """
+    The rollup bucket and amount a stored payment counts towards, as
+    ((route_id, day, status), amount), or None if it is not stored.
+    """
+    row = Payment.objects.filter(pk=payment_id).values_list(
+        "booking__trip__route_id", "payment_date", "status", "amount"
+    ).first()
+    if row is None:
+        return None
+    route_id, paid_at, status, amount = row
+    return (route_id, timezone.localdate(paid_at), status), amount
+
+
+def bump(key, amount, payments):
+    """Add to one rollup bucket, creating it unless this is a decrement."""
+    route_id, day, status = key
+    bucket = RouteRevenueDaily.objects.filter(route_id=route_id, day=day, status=status)
+    if bucket.update(amount=F("amount") + amount, payments=F("payments") + payments) or payments < 0:
+        return
+    try:
+        with transaction.atomic():
+            RouteRevenueDaily.objects.create(
+                route_id=route_id, day=day, status=status, amount=amount, payments=payments
+            )
+    except IntegrityError:
+        # A concurrent writer created the bucket first
+        bucket.update(amount=F("amount") + amount, payments=F("payments") + payments)
+
+
+def record_payment_change(previous, current):
+    """Move a payment's contribution from its ``previous`` bucket to its ``current`` one."""
+    if previous == current:
+        return
+    if previous is not None:
+        bump(previous[0], -Decimal(previous[1]), -1)
+    if current is not None:
+        bump(current[0], Decimal(current[1]), 1)
+
+
+def move_revenue(payments, from_route_id, to_route_id):
+    """Move the contributions of ``payments`` to another route, e.g. after their trip was re-routed."""
+    if from_route_id is None or from_route_id == to_route_id:
+        return
+    totals = (
+        payments.annotate(day=TruncDate("payment_date"))
+        .values("day", "status")
+        .annotate(total=Sum("amount"), count=Count("payment_id"))
+        .order_by()
+    )
+    for row in totals:
+        bump((from_route_id, row["day"], row["status"]), -row["total"], -row["count"])
+        bump((to_route_id, row["day"], row["status"]), row["total"], row["count"])
+
+
+# Backfills
+def rebuild_revenue(since=None):
+    """Recompute the revenue rollup from payments, optionally only from ``since`` (a date) on."""
+    payments = Payment.objects.all()
+    rollups = RouteRevenueDaily.objects.all()
+    if since:
+        payments = payments.filter(payment_date__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    totals = (
+        payments.annotate(day=TruncDate("payment_date"))
+        .values("booking__trip__route_id", "day", "status")
+        .annotate(total=Sum("amount"), count=Count("payment_id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = RouteRevenueDaily.objects.bulk_create(
+            [
+                RouteRevenueDaily(
+                    route_id=row["booking__trip__route_id"], day=row["day"], status=row["status"],
+                    amount=row["total"], payments=row["count"],
+                )
+                for row in totals.iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def rebuild_occupancy(batch_size=1000):
+    """Recompute every trip's SeatInventory from its bus capacity and tickets."""
+    seats = {}
+    for trip_id, seat in Ticket.objects.values_list("trip_id", "seat_number").iterator(chunk_size=batch_size):
+        seats.setdefault(trip_id, []).append(seat)
+    rebuilt = 0
+    with transaction.atomic():
+        existing = set(SeatInventory.objects.values_list("trip_id", flat=True))
+        to_create, to_update = [], []
+        for trip_id, capacity in Trip.objects.values_list("trip_id", "bus__capacity").iterator(chunk_size=batch_size):
+            inventory = SeatInventory(trip_id=trip_id, capacity=capacity)
+            for seat in seats.get(trip_id, ()):
+                inventory.mark(seat, True)
+            inventory.seat_map = inventory.seat_map.ljust(capacity, "0")[:capacity]
+            (to_update if trip_id in existing else to_create).append(inventory)
+            rebuilt += 1
+        SeatInventory.objects.bulk_create(to_create, batch_size=batch_size)
+        SeatInventory.objects.bulk_update(to_update, ["capacity", "seats_sold", "seat_map"], batch_size=batch_size)
+        response_cache.invalidate(response_cache.TRIPS)
+    return rebuilt
+
+
+# Reports
+def revenue_report(since=None, until=None, route_id=None, status=None):
+    """Per route/day/status totals, read from the rollup only."""
+    rows = RouteRevenueDaily.objects.filter(payments__gt=0)
+    if since:
+        rows = rows.filter(day__gte=since)
+    if until:
+        rows = rows.filter(day__lte=until)
+    if route_id:
+        rows = rows.filter(route_id=route_id)
+    if status:
+        rows = rows.filter(status=status)
+    return rows.order_by("day", "route_id", "status").values(
+        "day", "route_id", "status", "amount", "payments", route_name=F("route__name")
+    )
+
+
+def occupancy_report(since=None, until=None, bus_id=None):
+    """
+    Average load factor per bus over trips starting in the range, read
+    from the per-trip SeatInventory counters rather than tickets.
+    """
+    trips = SeatInventory.objects.filter(capacity__gt=0)
+    if since:
+        trips = trips.filter(trip__start_time__date__gte=since)
+    if until:
+        trips = trips.filter(trip__start_time__date__lte=until)
+    if bus_id:
+        trips = trips.filter(trip__bus_id=bus_id)
+    return (
+        trips.values(bus_id=F("trip__bus_id"), registration_number=F("trip__bus__registration_number"))
+        # load_factor first: the later aggregates shadow the field names
+        .annotate(load_factor=Avg(Cast("seats_sold", FloatField()) / Cast("capacity", FloatField())))
+        .annotate(trips=Count("trip_id"), seats_sold=Sum("seats_sold"), seats_offered=Sum("capacity"))
+        .order_by("bus_id")
+    )
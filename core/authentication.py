@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Conductor, Passenger, Role
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token (and derived access tokens) carrying the user's role,
+    profile ids and token version as signed claims, so permission checks
+    need no role or profile queries.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        passenger = getattr(user, "passenger_profile", None)
+        conductor = getattr(user, "conductor_profile", None)
+        token["role"] = user.role.name.lower() if user.role else ""
+        token["passenger_id"] = passenger.pk if passenger else None
+        token["conductor_id"] = conductor.pk if conductor else None
+        token["token_version"] = user.token_version
+        return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to mint access tokens from a refresh token issued before a role change."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        if "token_version" in refresh:
+            User = get_user_model()
+            current = (
+                User.objects.filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+                .values_list("token_version", flat=True).first()
+            )
+            if current != refresh["token_version"]:
+                raise InvalidToken("Token has been revoked.")
+        return super().validate(attrs)
+
+
+def user_cache_key(user_id, token_version):
+    return f"auth-user:{user_id}:{token_version}"
+
+
+def invalidate_cached_user(user_id, *token_versions):
+    """Drop cached entries of ``user_id``; without versions, the user's current one is looked up."""
+    if not token_versions:
+        token_versions = get_user_model().objects.filter(pk=user_id).values_list("token_version", flat=True)
+    cache.delete_many([user_cache_key(user_id, version) for version in token_versions])
+
+
+_PROJECTED_FIELDS = {"id", "email", "is_active", "token_version", "role_id"}
+
+
+# reverse one-to-one accessor -> profile model; profiles are small and carry no secrets, so
+# they are cached whole and the profile endpoint is served without a query
+_PROFILES = (("passenger_profile", Passenger), ("conductor_profile", Conductor))
+
+
+def _profile_values(profile):
+    return {field.attname: getattr(profile, field.attname) for field in profile._meta.concrete_fields}
+
+
+def _project(user):
+    # Only what authentication, permission checks and the profile endpoint read; never the password hash
+    data = {
+        "id": user.pk,
+        "email": user.email,
+        "is_active": user.is_active,
+        "token_version": user.token_version,
+        "role_id": user.role_id,
+        "role": user.role.name if user.role else None,
+    }
+    for accessor, _ in _PROFILES:
+        profile = getattr(user, accessor, None)
+        data[accessor] = _profile_values(profile) if profile else None
+    return data
+
+
+def _rebuild(model, values):
+    # from_db() expects the values in the model's field order
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(model.objects.db, fields, [values[name] for name in fields])
+
+
+def _from_projection(model, data):
+    """
+    Rebuild a user and its profiles from ``_project()``. User fields left
+    out are deferred, so the rare code path that reads one loads it on
+    access.
+    """
+    user = _rebuild(model, {name: data[name] for name in _PROJECTED_FIELDS})
+    role = Role.from_db(Role.objects.db, ("id", "name"), (data["role_id"], data["role"])) if data["role_id"] else None
+    model.role.field.set_cached_value(user, role)
+    for accessor, profile_model in _PROFILES:
+        profile = None
+        if data[accessor] is not None:
+            profile = _rebuild(profile_model, data[accessor])
+            profile_model.user.field.set_cached_value(profile, user)
+        getattr(model, accessor).related.set_cached_value(user, profile)
+    return user
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that rejects tokens minted before the user's
+    token_version was bumped (e.g. by a role change). The role and
+    profile claims are then trusted by core.permissions.
+
+    The user is resolved with its role and profiles in one query, and a
+    slim projection of it (no password hash) is cached under the token's
+    version, so a token from before a revocation never finds an entry
+    made after it. core.signals drops the entry whenever the user or one
+    of its profiles is saved or deleted.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        key = user_cache_key(user_id, validated_token.get("token_version"))
+        data = cache.get(key)
+        if data is not None:
+            user = _from_projection(self.user_model, data)
+        else:
+            user = (
+                self.user_model.objects
+                .select_related("role", "passenger_profile", "conductor_profile")
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            if user is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            cache.set(key, _project(user), getattr(settings, "AUTH_USER_CACHE_TTL", 300))
+
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if "token_version" in validated_token and validated_token["token_version"] != user.token_version:
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        return user
@@ -0,0 +1,212 @@
+import json
+import math
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.db.models import F
+
+from .models import Booking, Passenger, SeatInventory, Trip
+from .seeding import SEED_PASSWORD, seed_email
+
+_QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class Scenario:
+    """One endpoint call pattern; ``request(client, i)`` returns the response of call ``i``."""
+
+    def __init__(self, name, method, path, payload=None, auth=True, expected=(200,), teardown=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.payload = payload
+        self.auth = auth
+        self.expected = expected
+        self.teardown = teardown
+
+    def request(self, client, i):
+        path = self.path(i) if callable(self.path) else self.path
+        payload = self.payload(i) if callable(self.payload) else self.payload
+        return client.request(self.method, path, payload, authenticated=self.auth)
+
+    def close(self):
+        """Undo the rows this scenario set up, whether or not it ran."""
+        if self.teardown:
+            self.teardown()
+
+
+def default_scenarios(passenger_index=0, password=SEED_PASSWORD):
+    """
+    The hot paths: trip listing and search, a passenger's bookings, ticket
+    purchase and login (as the seeded passenger, with ``password``).
+    Ticket purchases use seats that were left free, in bookings made for
+    the run; call ``close()`` on every scenario afterwards to delete them.
+    """
+    passenger = Passenger.objects.get(user__email=seed_email("passenger", passenger_index))
+    route = Trip.objects.select_related("route").order_by("trip_id").first().route
+    free_seats, booking_ids = _free_seats(passenger)
+    lock = threading.Lock()
+
+    def next_ticket(i):
+        with lock:
+            booking_id, seat = free_seats.pop() if free_seats else (None, None)
+        return {"booking_id": booking_id, "seat_number": seat}
+
+    return [
+        Scenario("trips_list", "get", "/api/core/trips/?expand=route"),
+        Scenario("trips_search", "get", f"/api/core/trips/?from={route.start_point}&to={route.end_point}&has_seats=true"),
+        Scenario("bookings_list", "get", "/api/core/bookings/"),
+        Scenario(
+            "ticket_create", "post", "/api/core/tickets/", payload=next_ticket, expected=(201,),
+            # Deleting the bookings cascades to the tickets sold and frees their seats
+            teardown=lambda: Booking.objects.filter(pk__in=booking_ids).delete(),
+        ),
+        Scenario(
+            "login", "post", "/api/core/auth/login/", auth=False,
+            payload={"email": passenger.user.email, "password": password},
+        ),
+    ]
+
+
+def _free_seats(passenger, limit=5000):
+    """
+    (booking_id, seat) pairs the passenger can still buy, one new booking
+    per open trip, and the ids of those bookings.
+    """
+    free = {}
+    for inventory in SeatInventory.objects.filter(seats_sold__lt=F("capacity")).order_by("trip_id").iterator():
+        seats = inventory.available_seats()
+        if seats:
+            free[inventory.trip_id] = seats
+            if sum(map(len, free.values())) >= limit:
+                break
+    bookings = Booking.objects.bulk_create([Booking(passenger=passenger, trip_id=trip_id) for trip_id in free])
+    pairs = [(booking.pk, seat) for booking in bookings for seat in free[booking.trip_id]]
+    pairs.reverse()
+    return pairs, [booking.pk for booking in bookings]
+
+
+def run_scenario(scenario, client_factory, requests=200, concurrency=4):
+    """
+    Drive one scenario with ``concurrency`` workers, each with its own
+    client (and database connection). Queries per request are read from
+    the Server-Timing header added by core.middleware.PerformanceMiddleware.
+    """
+    latencies, queries, errors = [], [], []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = client_factory()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            response = scenario.request(client, i)
+            elapsed = time.perf_counter() - started
+            match = _QUERY_COUNT.search(response.headers.get("Server-Timing", ""))
+            with lock:
+                latencies.append(elapsed * 1000)
+                if match:
+                    queries.append(int(match.group(1)))
+                if response.status_code not in scenario.expected:
+                    errors.append(response.status_code)
+
+    def threaded_worker():
+        try:
+            worker()
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(threaded_worker) for _ in range(concurrency)]:
+                future.result()
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_statuses": sorted(set(errors)),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def compare(previous, current):
+    """Per-scenario change in p95 latency and throughput against an earlier result file."""
+    rows = {}
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or not before.get("p95_ms") or not result.get("p95_ms"):
+            continue
+        rows[name] = {
+            "p95_ms": (before["p95_ms"], result["p95_ms"]),
+            "p95_change_pct": round((result["p95_ms"] / before["p95_ms"] - 1) * 100, 1),
+            "throughput_rps": (before["throughput_rps"], result["throughput_rps"]),
+        }
+    return rows
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+# Clients
+class InProcessClient:
+    """Django test client (no network), authenticating with a real JWT."""
+
+    def __init__(self, token):
+        from rest_framework.test import APIClient
+
+        # Server errors count as failed requests rather than aborting the run
+        self.client = APIClient(raise_request_exception=False)
+        self.token = token
+
+    def request(self, method, path, payload=None, authenticated=True):
+        extra = {"secure": True}
+        if authenticated:
+            extra["HTTP_AUTHORIZATION"] = f"Bearer {self.token}"
+        if method == "get":
+            return self.client.get(path, **extra)
+        return getattr(self.client, method)(path, payload, format="json", **extra)
+
+
+class HttpClient:
+    """A keep-alive HTTP session against a running server."""
+
+    def __init__(self, base_url, token):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.token = token
+
+    def request(self, method, path, payload=None, authenticated=True):
+        headers = {"Authorization": f"Bearer {self.token}"} if authenticated else {}
+        return self.session.request(
+            method.upper(), f"{self.base_url}{path}", json=payload if method != "get" else None,
+            headers=headers, timeout=30,
+        )
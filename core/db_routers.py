@@ -0,0 +1,121 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read-mostly catalog models whose listings can tolerate a little replica lag, plus the
+# collection versions their ETags come from (read from the same replica as the body)
+REPLICATED_MODELS = {
+    ("core", "route"), ("core", "trip"), ("core", "bus"), ("core", "weather"), ("core", "collectionversion"),
+}
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Request being routed, set by core.middleware.ReplicaRoutingMiddleware
+_current = ContextVar("replica_routing", default=None)
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+def _pin_key(user_id):
+    return f"db-primary:{user_id}"
+
+
+class RoutingState:
+    """What the router needs to know about the request in progress."""
+    __slots__ = ("request", "wrote", "replica", "primary_only", "_pinned")
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        # One replica per request, so everything it reads is from the same point in time
+        self.replica = None
+        self.primary_only = False
+        self._pinned = None
+
+    @property
+    def safe(self):
+        return self.request.method in SAFE_METHODS
+
+    @property
+    def pinned(self):
+        # Evaluated on first catalog read, after the view has authenticated the user
+        if self._pinned is None:
+            user = getattr(self.request, "user", None)
+            self._pinned = bool(user is not None and user.is_authenticated and cache.get(_pin_key(user.pk)))
+        return self._pinned
+
+
+def activate(request):
+    return _current.set(RoutingState(request))
+
+
+def deactivate(token):
+    state = _current.get()
+    _current.reset(token)
+    return state
+
+
+@contextmanager
+def use_primary():
+    """Read everything from the primary inside the block, e.g. while filling a shared cache."""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary_only = state.primary_only, True
+    try:
+        yield
+    finally:
+        state.primary_only = previous
+
+
+def pin_to_primary(user):
+    """Send ``user``'s reads to the primary for ``REPLICA_STICKY_SECONDS`` (read-your-writes)."""
+    cache.set(_pin_key(user.pk), True, getattr(settings, "REPLICA_STICKY_SECONDS", 10))
+
+
+class ReplicaRouter:
+    """
+    Reads of the catalog models during GET/HEAD/OPTIONS requests go to a
+    replica from ``DATABASE_REPLICAS``, picked at random once per request;
+    everything else (writes, other models, unsafe requests, reads inside a
+    transaction or a ``use_primary()`` block, management commands) uses
+    the primary.
+    A user whose request wrote something is pinned to the primary for a
+    few seconds so they see their own changes despite replica lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or not state.safe:
+            return None
+        if (model._meta.app_label, model._meta.model_name) not in REPLICATED_MODELS:
+            return None
+        aliases = replicas()
+        # Inside a transaction on the primary, reads must see its uncommitted writes
+        if not aliases or state.primary_only or connections[DEFAULT_DB_ALIAS].in_atomic_block or state.pinned:
+            return None
+        if state.replica not in aliases:
+            state.replica = random.choice(aliases)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so rows read from either may be related
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
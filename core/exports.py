@@ -0,0 +1,149 @@
+import csv
+import json
+from datetime import datetime, time as dt_time
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Booking, Payment, Ticket
+
+# Rows fetched per round trip; a server-side cursor on PostgreSQL
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Flat columns per export: (header, ORM path) read with values_list, so
+# no model instances or nested serializers are built per row.
+EXPORTS = {
+    "bookings": {
+        "model": Booking,
+        "date_field": "booking_time",
+        "status_field": None,
+        "columns": (
+            ("booking_id", "booking_id"),
+            ("booking_time", "booking_time"),
+            ("passenger_id", "passenger_id"),
+            ("passenger_name", "passenger__full_name"),
+            ("trip_id", "trip_id"),
+            ("route", "trip__route__name"),
+            ("trip_start", "trip__start_time"),
+        ),
+    },
+    "tickets": {
+        "model": Ticket,
+        "date_field": "booking__booking_time",
+        "status_field": None,
+        "columns": (
+            ("ticket_id", "ticket_id"),
+            ("seat_number", "seat_number"),
+            ("booking_id", "booking_id"),
+            ("passenger_id", "booking__passenger_id"),
+            ("trip_id", "trip_id"),
+            ("route", "trip__route__name"),
+            ("trip_start", "trip__start_time"),
+        ),
+    },
+    "payments": {
+        "model": Payment,
+        "date_field": "payment_date",
+        "status_field": "status",
+        "columns": (
+            ("payment_id", "payment_id"),
+            ("booking_id", "booking_id"),
+            ("passenger_id", "booking__passenger_id"),
+            ("trip_id", "booking__trip_id"),
+            ("amount", "amount"),
+            ("status", "status"),
+            ("payment_date", "payment_date"),
+        ),
+    },
+}
+
+
+def parse_bound(value, end=False):
+    """
+    A ``since``/``until`` query value as an aware datetime.
+
+    Accepts ISO datetimes or plain dates; a date used as ``until`` covers
+    the whole day. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.combine(day, dt_time.max if end else dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(kind, since=None, until=None, status=None):
+    """
+    Flat rows for one export kind, ordered by primary key.
+
+    Bookings and tickets have no status of their own, so ``status``
+    selects those with a payment in that status.
+    """
+    spec = EXPORTS[kind]
+    model = spec["model"]
+    queryset = model.objects.all()
+    if since:
+        queryset = queryset.filter(**{f"{spec['date_field']}__gte": since})
+    if until:
+        queryset = queryset.filter(**{f"{spec['date_field']}__lte": until})
+    if status:
+        if spec["status_field"]:
+            queryset = queryset.filter(**{spec["status_field"]: status})
+        else:
+            booking = OuterRef("pk") if model is Booking else OuterRef("booking_id")
+            queryset = queryset.filter(Exists(Payment.objects.filter(booking=booking, status=status)))
+    paths = [path for _, path in spec["columns"]]
+    return queryset.order_by("pk").values_list(*paths)
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    """File-like sink that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_rows(kind, rows, fmt="csv", chunk_size=CHUNK_SIZE):
+    """
+    Yield the export as text, one chunk of rows at a time.
+
+    Rows are read with ``iterator(chunk_size)``, so memory stays flat
+    however many rows match.
+    """
+    headers = [header for header, _ in EXPORTS[kind]["columns"]]
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        encode = lambda row: writer.writerow(["" if value is None else _plain(value) for value in row])
+        yield writer.writerow(headers)
+    else:
+        encode = lambda row: json.dumps(dict(zip(headers, map(_plain, row)))) + "\n"
+
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(encode(row))
+        if len(batch) >= chunk_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
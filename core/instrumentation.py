@@ -0,0 +1,82 @@
+import heapq
+import time
+from contextvars import ContextVar
+
+# Metrics of the request being handled, set by core.middleware.PerformanceMiddleware
+_current = ContextVar("request_metrics", default=None)
+
+# Slowest statements kept per request for the slow-request log
+TOP_QUERIES = 5
+
+
+class RequestMetrics:
+    """Per-request counters filled in by the SQL wrapper and the serializer timer."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self._serializer_depth = 0
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every statement
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_count += 1
+            self.query_seconds += elapsed
+            entry = (elapsed, self.query_count, sql)
+            if len(self._slowest) < TOP_QUERIES:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def slowest_queries(self):
+        return [
+            {"ms": round(seconds * 1000, 2), "sql": sql}
+            for seconds, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+def current():
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+class serializer_timer:
+    """
+    Time serialization for the active request. Nested serializers run
+    inside their parent's timer, so only the outermost call is counted.
+    A no-op when no request is being measured.
+    """
+    __slots__ = ("metrics", "started")
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None:
+            self.metrics._serializer_depth += 1
+            if self.metrics._serializer_depth == 1:
+                self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics._serializer_depth -= 1
+            if metrics._serializer_depth == 0:
+                metrics.serializer_seconds += time.perf_counter() - self.started
@@ -0,0 +1,144 @@
+import json
+import logging
+import subprocess
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.authentication import RoleRefreshToken
+from core.benchmark import HttpClient, InProcessClient, compare, default_scenarios, load_results, run_scenario
+from core.models import Booking, Passenger, Payment, Ticket, Trip
+from core.seeding import SEED_PASSWORD, seed, seed_email
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large dataset and measure throughput, p50/p95/p99 latency and queries per request "
+        "of the hot endpoints. Runs in-process against a throwaway test database unless --base-url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trips", type=int, default=10000)
+        parser.add_argument("--bookings", type=int, default=1000000)
+        parser.add_argument("--passengers", type=int, default=50000)
+        parser.add_argument("--conductors", type=int, default=500)
+        parser.add_argument("--routes", type=int, default=200)
+        parser.add_argument("--days", type=int, default=90, help="Trips are spread over this many days.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; equal seeds give equal data.")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent workers per scenario.")
+        parser.add_argument("--scenarios", help="Comma-separated subset, e.g. trips_list,login.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the seeded test database for the next run.")
+        parser.add_argument(
+            "--base-url",
+            help="Drive a running server (e.g. http://127.0.0.1:8000) whose database was seeded "
+                 "with seed_lightpath, instead of an in-process test database.",
+        )
+        parser.add_argument(
+            "--password", default=SEED_PASSWORD,
+            help="Password the login scenario uses with --base-url (the one seed_lightpath used or printed).",
+        )
+        parser.add_argument("--output", help="Result file; defaults to benchmarks/results/<time>-<commit>.json.")
+        parser.add_argument("--compare", help="Earlier result file to compare p95 latency and throughput with.")
+
+    def handle(self, *args, **options):
+        if options["base_url"]:
+            results = self.run(options, partial(HttpClient, options["base_url"]))
+        else:
+            results = self.run_in_process(options)
+        self.save(results, options)
+
+    def run_in_process(self, options):
+        original_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"])
+        if connection.vendor == "sqlite":
+            # Concurrent writers otherwise fail with "database is locked" instead of waiting
+            connection.settings_dict["OPTIONS"].update(transaction_mode="IMMEDIATE", timeout=30)
+        performance_log = logging.getLogger("core.performance")
+        previous_level = performance_log.level
+        performance_log.setLevel(logging.WARNING)
+        try:
+            if not Trip.objects.exists():
+                seed(
+                    conductors=options["conductors"], routes=options["routes"], trips=options["trips"],
+                    passengers=options["passengers"], bookings=options["bookings"], days=options["days"],
+                    seed=options["seed"], log=self.stdout.write,
+                )
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                PERF_INSTRUMENTATION=True, PERF_SERVER_TIMING=True, PERF_SLOW_REQUEST_MS=10 ** 9,
+            ):
+                return self.run(options, InProcessClient)
+        finally:
+            performance_log.setLevel(previous_level)
+            connection.creation.destroy_test_db(original_name, verbosity=0, keepdb=options["keepdb"])
+
+    def run(self, options, client_class):
+        if not Passenger.objects.filter(user__email=seed_email("passenger", 0)).exists():
+            raise CommandError("No seeded data found; run manage.py seed_lightpath against the target database first.")
+        user = Passenger.objects.select_related("user").get(user__email=seed_email("passenger", 0)).user
+        token = str(RoleRefreshToken.for_user(user).access_token)
+        wanted = set(options["scenarios"].split(",")) if options["scenarios"] else None
+
+        results = {
+            "commit": self.commit(),
+            "timestamp": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "target": options["base_url"] or "in-process",
+            "dataset": {
+                "trips": Trip.objects.count(),
+                "bookings": Booking.objects.count(),
+                "tickets": Ticket.objects.count(),
+                "payments": Payment.objects.count(),
+            },
+            "scenarios": {},
+        }
+        self.stdout.write(f"Dataset: {results['dataset']}")
+        scenarios = default_scenarios(password=options["password"])
+        try:
+            for scenario in scenarios:
+                if wanted and scenario.name not in wanted:
+                    continue
+                result = run_scenario(
+                    scenario, lambda: client_class(token=token),
+                    requests=options["requests"], concurrency=options["concurrency"],
+                )
+                results["scenarios"][scenario.name] = result
+                self.stdout.write(
+                    f"{scenario.name:>14}: {result['throughput_rps']} req/s, p50 {result['p50_ms']} ms, "
+                    f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+                    f"{result['queries_per_request']} queries/req, {result['errors']} errors"
+                )
+        finally:
+            # Leave the dataset as it was, so repeat runs and --compare measure the same data
+            for scenario in scenarios:
+                scenario.close()
+        return results
+
+    def save(self, results, options):
+        path = options["output"]
+        if not path:
+            directory = settings.BASE_DIR / "benchmarks" / "results"
+            directory.mkdir(parents=True, exist_ok=True)
+            stamp = timezone.now().strftime("%Y%m%dT%H%M%S")
+            path = directory / f"{stamp}-{results['commit'] or 'nocommit'}.json"
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+        self.stdout.write(f"Results written to {path}")
+        if options["compare"]:
+            for name, row in compare(load_results(options["compare"]), results).items():
+                self.stdout.write(f"{name:>14}: p95 {row['p95_ms'][0]} -> {row['p95_ms'][1]} ms ({row['p95_change_pct']:+}%)")
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import CHUNK_SIZE, EXPORTS, FORMATS, export_queryset, parse_bound, stream_rows
+
+
+class Command(BaseCommand):
+    help = "Stream bookings, tickets or payments to CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--since", help="Earliest date or datetime (inclusive).")
+        parser.add_argument("--until", help="Latest date or datetime (inclusive).")
+        parser.add_argument("--status", help="Payment status, e.g. COMPLETED.")
+        parser.add_argument("--output", help="File to write; defaults to stdout.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per round trip.")
+
+    def handle(self, *args, **options):
+        try:
+            rows = export_queryset(
+                options["kind"],
+                since=parse_bound(options["since"]),
+                until=parse_bound(options["until"], end=True),
+                status=options["status"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        chunks = stream_rows(options["kind"], rows, options["fmt"], chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as handle:
+                handle.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.services import attach_weather_to_trips, ingest_weather
+
+
+class Command(BaseCommand):
+    help = "Ingest current and forecast weather, then link upcoming trips to the nearest record."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--city", help="City for current conditions (default: DEFAULT_CITY).")
+        parser.add_argument("--loop", action="store_true", help="Keep running, ingesting every --interval seconds.")
+        parser.add_argument(
+            "--interval", type=int, default=settings.WEATHER_INGEST_INTERVAL,
+            help="Seconds between runs when --loop is set.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                created, updated = ingest_weather(city=options["city"])
+                relinked = attach_weather_to_trips()
+                self.stdout.write(
+                    f"Weather: {created} created, {updated} updated; {relinked} trips relinked."
+                )
+            except Exception as e:
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"Weather ingestion failed: {e}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import ProvisioningError, provision
+
+
+class Command(BaseCommand):
+    help = "Bulk-create conductors, buses and routes from CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conductors", help="CSV with email[, full_name, contact_number, employee_id, password].")
+        parser.add_argument("--buses", help="CSV with registration_number, conductor (email or employee_id)[, capacity].")
+        parser.add_argument("--routes", help="CSV with name, start_point, end_point.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing.")
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ("conductors", "buses", "routes")):
+            raise CommandError("Pass at least one of --conductors, --buses or --routes.")
+        try:
+            report = provision(
+                conductors=options["conductors"], buses=options["buses"], routes=options["routes"],
+                batch_size=options["batch_size"], dry_run=options["dry_run"],
+            )
+        except ProvisioningError as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError(str(e))
+        verb = "Validated" if report["dry_run"] else "Provisioned"
+        self.stdout.write(
+            f"{verb} {report['conductors']} conductors, {report['buses']} buses and {report['routes']} routes "
+            f"in {report['seconds']}s ({report['rows_per_minute']} rows/minute)."
+        )
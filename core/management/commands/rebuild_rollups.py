@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.analytics import rebuild_occupancy, rebuild_revenue
+
+
+class Command(BaseCommand):
+    help = "Recompute the revenue and occupancy rollups from payments and tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only rebuild revenue from this date (YYYY-MM-DD) on.")
+        parser.add_argument("--only", choices=("revenue", "occupancy"), help="Rebuild just one rollup.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_date(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+        if options["only"] != "occupancy":
+            self.stdout.write(f"Revenue: {rebuild_revenue(since=since)} route/day buckets rebuilt.")
+        if options["only"] != "revenue":
+            self.stdout.write(f"Occupancy: {rebuild_occupancy()} trips rebuilt.")
@@ -0,0 +1,77 @@
+import os
+import secrets
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from core.seeding import flush, seed, seed_email
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large, deterministic synthetic dataset (users, passengers, conductors, buses, routes, "
+        "weather, trips, bookings, tickets and payments) with batched bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conductors", type=int, default=1000, help="Conductors, one bus each.")
+        parser.add_argument("--routes", type=int, default=300)
+        parser.add_argument("--trips", type=int, default=50000)
+        parser.add_argument("--passengers", type=int, default=200000)
+        parser.add_argument("--bookings", type=int, default=2000000)
+        parser.add_argument("--days", type=int, default=180, help="Months of history, in days, to spread trips over.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; equal seeds give equal data.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT and per generated chunk.")
+        parser.add_argument(
+            "--workers", type=int, default=min(os.cpu_count() or 1, 8),
+            help="Processes generating booking chunks in parallel (the output does not depend on it).",
+        )
+        parser.add_argument(
+            "--prefix", default="",
+            help="Namespace for emails, registrations and route names, so several datasets can coexist.",
+        )
+        parser.add_argument("--flush", action="store_true", help="Delete the dataset with this prefix first.")
+        parser.add_argument(
+            "--password", help="Password of every seeded user, including a staff admin; random when omitted.",
+        )
+        parser.add_argument(
+            "--allow-production", action="store_true",
+            help="Seed even though DEBUG is off (the dataset includes a staff account).",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["allow_production"]:
+            raise CommandError(
+                "Refusing to seed with DEBUG off: the dataset includes a staff admin. "
+                "Pass --allow-production if this database really should get one."
+            )
+        prefix = options["prefix"]
+        if prefix and not prefix.isalnum():
+            raise CommandError("--prefix must be alphanumeric.")
+        password = options["password"] or secrets.token_urlsafe(16)
+        started = time.perf_counter()
+        if options["flush"]:
+            deleted = flush(prefix=prefix)
+            self.stdout.write(f"Flushed {sum(deleted.values())} rows.")
+        try:
+            counts = seed(
+                conductors=options["conductors"], routes=options["routes"], trips=options["trips"],
+                passengers=options["passengers"], bookings=options["bookings"], days=options["days"],
+                seed=options["seed"], batch_size=options["batch_size"], workers=options["workers"],
+                prefix=prefix, password=password, log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        except IntegrityError:
+            raise CommandError(
+                f"A dataset with prefix {prefix!r} already exists; pass --flush to replace it or use another --prefix."
+            )
+        seconds = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {rows} rows in {seconds:.1f}s ({int(rows / seconds * 60) if seconds else rows} rows/minute). "
+            f"Log in as e.g. {seed_email('passenger', 0, prefix)} with "
+            + ("the --password given." if options["password"] else f"the generated password {password!r}.")
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox in batches over one SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Emails sent per SMTP connection.")
+        parser.add_argument("--loop", action="store_true", help="Keep polling the outbox.")
+        parser.add_argument(
+            "--interval", type=float, default=5.0,
+            help="Seconds to sleep when nothing is due or a whole batch failed.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = drain(batch_size=options["batch_size"])
+            total_sent += sent
+            total_failed += failed
+            if sent:
+                continue
+            if not options["loop"]:
+                # Failed rows are backing off, so the next batch holds other due messages
+                if failed:
+                    continue
+                break
+            # Nothing due, or the whole batch failed (e.g. SMTP is down): pause before polling again
+            time.sleep(options["interval"])
+        self.stdout.write(f"Outbox: {total_sent} sent, {total_failed} failed.")
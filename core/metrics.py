@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, label names)
+METRICS = {
+    "lightpath_http_requests_total": (
+        "counter", "Requests handled, by view (URL name), method and status.", ("view", "method", "status"),
+    ),
+    "lightpath_http_request_duration_seconds": ("histogram", "Request latency by view.", ("view",)),
+    "lightpath_http_errors_total": ("counter", "Responses with a 5xx status, by view.", ("view",)),
+    "lightpath_db_queries_total": ("counter", "SQL statements run, by view.", ("view",)),
+    "lightpath_db_query_seconds_total": ("counter", "Time spent in SQL, by view.", ("view",)),
+    "lightpath_response_cache_requests_total": (
+        "counter", "Server-side response cache lookups, by namespace and result (hit or miss).",
+        ("namespace", "result"),
+    ),
+    "lightpath_weather_cache_requests_total": (
+        "counter", "Weather client lookups, by result (fresh, stale or miss).", ("result",),
+    ),
+    "lightpath_weather_upstream_duration_seconds": (
+        "histogram", "Weather backend call latency, by operation and outcome (ok or error).",
+        ("operation", "outcome"),
+    ),
+}
+
+
+class Registry:
+    """
+    Counters and histograms of this process. With ``METRICS_DIR`` set,
+    each process also writes its samples to ``<pid>.json`` there (at most
+    every ``METRICS_FLUSH_SECONDS``), and ``collect()`` sums every file,
+    so whichever gunicorn worker serves /metrics reports all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._samples = {}
+        self._flushed = 0.0
+
+    def _series(self, name, labels):
+        # A forked worker starts from zero rather than re-reporting its parent's samples
+        if os.getpid() != self._pid:
+            self._reset()
+        return self._samples.setdefault(name, {}), json.dumps([str(value) for value in labels])
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            series, key = self._series(name, labels)
+            series[key] = series.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, labels, seconds):
+        with self._lock:
+            series, key = self._series(name, labels)
+            histogram = series.setdefault(key, {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0})
+            histogram["buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram["sum"] += seconds
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed >= getattr(settings, "METRICS_FLUSH_SECONDS", 1):
+            self.flush()
+
+    def flush(self):
+        directory = getattr(settings, "METRICS_DIR", "")
+        if not directory:
+            return
+        with self._lock:
+            self._flushed = time.monotonic()
+            data = json.dumps(self._samples)
+            pid = self._pid
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{pid}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+            handle.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Samples of every process sharing ``METRICS_DIR`` (or just this one), summed per series."""
+        directory = getattr(settings, "METRICS_DIR", "")
+        if not directory:
+            with self._lock:
+                return json.loads(json.dumps(self._samples))
+        self.flush()
+        merged = {}
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as handle:
+                    samples = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, series in samples.items():
+                target = merged.setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = _add(target.get(key), value)
+        return merged
+
+
+def _add(total, value):
+    if total is None:
+        return value
+    if isinstance(value, dict):
+        return {
+            "buckets": [a + b for a, b in zip(total["buckets"], value["buckets"])],
+            "sum": total["sum"] + value["sum"],
+        }
+    return total + value
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def record_request(view, method, status, seconds, queries, query_seconds):
+    """Called once per request by core.middleware.PerformanceMiddleware."""
+    view = view or "unmatched"
+    registry.inc("lightpath_http_requests_total", (view, method, status))
+    registry.observe("lightpath_http_request_duration_seconds", (view,), seconds)
+    if status >= 500:
+        registry.inc("lightpath_http_errors_total", (view,))
+    registry.inc("lightpath_db_queries_total", (view,), queries)
+    registry.inc("lightpath_db_query_seconds_total", (view,), query_seconds)
+
+
+# psycopg_pool get_stats() key -> (gauge, help)
+POOL_GAUGES = {
+    "pool_size": ("lightpath_db_pool_connections", "Connections open in the scraped worker's pool."),
+    "pool_available": ("lightpath_db_pool_idle", "Idle connections in the scraped worker's pool."),
+    "requests_waiting": ("lightpath_db_pool_waiting", "Requests waiting for a connection in the scraped worker."),
+}
+
+
+def pool_gauges():
+    """psycopg pool stats per database alias, as seen by this worker (each worker has its own pools)."""
+    stats = []
+    for connection in connections.all(initialized_only=True):
+        pool = connection.pool if connection.vendor == "postgresql" else None
+        if pool is not None:
+            stats.append((connection.alias, pool.get_stats()))
+    if not stats:
+        return []
+    return [
+        (name, help_text, [({"alias": alias}, values.get(key, 0)) for alias, values in stats])
+        for key, (name, help_text) in POOL_GAUGES.items()
+    ]
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=()):
+    """
+    Prometheus text exposition (format 0.0.4) of every registered metric
+    plus ``gauges``: (name, help, value) triples computed at scrape time,
+    where value is a number or a list of (labels dict, number) pairs.
+    """
+    samples = registry.collect()
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for key, value in sorted(samples.get(name, {}).items()):
+            values = json.loads(key)
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(label_names, values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), value["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(label_names, values, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(label_names, values)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(label_names, values)} {cumulative}")
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for labels, number in value if isinstance(value, list) else [({}, value)]:
+            lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(number)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+import json
+import logging
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import db_routers, instrumentation, profiling
+from .metrics import record_request
+
+logger = logging.getLogger("core.performance")
+slow_logger = logging.getLogger("core.performance.slow")
+
+
+class PerformanceMiddleware:
+    """
+    Per-request SQL count and time, view name, serializer time and
+    response size, reported as one JSON log line on ``core.performance``
+    (and, with ``PERF_SERVER_TIMING``, a ``Server-Timing`` header).
+    Requests slower than ``PERF_SLOW_REQUEST_MS`` are also logged, with
+    their slowest statements, on ``core.performance.slow``. The same
+    numbers feed the /metrics counters and histograms (core/metrics.py).
+
+    With ``PERF_INSTRUMENTATION`` off the middleware removes itself from
+    the stack at startup, so it costs nothing (and /metrics has no
+    per-view request series).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_INSTRUMENTATION", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, "PERF_SLOW_REQUEST_MS", 500) / 1000
+        self.server_timing = getattr(settings, "PERF_SERVER_TIMING", settings.DEBUG)
+
+    def __call__(self, request):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.activate(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+        self.report(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            match = request.resolver_match
+            metrics.view_name = (match.view_name if match else None) or view_func.__name__
+
+    def report(self, request, response, metrics):
+        elapsed = metrics.elapsed
+        size = None if response.streaming else len(response.content)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": metrics.view_name,
+            "status": response.status_code,
+            "ms": round(elapsed * 1000, 2),
+            "db_queries": metrics.query_count,
+            "db_ms": round(metrics.query_seconds * 1000, 2),
+            "serializer_ms": round(metrics.serializer_seconds * 1000, 2),
+            "bytes": size,
+        }
+        if self.server_timing:
+            response["Server-Timing"] = ", ".join((
+                f'db;dur={record["db_ms"]};desc="{metrics.query_count} queries"',
+                f'serialize;dur={record["serializer_ms"]}',
+                f'total;dur={record["ms"]}',
+            ))
+        record_request(
+            metrics.view_name, request.method, response.status_code, elapsed,
+            metrics.query_count, metrics.query_seconds,
+        )
+        logger.info(json.dumps(record))
+        if elapsed >= self.slow_seconds:
+            slow_logger.warning(json.dumps({**record, "top_queries": metrics.slowest_queries()}))
+
+
+class ProfilingMiddleware:
+    """
+    Run a request under cProfile, with its SQL, when it carries a token
+    from ``POST /api/core/admin/profiles/token/`` (see core/profiling.py).
+    The profile is kept only if the request authenticated as the token's
+    owner and that user is an admin; its id is returned in
+    ``X-Profile-Id``. One request per process is profiled at a time;
+    others proceed unprofiled. ``PROFILING_ENABLED`` off removes the
+    middleware at startup.
+    """
+    _busy = threading.Lock()
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user_id = profiling.requested_by(request)
+        if user_id is None or not self._busy.acquire(blocking=False):
+            return self.get_response(request)
+        capture = profiling.Capture()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(capture))
+                response = capture.run(self.get_response, request)
+        finally:
+            self._busy.release()
+        if profiling.is_admin(request, user_id):
+            response["X-Profile-Id"] = str(profiling.store(request, response, capture, user_id).pk)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Expose the request to core.db_routers.ReplicaRouter and, after an
+    unsafe request that wrote to the database, pin the user to the
+    primary (read-your-writes). Removed at startup when no
+    ``DATABASE_REPLICAS`` are configured.
+    """
+
+    def __init__(self, get_response):
+        if not db_routers.replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = db_routers.activate(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = db_routers.deactivate(token)
+        user = getattr(request, "user", None)
+        if state.wrote and not state.safe and user is not None and user.is_authenticated:
+            db_routers.pin_to_primary(user)
+        return response
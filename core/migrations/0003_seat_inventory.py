@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_inventory(apps, schema_editor):
+    Trip = apps.get_model("core", "Trip")
+    Ticket = apps.get_model("core", "Ticket")
+    SeatInventory = apps.get_model("core", "SeatInventory")
+    for trip in Trip.objects.select_related("bus").iterator():
+        capacity = trip.bus.capacity
+        seat_map = ["0"] * capacity
+        sold = 0
+        for seat in Ticket.objects.filter(trip=trip).values_list("seat_number", flat=True):
+            sold += 1
+            if seat.isdigit() and 1 <= int(seat) <= capacity:
+                seat_map[int(seat) - 1] = "1"
+        SeatInventory.objects.create(trip=trip, capacity=capacity, seats_sold=sold, seat_map="".join(seat_map))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_seed_roles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_inventory', serialize=False, to='core.trip')),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('seats_sold', models.PositiveIntegerField(default=0)),
+                ('seat_map', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Seat Inventory',
+                'verbose_name_plural': 'Seat Inventories',
+            },
+        ),
+        migrations.RunPython(backfill_inventory, migrations.RunPython.noop),
+    ]
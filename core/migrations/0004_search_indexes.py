@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_seat_inventory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['passenger', 'trip'], name='booking_passenger_trip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'payment_date'], name='payment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['start_point', 'end_point'], name='route_endpoints_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['end_point'], name='route_end_point_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['route', 'start_time'], name='trip_route_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['start_time', 'trip_id'], name='trip_start_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weather',
+            index=models.Index(fields=['timestamp'], name='weather_timestamp_idx'),
+        ),
+    ]
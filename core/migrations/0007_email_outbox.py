@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('outbox_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=200)),
+                ('body', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Email Outbox',
+                'verbose_name_plural': 'Email Outbox',
+                'indexes': [models.Index(fields=['sent_at', 'outbox_id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:16
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conductor',
+            name='employee_id',
+            field=models.CharField(blank=True, default=core.models.generate_employee_id, max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='passenger',
+            name='username',
+            field=models.CharField(blank=True, default=core.models.generate_passenger_username, max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:24
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_revenue(apps, schema_editor):
+    Payment = apps.get_model("core", "Payment")
+    RouteRevenueDaily = apps.get_model("core", "RouteRevenueDaily")
+    totals = (
+        Payment.objects.annotate(day=TruncDate("payment_date"))
+        .values("booking__trip__route_id", "day", "status")
+        .annotate(total=Sum("amount"), count=Count("payment_id"))
+        .order_by()
+    )
+    RouteRevenueDaily.objects.bulk_create(
+        [
+            RouteRevenueDaily(
+                route_id=row["booking__trip__route_id"], day=row["day"], status=row["status"],
+                amount=row["total"], payments=row["count"],
+            )
+            for row in totals
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_generated_profile_identifiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteRevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payments', models.IntegerField(default=0)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='core.route')),
+            ],
+            options={
+                'verbose_name': 'Route Revenue (Daily)',
+                'verbose_name_plural': 'Route Revenue (Daily)',
+                'indexes': [models.Index(fields=['day', 'route'], name='revenue_day_route_idx')],
+                'constraints': [models.UniqueConstraint(fields=('route', 'day', 'status'), name='unique_route_day_status')],
+            },
+        ),
+        migrations.RunPython(backfill_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_route_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Collection Version',
+                'verbose_name_plural': 'Collection Versions',
+            },
+        ),
+    ]
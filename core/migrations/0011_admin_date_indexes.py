@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_collection_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_time'], name='booking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ),
+    ]
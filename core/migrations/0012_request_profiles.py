@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('profile_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('view_name', models.CharField(blank=True, default='', max_length=200)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('queries', models.JSONField(default=list)),
+                ('stats', models.BinaryField()),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Request Profile',
+                'verbose_name_plural': 'Request Profiles',
+                'ordering': ['-profile_id'],
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
@@ -6,6 +6,7 @@ from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.apps import apps
 from decimal import Decimal
+import re
 import uuid
 
 
@@ -38,9 +39,27 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
+class RoleManager(models.Manager):
+    """Roles are seeded and rarely change, so lookups by name are cached in-process."""
+    _by_name = {}
+
+    def get_cached(self, name):
+        key = name.lower()
+        role = self._by_name.get(key)
+        if role is None:
+            role = self.get(name__iexact=name)
+            self._by_name[key] = role
+        return role
+
+    def clear_cache(self):
+        self._by_name.clear()
+
+
 class Role(models.Model):
     name = models.CharField(max_length=50, unique=True)
-    
+
+    objects = RoleManager()
+
     class Meta:
         verbose_name = "Role"
         verbose_name_plural = "Roles"
@@ -61,6 +80,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Bumped to revoke issued JWTs whose claims (e.g. role) went stale
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
@@ -74,27 +95,94 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The role as loaded (absent when deferred), so save() can spot a change without a query
+        if "role_id" in instance.__dict__:
+            instance._loaded_role_id = instance.role_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        # A role change revokes the JWTs issued with the old role claim
+        update_fields = kwargs.get("update_fields")
+        if self._role_changed(update_fields):
+            self._revoked_token_version = self.token_version
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._loaded_role_id = self.role_id
+
+    def _role_changed(self, update_fields):
+        if self.pk is None:
+            return False
+        if update_fields is not None and not {"role", "role_id"} & set(update_fields):
+            return False
+        if hasattr(self, "_loaded_role_id"):
+            previous = self._loaded_role_id
+        else:
+            previous = type(self)._default_manager.filter(pk=self.pk).values_list("role_id", flat=True).first()
+        return previous is not None and previous != self.role_id
+
+
+def generate_passenger_username():
+    # 64 random bits: collisions are negligible even across millions of rows,
+    # so no pre-check query is needed and bulk_create gets values at __init__.
+    # A single save() that does collide retries with a fresh value instead.
+    return f"passenger_{uuid.uuid4().hex[:16]}"
+
+
+def generate_employee_id():
+    return f"conductor_{uuid.uuid4().hex[:16]}"
+
+
+GENERATED_IDENTIFIER = re.compile(r"(passenger|conductor)_[0-9a-f]{16}")
+IDENTIFIER_ATTEMPTS = 5
+
+
+def save_with_generated_identifier(instance, field, generate, save):
+    """
+    Insert ``instance`` with ``save()`` inside a savepoint; if the insert
+    hits the unique constraint on a generated ``field`` value, draw a new
+    one with ``generate()`` and retry, up to ``IDENTIFIER_ATTEMPTS`` times.
+    Other integrity errors, updates and hand-picked values are re-raised.
+    """
+    if not instance._state.adding:
+        return save()
+    for attempt in range(1, IDENTIFIER_ATTEMPTS + 1):
+        value = getattr(instance, field)
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            if (
+                attempt == IDENTIFIER_ATTEMPTS
+                or not GENERATED_IDENTIFIER.fullmatch(value)
+                or not type(instance)._default_manager.filter(**{field: value}).exists()
+            ):
+                raise
+            setattr(instance, field, generate())
+
 
 class Passenger(models.Model):
     passenger_id = models.AutoField(primary_key=True)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="passenger_profile")
     full_name = models.CharField(max_length=100, default="Passenger")
     contact_number = models.CharField(max_length=20, default="UNKNOWN")
-    username = models.CharField(max_length=50, unique=True, blank=True)
+    username = models.CharField(max_length=50, unique=True, blank=True, default=generate_passenger_username)
             
     class Meta:
         verbose_name = "Passenger"
         verbose_name_plural = "Passengers"
 
     def save(self, *args, **kwargs):
-        # Auto-generate a unique username if not provided
+        # Auto-generate a unique username if it was cleared
         if not self.username:
-            while True:
-                candidate = f"passenger_{uuid.uuid4().hex[:8]}"
-                if not self.__class__.objects.filter(username=candidate).exists():
-                    self.username = candidate
-                    break
-        super().save(*args, **kwargs)
+            self.username = generate_passenger_username()
+        save_with_generated_identifier(
+            self, "username", generate_passenger_username, lambda: super(Passenger, self).save(*args, **kwargs)
+        )
 
     def __str__(self):
         return self.full_name
@@ -105,7 +193,7 @@ class Conductor(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="conductor_profile")
     full_name = models.CharField(max_length=100, default="Conductor")
     contact_number = models.CharField(max_length=20, default="UNKNOWN")
-    employee_id = models.CharField(max_length=20, unique=True, blank=True)
+    employee_id = models.CharField(max_length=32, unique=True, blank=True, default=generate_employee_id)
 
     class Meta:
         verbose_name = "Conductor"
@@ -113,12 +201,10 @@ class Conductor(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.employee_id:
-            while True:
-                candidate = f"conductor_{uuid.uuid4().hex[:8]}"
-                if not self.__class__.objects.filter(employee_id=candidate).exists():
-                    self.employee_id = candidate
-                    break
-        super().save(*args, **kwargs)
+            self.employee_id = generate_employee_id()
+        save_with_generated_identifier(
+            self, "employee_id", generate_employee_id, lambda: super(Conductor, self).save(*args, **kwargs)
+        )
 
     def __str__(self):
         return self.full_name
@@ -147,6 +233,10 @@ class Route(models.Model):
     class Meta:
         verbose_name = "Route"
         verbose_name_plural = "Routes"
+        indexes = [
+            models.Index(fields=["start_point", "end_point"], name="route_endpoints_idx"),
+            models.Index(fields=["end_point"], name="route_end_point_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name}: {self.start_point} → {self.end_point}"
@@ -161,6 +251,9 @@ class Weather(models.Model):
     class Meta:
         verbose_name = "Weather"
         verbose_name_plural = "Weather"
+        indexes = [
+            models.Index(fields=["timestamp"], name="weather_timestamp_idx"),
+        ]
 
     def __str__(self):
         return f"{self.condition} at {self.temperature}°C ({self.timestamp})"
@@ -178,11 +271,65 @@ class Trip(models.Model):
     class Meta:
         verbose_name = "Trip"
         verbose_name_plural = "Trips"
+        indexes = [
+            models.Index(fields=["route", "start_time"], name="trip_route_start_idx"),
+            models.Index(fields=["start_time", "trip_id"], name="trip_start_idx"),
+        ]
 
     def __str__(self):
         return f"Trip {self.trip_id} on {self.route.name}"
 
 
+class SeatInventory(models.Model):
+    """
+    Per-trip seat bitmap kept in step with Ticket writes (see core/seats.py).
+
+    ``seat_map`` holds one character per seat, "1" at index n-1 when seat n
+    is taken, so availability is a string index rather than a ticket scan.
+    """
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name="seat_inventory")
+    capacity = models.PositiveIntegerField(default=0)
+    seats_sold = models.PositiveIntegerField(default=0)
+    seat_map = models.TextField(blank=True, default="")
+
+    class Meta:
+        verbose_name = "Seat Inventory"
+        verbose_name_plural = "Seat Inventories"
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.seats_sold}/{self.capacity} sold"
+
+    @property
+    def remaining(self):
+        return max(self.capacity - self.seats_sold, 0)
+
+    def seat_index(self, seat_number):
+        """Bitmap index for a seat number, or None if it is not a seat on this bus."""
+        try:
+            number = int(seat_number)
+        except (TypeError, ValueError):
+            return None
+        return number - 1 if 1 <= number <= self.capacity else None
+
+    def is_taken(self, seat_number):
+        index = self.seat_index(seat_number)
+        return index is not None and index < len(self.seat_map) and self.seat_map[index] == "1"
+
+    def taken_seats(self):
+        return [str(i + 1) for i, bit in enumerate(self.seat_map[:self.capacity]) if bit == "1"]
+
+    def available_seats(self):
+        return [str(n) for n in range(1, self.capacity + 1) if not self.is_taken(n)]
+
+    def mark(self, seat_number, taken):
+        """Flip a seat's bit and adjust the sold counter; does not save."""
+        self.seats_sold = self.seats_sold + 1 if taken else max(self.seats_sold - 1, 0)
+        index = self.seat_index(seat_number)
+        if index is not None:
+            seat_map = self.seat_map.ljust(index + 1, "0")
+            self.seat_map = seat_map[:index] + ("1" if taken else "0") + seat_map[index + 1:]
+
+
 class Booking(models.Model):
     booking_id = models.AutoField(primary_key=True)
     passenger = models.ForeignKey(Passenger, on_delete=models.CASCADE, related_name="bookings")
@@ -192,12 +339,23 @@ class Booking(models.Model):
     class Meta:
         verbose_name = "Booking"
         verbose_name_plural = "Bookings"
+        indexes = [
+            models.Index(fields=["passenger", "trip"], name="booking_passenger_trip_idx"),
+            models.Index(fields=["booking_time"], name="booking_time_idx"),
+        ]
 
     def __str__(self):
         return f"Booking {self.booking_id} by {self.passenger.full_name}"
 
 
 class Payment(models.Model):
+    # Statuses the checkout and payment provider set; the column stays free text
+    STATUS_CHOICES = (
+        ("PENDING", "Pending"),
+        ("COMPLETED", "Completed"),
+        ("FAILED", "Failed"),
+        ("REFUNDED", "Refunded"),
+    )
     payment_id = models.AutoField(primary_key=True)
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="payments")
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
@@ -207,6 +365,10 @@ class Payment(models.Model):
     class Meta:
         verbose_name = "Payment"
         verbose_name_plural = "Payments"
+        indexes = [
+            models.Index(fields=["status", "payment_date"], name="payment_status_date_idx"),
+            models.Index(fields=["payment_date"], name="payment_date_idx"),
+        ]
 
     def __str__(self):
         return f"Payment {self.payment_id} - {self.status}"
@@ -227,3 +389,95 @@ class Ticket(models.Model):
 
     def __str__(self):
         return f"Ticket {self.ticket_id} - Seat {self.seat_number}"
+
+
+class RouteRevenueDaily(models.Model):
+    """
+    Payment totals per route, day and status, kept in step with Payment
+    writes (see core/analytics.py) so reports scan days, not payments.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name="revenue_rollups")
+    day = models.DateField()
+    status = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payments = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Route Revenue (Daily)"
+        verbose_name_plural = "Route Revenue (Daily)"
+        constraints = [
+            models.UniqueConstraint(fields=["route", "day", "status"], name="unique_route_day_status")
+        ]
+        indexes = [
+            models.Index(fields=["day", "route"], name="revenue_day_route_idx"),
+        ]
+
+    def __str__(self):
+        return f"Route {self.route_id} on {self.day} ({self.status}): {self.amount}"
+
+
+class CollectionVersion(models.Model):
+    """
+    Write counter per cached collection (see core/versions.py), bumped on
+    every change so conditional GETs never read the collection itself.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Collection Version"
+        verbose_name_plural = "Collection Versions"
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class EmailOutbox(models.Model):
+    """Email queued inside the writing transaction and sent later by ``manage.py send_outbox``."""
+    outbox_id = models.BigAutoField(primary_key=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    # Set after a failed send (exponential backoff); null means due now
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Email Outbox"
+        verbose_name_plural = "Email Outbox"
+        indexes = [
+            models.Index(fields=["sent_at", "outbox_id"], name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient}"
+
+
+class RequestProfile(models.Model):
+    """
+    A request an admin asked to profile (see core/profiling.py): the
+    cProfile stats in ``.prof`` format plus the SQL it ran.
+    """
+    profile_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True, default="")
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    queries = models.JSONField(default=list)
+    stats = models.BinaryField()
+
+    class Meta:
+        verbose_name = "Request Profile"
+        verbose_name_plural = "Request Profiles"
+        ordering = ["-profile_id"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,106 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Give up on a message after this many failed sends
+MAX_ATTEMPTS = 5
+# Wait this long before the first retry, doubling after each further failure
+RETRY_BASE_SECONDS = 60
+
+
+def enqueue_email(recipient, subject, body):
+    """Queue an email; call inside the transaction that makes it necessary."""
+    return EmailOutbox.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def waiting():
+    """Unsent messages that will still be tried, including those backing off."""
+    return EmailOutbox.objects.filter(sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+
+
+def pending():
+    """Waiting messages that are due for a (re)try now."""
+    return waiting().filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+
+
+def retry_delay(attempts):
+    """Backoff before the next try of a message that has failed ``attempts`` times."""
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def _failed(item, error):
+    item.attempts += 1
+    item.last_error = str(error)
+    item.next_attempt_at = timezone.now() + retry_delay(item.attempts)
+
+
+def backlog():
+    """Messages waiting to be sent, age in seconds of the oldest one, and messages given up on."""
+    waiting_now = waiting().aggregate(count=Count("outbox_id"), oldest=Min("created_at"))
+    oldest = waiting_now["oldest"]
+    return {
+        "pending": waiting_now["count"],
+        "oldest_pending_seconds": (timezone.now() - oldest).total_seconds() if oldest else 0,
+        "failed": EmailOutbox.objects.filter(sent_at__isnull=True, attempts__gte=MAX_ATTEMPTS).count(),
+    }
+
+
+def drain(batch_size=100):
+    """
+    Send one batch of queued emails over a single SMTP connection.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    workers can drain concurrently. A failed message is retried after
+    ``retry_delay(attempts)``; when the mail server cannot be reached at
+    all, the whole batch counts as failed. Returns (sent, failed).
+    """
+    with transaction.atomic():
+        batch = list(pending().select_for_update(skip_locked=True).order_by("outbox_id")[:batch_size])
+        if not batch:
+            return 0, 0
+
+        sent, failed = [], []
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Cannot connect to the mail server: {e}")
+            for item in batch:
+                _failed(item, e)
+            failed = batch
+        else:
+            try:
+                for item in batch:
+                    message = EmailMessage(
+                        subject=item.subject, body=item.body,
+                        from_email=settings.DEFAULT_FROM_EMAIL, to=[item.recipient],
+                        connection=connection,
+                    )
+                    try:
+                        message.send()
+                    except Exception as e:
+                        logger.error(f"Error sending email to {item.recipient}: {e}")
+                        _failed(item, e)
+                        failed.append(item)
+                    else:
+                        item.attempts += 1
+                        item.sent_at = timezone.now()
+                        sent.append(item)
+            finally:
+                try:
+                    connection.close()
+                except Exception as e:
+                    # The messages are already sent; a failed QUIT must not resend them
+                    logger.warning(f"Error closing the mail server connection: {e}")
+
+        EmailOutbox.objects.bulk_update(sent + failed, ["attempts", "sent_at", "last_error", "next_attempt_at"])
+    return len(sent), len(failed)
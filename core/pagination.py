@@ -0,0 +1,100 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opaque cursor pagination keyed on each view's ``ordering``.
+
+    The cursor holds the value of every ordering field of the last row
+    seen, and pages are fetched with a row comparison such as
+    ``WHERE (start_time, trip_id) > (cursor) LIMIT n``, so response time
+    stays flat as tables grow, ties in the leading field never fall back
+    to offsets, and no ``COUNT(*)`` is ever issued. Orderings must end in
+    a unique field (normally the primary key).
+    Clients may shrink or grow a page with ``?page_size=`` up to
+    ``REST_FRAMEWORK["MAX_PAGE_SIZE"]``.
+    """
+    page_size_query_param = "page_size"
+    ordering = "pk"
+
+    @property
+    def max_page_size(self):
+        return settings.REST_FRAMEWORK.get("MAX_PAGE_SIZE", 200)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "ordering", None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        current = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current is not None:
+            queryset = queryset.filter(self._beyond(current, reverse))
+        try:
+            results = list(queryset[:self.page_size + 1])
+        except (ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        self.page = results[:self.page_size]
+        following = self._get_position_from_instance(results[-1], self.ordering) if len(results) > self.page_size else None
+
+        if reverse:
+            self.page.reverse()
+            self.next_position, self.previous_position = current, following
+        else:
+            self.next_position, self.previous_position = following, current
+        self.has_next = self.next_position is not None
+        self.has_previous = self.previous_position is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _beyond(self, position, reverse):
+        """Rows after ``position`` in the (possibly reversed) ordering, as an OR of equal-prefix comparisons."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition, tied = Q(), {}
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            condition |= Q(**tied, **{f"{field}__{lookup}": value})
+            tied[field] = value
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip("-") for order in ordering]
+        if isinstance(instance, dict):
+            return json.dumps([str(instance[field]) for field in fields])
+        return json.dumps([str(getattr(instance, field)) for field in fields])
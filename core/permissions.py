@@ -2,11 +2,22 @@ from rest_framework import permissions
 from rest_framework.permissions import SAFE_METHODS
 
 
+def _claim(request, name):
+    """Value of a signed claim on the request's JWT, or None without one."""
+    token = getattr(request, "auth", None)
+    if token is None or not hasattr(token, "get"):
+        return None
+    return token.get(name)
+
+
 def _role_name(request):
     """Helper to safely get the role name (lowercase) for the requesting user."""
     user = getattr(request, "user", None)
     if not user or not getattr(user, "is_authenticated", False):
         return ""
+    claimed = _claim(request, "role")
+    if claimed is not None:
+        return claimed
     role = getattr(user, "role", None)
     if not role:
         return ""
@@ -51,9 +62,19 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return getattr(obj, "user", None)
         return None
 
+    def _get_owner_passenger_id(self, obj):
+        if hasattr(obj, "passenger_id"):
+            return obj.passenger_id
+        if hasattr(obj, "booking"):
+            return obj.booking.passenger_id
+        return None
+
     def has_object_permission(self, request, view, obj):
         if _role_name(request) == "admin":
             return True
+        passenger_id = _claim(request, "passenger_id")
+        if passenger_id is not None:
+            return self._get_owner_passenger_id(obj) == passenger_id
         owner_user = self._get_owner_user(obj)
         return owner_user == getattr(request, "user", None)
 
@@ -0,0 +1,105 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.core import signing
+
+from .models import RequestProfile
+from .permissions import IsAdmin
+
+# A request is profiled when it carries a token from issue_token() in this header or query parameter
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_PARAM = "profile_token"
+_SALT = "core.profiling"
+
+
+def issue_token(user):
+    """Signed, expiring token that lets ``user`` profile their own requests."""
+    return signing.dumps({"user": user.pk}, salt=_SALT, compress=True)
+
+
+def requested_by(request):
+    """Primary key of the user whose valid token is on the request, or None."""
+    token = request.headers.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE)["user"]
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def is_admin(request, user_id):
+    """Whether the request authenticated as the token's owner and that user passes IsAdmin."""
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated or user.pk != user_id:
+        return False
+    return IsAdmin().has_permission(request, None)
+
+
+class Capture:
+    """
+    cProfile of one request plus every SQL statement it ran. Install as a
+    ``connection.execute_wrapper`` and call ``run(get_response, request)``.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = []
+        self.query_count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            if len(self.queries) < settings.PROFILE_MAX_QUERIES:
+                self.queries.append({"ms": round((time.perf_counter() - started) * 1000, 3), "sql": sql})
+
+    def run(self, get_response, request):
+        started = time.perf_counter()
+        try:
+            return self.profile.runcall(get_response, request)
+        finally:
+            self.seconds = time.perf_counter() - started
+
+
+def store(request, response, capture, user_id):
+    """Save a finished capture, keeping only the newest ``PROFILE_MAX_STORED`` profiles."""
+    capture.profile.create_stats()
+    match = getattr(request, "resolver_match", None)
+    record = RequestProfile.objects.create(
+        user_id=user_id,
+        method=request.method,
+        path=request.path[:500],
+        view_name=(match.view_name if match else "") or "",
+        status_code=response.status_code,
+        duration_ms=round(capture.seconds * 1000, 2),
+        query_count=capture.query_count,
+        queries=capture.queries,
+        stats=marshal.dumps(capture.profile.stats),
+    )
+    stale = RequestProfile.objects.values_list("pk", flat=True)[settings.PROFILE_MAX_STORED:]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+    return record
+
+
+def top_functions(record, sort="cumulative", limit=30):
+    """The ``limit`` most expensive functions of a stored profile, as pstats prints them."""
+    stats = pstats.Stats(_StoredProfile(record), stream=io.StringIO())
+    stats.sort_stats(sort).print_stats(limit)
+    return stats.stream.getvalue()
+
+
+class _StoredProfile:
+    # pstats.Stats accepts any object with create_stats() and a .stats dict
+    def __init__(self, record):
+        self.stats = marshal.loads(bytes(record.stats))
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,242 @@
+import csv
+import io
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+
+from .models import Bus, Conductor, Role, Route, generate_employee_id
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Sent once per import instead of the per-row model signals, with the
+# created objects as ``conductors``, ``buses`` and ``routes`` lists.
+bulk_provisioned = Signal()
+
+CONDUCTOR_COLUMNS = ("email",)
+BUS_COLUMNS = ("registration_number", "conductor")
+ROUTE_COLUMNS = ("name", "start_point", "end_point")
+
+
+class ProvisioningError(Exception):
+    """Raised with every row-level problem found; nothing is written."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid row(s)")
+
+
+def read_csv(source):
+    """Rows of a CSV given as a path, bytes or a text/binary file object."""
+    if source is None:
+        return []
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as handle:
+            return list(csv.DictReader(handle))
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    data = source.read()
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    return list(csv.DictReader(io.StringIO(data)))
+
+
+def _existing(model, field, values, batch_size):
+    """Subset of ``values`` already stored in ``model.field``, checked in chunks."""
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), batch_size):
+        chunk = values[start:start + batch_size]
+        found.update(model.objects.filter(**{f"{field}__in": chunk}).values_list(field, flat=True))
+    return found
+
+
+def _missing_columns(name, rows, required, errors):
+    if rows and not set(required) <= set(rows[0]):
+        missing = ", ".join(sorted(set(required) - set(rows[0])))
+        errors.append(f"{name}: missing column(s) {missing}")
+        return True
+    return False
+
+
+def _unique(name, rows, field, taken, errors):
+    """Flag values repeated within the file or already present in ``taken``."""
+    seen = set()
+    for line, row in enumerate(rows, start=2):
+        value = row[field]
+        if value in seen or value in taken:
+            errors.append(f"{name} line {line}: {field} '{value}' already exists")
+        seen.add(value)
+
+
+def _validate_conductors(rows, batch_size, errors):
+    if _missing_columns("conductors", rows, CONDUCTOR_COLUMNS, errors):
+        return
+    for line, row in enumerate(rows, start=2):
+        row["email"] = User.objects.normalize_email((row.get("email") or "").strip())
+        row["employee_id"] = (row.get("employee_id") or "").strip() or generate_employee_id()
+        if not row["email"]:
+            errors.append(f"conductors line {line}: email is required")
+    _unique("conductors", rows, "email", _existing(User, "email", (r["email"] for r in rows), batch_size), errors)
+    _unique(
+        "conductors", rows, "employee_id",
+        _existing(Conductor, "employee_id", (r["employee_id"] for r in rows), batch_size), errors,
+    )
+
+
+def _validate_buses(rows, conductors, batch_size, errors):
+    if _missing_columns("buses", rows, BUS_COLUMNS, errors):
+        return
+    # Buses reference a conductor by email or employee_id, from this import or the database
+    in_file = {}
+    for row in conductors:
+        in_file[row["email"]] = in_file[row["employee_id"]] = row
+    refs = {(row.get("conductor") or "").strip() for row in rows} - set(in_file)
+    stored = {}
+    emails = [ref for ref in refs if "@" in ref]
+    ids = [ref for ref in refs if "@" not in ref]
+    for field, values in (("user__email", emails), ("employee_id", ids)):
+        for start in range(0, len(values), batch_size):
+            for conductor_id, email, employee_id, bus_id in Conductor.objects.filter(
+                **{f"{field}__in": values[start:start + batch_size]}
+            ).values_list("conductor_id", "user__email", "employee_id", "bus"):
+                stored[email] = stored[employee_id] = (conductor_id, bus_id)
+
+    assigned = set()
+    for line, row in enumerate(rows, start=2):
+        row["registration_number"] = (row.get("registration_number") or "").strip()
+        ref = (row.get("conductor") or "").strip()
+        if not row["registration_number"]:
+            errors.append(f"buses line {line}: registration_number is required")
+        try:
+            row["capacity"] = int(row.get("capacity") or 20)
+            if row["capacity"] <= 0:
+                raise ValueError
+        except ValueError:
+            errors.append(f"buses line {line}: capacity must be a positive integer")
+        if ref in in_file:
+            key = row["_conductor"] = in_file[ref]["email"]
+        elif ref in stored and stored[ref][1] is None:
+            key = row["_conductor"] = stored[ref][0]
+        elif ref in stored:
+            errors.append(f"buses line {line}: conductor '{ref}' already has a bus")
+            continue
+        else:
+            errors.append(f"buses line {line}: unknown conductor '{ref}'")
+            continue
+        if key in assigned:
+            errors.append(f"buses line {line}: conductor '{ref}' is assigned to two buses")
+        assigned.add(key)
+    _unique(
+        "buses", rows, "registration_number",
+        _existing(Bus, "registration_number", (r["registration_number"] for r in rows), batch_size), errors,
+    )
+
+
+def _validate_routes(rows, errors):
+    if _missing_columns("routes", rows, ROUTE_COLUMNS, errors):
+        return
+    for line, row in enumerate(rows, start=2):
+        for field in ROUTE_COLUMNS:
+            row[field] = (row.get(field) or "").strip()
+            if not row[field]:
+                errors.append(f"routes line {line}: {field} is required")
+
+
+def provision(conductors=None, buses=None, routes=None, batch_size=1000, dry_run=False, requested_by=None):
+    """
+    Create conductors (with their users), buses and routes from CSV rows.
+
+    Every row is validated in memory first, with uniqueness checked by a
+    few chunked ``IN`` queries; any problem raises ProvisioningError and
+    nothing is written. Rows are then inserted with ``bulk_create`` in one
+    transaction, which skips the per-row model signals, and
+    ``bulk_provisioned`` is sent once. A unique value taken by a concurrent
+    writer after validation rolls the whole import back the same way. Imported users get an unusable
+    password unless the row has a ``password`` column.
+
+    Returns a report with the per-model counts, elapsed seconds and rows
+    per minute.
+    """
+    started = time.perf_counter()
+    conductors, buses, routes = read_csv(conductors), read_csv(buses), read_csv(routes)
+    errors = []
+    _validate_conductors(conductors, batch_size, errors)
+    if not errors:
+        _validate_buses(buses, conductors, batch_size, errors)
+    _validate_routes(routes, errors)
+    if errors:
+        raise ProvisioningError(errors)
+
+    created = {"conductors": [], "buses": [], "routes": []}
+    if not dry_run:
+        try:
+            with transaction.atomic():
+                created = _write(conductors, buses, routes, batch_size)
+                transaction.on_commit(lambda: bulk_provisioned.send(
+                    sender=Conductor, requested_by=requested_by, **created
+                ))
+        except IntegrityError as e:
+            # A concurrent import or edit took a unique value after validation
+            raise ProvisioningError([f"conflicts with rows written since validation: {e}"]) from e
+
+    rows = len(conductors) + len(buses) + len(routes)
+    elapsed = time.perf_counter() - started
+    report = {
+        "conductors": len(conductors),
+        "buses": len(buses),
+        "routes": len(routes),
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_minute": int(rows / elapsed * 60) if elapsed else rows,
+        "dry_run": dry_run,
+    }
+    logger.info(f"Provisioned {report}")
+    return report
+
+
+def _write(conductors, buses, routes, batch_size):
+    role = Role.objects.get_cached("Conductor")
+    unusable = make_password(None)
+    users = User.objects.bulk_create(
+        [
+            User(
+                email=row["email"], role=role,
+                password=make_password(row["password"]) if row.get("password") else unusable,
+            )
+            for row in conductors
+        ],
+        batch_size=batch_size,
+    )
+    profiles = Conductor.objects.bulk_create(
+        [
+            Conductor(
+                user=user, employee_id=row["employee_id"],
+                full_name=row.get("full_name") or "Conductor",
+                contact_number=row.get("contact_number") or "UNKNOWN",
+            )
+            for user, row in zip(users, conductors)
+        ],
+        batch_size=batch_size,
+    )
+    # ``_conductor`` is a stored conductor_id or the email of one created above
+    ids = {profile.user.email: profile.conductor_id for profile in profiles}
+    new_buses = Bus.objects.bulk_create(
+        [
+            Bus(
+                registration_number=row["registration_number"], capacity=row["capacity"],
+                conductor_id=ids.get(row["_conductor"], row["_conductor"]),
+            )
+            for row in buses
+        ],
+        batch_size=batch_size,
+    )
+    new_routes = Route.objects.bulk_create(
+        [Route(name=row["name"], start_point=row["start_point"], end_point=row["end_point"]) for row in routes],
+        batch_size=batch_size,
+    )
+    return {"conductors": profiles, "buses": new_buses, "routes": new_routes}
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+
+ROUTES = "routes"
+TRIPS = "trips"
+CURRENT_WEATHER = "current-weather"
+NAMESPACES = (ROUTES, TRIPS, CURRENT_WEATHER)
+
+PREFIX = "response-cache"
+
+
+def _generation_key(namespace):
+    return f"{PREFIX}:generation:{namespace}"
+
+
+def generation(namespace):
+    """
+    Current generation of a namespace; entries are keyed by it, so
+    bumping it retires them all at once. A missing counter restarts from
+    the clock, never from a value older entries may still carry.
+    """
+    return cache.get_or_set(_generation_key(namespace), time.time_ns, timeout=None)
+
+
+def _bump(namespace):
+    try:
+        cache.incr(_generation_key(namespace))
+    except ValueError:
+        cache.set(_generation_key(namespace), time.time_ns(), timeout=None)
+
+
+def invalidate(*namespaces):
+    """
+    Retire cached responses now and again once the writing transaction
+    commits, so a reader that refilled the cache from pre-commit data in
+    between cannot outlive the write.
+    """
+    for namespace in namespaces:
+        _bump(namespace)
+        transaction.on_commit(lambda namespace=namespace: _bump(namespace))
+
+
+def key_for(namespace, request, scope=""):
+    """
+    Cache key from the namespace generation, caller scope (e.g. role),
+    origin, path, query and format. Paginated bodies carry absolute
+    next/previous links, so the scheme and host are part of the key.
+    """
+    query = sorted(request.query_params.lists())
+    fmt = getattr(getattr(request, "accepted_renderer", None), "format", "")
+    origin = f"{request.scheme}://{request.get_host()}"
+    digest = hashlib.md5(f"{origin}|{request.path}|{query}|{fmt}".encode()).hexdigest()
+    return f"{PREFIX}:{namespace}:{generation(namespace)}:{scope}:{digest}"
+
+
+def _count(namespace, outcome):
+    key = f"{PREFIX}:{outcome}:{namespace}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def lookup(namespace, key):
+    data = cache.get(key)
+    _count(namespace, "hits" if data is not None else "misses")
+    metrics.registry.inc("lightpath_response_cache_requests_total", (namespace, "hit" if data is not None else "miss"))
+    return data
+
+
+def store(key, data, timeout=None):
+    cache.set(key, data, getattr(settings, "RESPONSE_CACHE_TTL", 300) if timeout is None else timeout)
+
+
+def stats():
+    """Hit/miss counters per namespace, shared by all workers using the same cache."""
+    counters = cache.get_many([f"{PREFIX}:{outcome}:{ns}" for ns in NAMESPACES for outcome in ("hits", "misses")])
+    report = {}
+    for namespace in NAMESPACES:
+        hits = counters.get(f"{PREFIX}:hits:{namespace}", 0)
+        misses = counters.get(f"{PREFIX}:misses:{namespace}", 0)
+        total = hits + misses
+        report[namespace] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 3) if total else None}
+    return report
+
+
+def reset_stats():
+    cache.delete_many([f"{PREFIX}:{outcome}:{ns}" for ns in NAMESPACES for outcome in ("hits", "misses")])
@@ -0,0 +1,104 @@
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import SeatInventory
+
+# Alternatives offered when a requested seat is gone
+ALTERNATIVE_SEATS = 5
+# Lock-timeout retries before a claim gives up (SQLite reports contention as errors)
+CLAIM_ATTEMPTS = 10
+
+
+class SeatUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "seat_unavailable"
+
+    def __init__(self, inventory, seat_numbers):
+        available = inventory.available_seats()
+        if not available:
+            message = "This trip is sold out."
+        elif len(seat_numbers) == 1:
+            message = f"Seat {seat_numbers[0]} is no longer available for this trip."
+        else:
+            message = f"Seats {', '.join(seat_numbers)} are not all available for this trip."
+        super().__init__({"detail": message, "available_seats": available[:ALTERNATIVE_SEATS]})
+
+
+def ensure_inventory(trip):
+    """Return the trip's inventory row, creating it from the bus capacity if missing."""
+    inventory, _ = SeatInventory.objects.get_or_create(
+        trip_id=trip.pk, defaults={"capacity": trip.bus.capacity}
+    )
+    return inventory
+
+
+def lock_inventory(trip):
+    """Lock the trip's inventory row until the surrounding transaction ends."""
+    inventory = SeatInventory.objects.select_for_update().filter(trip_id=trip.pk).first()
+    return inventory or ensure_inventory(trip)
+
+
+def claim(trip, seat_number, write, new_ticket=True):
+    """
+    Run ``write()`` (the ticket insert/update) while holding the trip's
+    inventory lock, so concurrent claims on one trip are serialized.
+
+    Raises SeatUnavailable if the seat is taken or, for a ``new_ticket``,
+    the trip is full; a racing insert that trips the unique_trip_seat
+    constraint is reported the same way.
+    """
+    return _claim(trip, [seat_number], write, new_tickets=1 if new_ticket else 0, mark=False)
+
+
+def claim_many(trip, seat_numbers, write):
+    """
+    Like claim() for several seats at once, for writes that bulk insert
+    tickets. Ticket signals do not fire for bulk inserts, so the seats are
+    marked here, in one inventory update.
+    """
+    return _claim(trip, seat_numbers, write, new_tickets=len(seat_numbers), mark=True)
+
+
+def _claim(trip, seat_numbers, write, new_tickets, mark):
+    for attempt in range(CLAIM_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                inventory = lock_inventory(trip)
+                if inventory.remaining < new_tickets or any(inventory.is_taken(seat) for seat in seat_numbers):
+                    raise SeatUnavailable(inventory, seat_numbers)
+                try:
+                    with transaction.atomic():
+                        result = write()
+                except IntegrityError:
+                    raise SeatUnavailable(inventory, seat_numbers)
+                if mark:
+                    for seat in seat_numbers:
+                        inventory.mark(seat, True)
+                    inventory.save(update_fields=["seats_sold", "seat_map"])
+                return result
+        except OperationalError:
+            if attempt == CLAIM_ATTEMPTS - 1:
+                raise
+            time.sleep(0.01 * (attempt + 1))
+
+
+def occupy(trip_id, seat_number):
+    """Record a ticket for ``seat_number`` against the trip's inventory."""
+    _apply(trip_id, seat_number, taken=True)
+
+
+def release(trip_id, seat_number):
+    """Give ``seat_number`` back after its ticket is deleted or moved."""
+    _apply(trip_id, seat_number, taken=False)
+
+
+def _apply(trip_id, seat_number, taken):
+    with transaction.atomic():
+        inventory = SeatInventory.objects.select_for_update().filter(trip_id=trip_id).first()
+        if inventory is None:
+            return
+        inventory.mark(seat_number, taken)
+        inventory.save(update_fields=["seats_sold", "seat_map"])
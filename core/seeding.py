@@ -0,0 +1,325 @@
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics, response_cache, versions
+from .models import (
+    Booking, Bus, Conductor, Passenger, Payment, Role, Route, SeatInventory, Ticket, Trip, Weather,
+)
+
+User = get_user_model()
+
+# Default password of every seeded user (hashed once, shared by all rows); throwaway
+# test databases only, seed_lightpath asks for or generates one
+SEED_PASSWORD = "lightpath-seed"
+SEED_EMAIL_DOMAIN = "seed.lightpath.test"
+
+PLACES = (
+    "Circle", "Madina", "Kaneshie", "Tema", "Kasoa", "Achimota", "Osu", "Lapaz",
+    "Dansoman", "Spintex", "Adenta", "Teshie", "Nungua", "Dodowa", "Weija", "Amasaman",
+)
+BUS_CAPACITIES = (60, 80, 100, 120, 150)
+# Payment outcomes; only completed and pending bookings hold a seat
+PAYMENT_STATUSES = (("COMPLETED", 80), ("PENDING", 10), ("FAILED", 7), ("REFUNDED", 3))
+SEAT_HOLDING = ("COMPLETED", "PENDING")
+WEATHER_CONDITIONS = (("Clear", 45), ("Clouds", 30), ("Rain", 15), ("Thunderstorm", 5), ("Haze", 5))
+WEATHER_INTERVAL = timedelta(hours=3)
+# Trips are scheduled this far ahead of today as well as ``days`` back
+UPCOMING_DAYS = 7
+
+
+def seed_domain(prefix=""):
+    return f"{prefix}.{SEED_EMAIL_DOMAIN}" if prefix else SEED_EMAIL_DOMAIN
+
+
+def seed_email(kind, index, prefix=""):
+    return f"{kind}{index}@{seed_domain(prefix)}"
+
+
+def _route_tag(prefix):
+    # Seeded route names end with "[seed <i>]" (or "[<prefix> seed <i>]") so flush() can find them
+    return f"[{prefix} seed " if prefix else "[seed "
+
+
+@contextmanager
+def _keep_booking_times():
+    """Let bulk_create store generated booking times instead of stamping them with now()."""
+    field = Booking._meta.get_field("booking_time")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed(conductors=100, routes=50, trips=1000, passengers=2000, bookings=20000, days=90,
+         seed=0, batch_size=5000, workers=1, prefix="", password=SEED_PASSWORD, log=None):
+    """
+    Generate a referentially consistent dataset for every core model with
+    ``bulk_create``, bypassing ``create_user`` and the per-row ``save()``
+    overrides and signals.
+
+    The same arguments always produce the same rows, whatever ``workers``
+    is: bookings are generated in trip chunks, each from its own seeded
+    ``Random``, and ``workers`` > 1 only spreads those chunks over
+    processes. Trips span ``days`` back to a week ahead with 3-hourly
+    weather; every trip gets a booking quota within its bus capacity, so
+    seats are numbered 1..n per trip and ``unique_trip_seat`` holds.
+    Seat inventories and the revenue rollup are written to match.
+    ``prefix`` namespaces emails, registrations and route names so several
+    datasets can coexist and be removed with ``flush(prefix)``. Every
+    seeded user, including a staff admin, gets ``password``. Returns the
+    number of rows created per model.
+    """
+    rng = random.Random(f"{seed}:{prefix}")
+    log = log or (lambda message: None)
+    password = make_password(password)
+    roles = {name: Role.objects.get_or_create(name=name)[0] for name in ("Admin", "Passenger", "Conductor")}
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    first_day = now - timedelta(days=days)
+    tag = f"{prefix.upper()}-" if prefix else ""
+    counts = {}
+
+    with transaction.atomic(), _keep_booking_times():
+        User.objects.bulk_create([
+            User(email=seed_email("admin", 0, prefix), password=password, role=roles["Admin"], is_staff=True,
+                 date_joined=first_day),
+        ])
+        conductor_users = User.objects.bulk_create(
+            [User(email=seed_email("conductor", i, prefix), password=password, role=roles["Conductor"],
+                  date_joined=first_day - timedelta(days=rng.randrange(365)))
+             for i in range(conductors)],
+            batch_size=batch_size,
+        )
+        conductor_rows = Conductor.objects.bulk_create(
+            [Conductor(user=user, full_name=f"Conductor {i}", contact_number=f"020{i:07d}",
+                       employee_id=f"conductor_{prefix}{i:08d}")
+             for i, user in enumerate(conductor_users)],
+            batch_size=batch_size,
+        )
+        bus_rows = Bus.objects.bulk_create(
+            [Bus(conductor=conductor, registration_number=f"{tag}GS-{i:06d}", capacity=rng.choice(BUS_CAPACITIES))
+             for i, conductor in enumerate(conductor_rows)],
+            batch_size=batch_size,
+        )
+        route_rows = Route.objects.bulk_create(
+            [Route(name=f"{start} - {end} {_route_tag(prefix)}{i}]", start_point=start, end_point=end)
+             for i, (start, end) in enumerate(rng.sample(PLACES, 2) for _ in range(routes))],
+            batch_size=batch_size,
+        )
+        log(f"Seeded {conductors} conductors with buses and {routes} routes.")
+
+        conditions, condition_weights = zip(*WEATHER_CONDITIONS)
+        observations = int((days + UPCOMING_DAYS) * timedelta(days=1) / WEATHER_INTERVAL)
+        weather_rows = Weather.objects.bulk_create(
+            [Weather(condition=rng.choices(conditions, condition_weights)[0],
+                     temperature=round(rng.uniform(22.0, 34.0), 1), timestamp=first_day + i * WEATHER_INTERVAL)
+             for i in range(observations)],
+            batch_size=batch_size,
+        )
+
+        trip_rows = []
+        for _ in range(trips):
+            bus = rng.choice(bus_rows)
+            start = first_day + timedelta(days=rng.randrange(days + UPCOMING_DAYS), hours=rng.randrange(5, 22))
+            trip_rows.append(Trip(
+                bus=bus, conductor_id=bus.conductor_id, route=rng.choice(route_rows),
+                weather=weather_rows[min(int((start - first_day) / WEATHER_INTERVAL), observations - 1)],
+                start_time=start, end_time=start + timedelta(minutes=rng.randrange(30, 150)),
+            ))
+        trip_rows = Trip.objects.bulk_create(trip_rows, batch_size=batch_size)
+        log(f"Seeded {observations} weather observations and {trips} trips.")
+
+        passenger_users = User.objects.bulk_create(
+            [User(email=seed_email("passenger", i, prefix), password=password, role=roles["Passenger"],
+                  date_joined=first_day - timedelta(days=rng.randrange(365)))
+             for i in range(passengers)],
+            batch_size=batch_size,
+        )
+        passenger_rows = Passenger.objects.bulk_create(
+            [Passenger(user=user, full_name=f"Passenger {i}", username=f"passenger_{prefix}{i:08d}")
+             for i, user in enumerate(passenger_users)],
+            batch_size=batch_size,
+        )
+        log(f"Seeded {passengers} passengers.")
+
+        counts.update(_seed_bookings(
+            rng, seed, prefix, trip_rows, passenger_rows, bookings, now, batch_size, workers, log,
+        ))
+        counts.update({
+            "users": conductors + passengers + 1, "conductors": conductors, "buses": conductors,
+            "routes": routes, "weather": observations, "trips": trips, "passengers": passengers,
+        })
+        analytics.rebuild_revenue()
+        versions.bump(versions.ROUTES, versions.BUSES, versions.WEATHER)
+        response_cache.invalidate(*response_cache.NAMESPACES)
+    return counts
+
+
+def _booking_quotas(rng, capacities, total):
+    """Spread ``total`` bookings over trips by a random demand, never past a trip's capacity."""
+    room = sum(capacities)
+    if total > room:
+        raise ValueError(f"{total} bookings do not fit in {room} seats; seed more trips or fewer bookings.")
+    if not total:
+        return [0] * len(capacities)
+    demand = [capacity * (0.2 + rng.random()) for capacity in capacities]
+    scale = total / sum(demand)
+    quotas = [min(capacity, int(weight * scale)) for capacity, weight in zip(capacities, demand)]
+    short = total - sum(quotas)
+    while short:
+        open_trips = [i for i, capacity in enumerate(capacities) if quotas[i] < capacity]
+        share = -(-short // len(open_trips))
+        for i in open_trips:
+            extra = min(share, capacities[i] - quotas[i], short)
+            quotas[i] += extra
+            short -= extra
+            if not short:
+                break
+    return quotas
+
+
+def generate_bookings(job):
+    """
+    Bookings for one chunk of trips, as plain tuples so that worker
+    processes never touch the database: (trip position, passenger
+    position, status, seat or None, amount in pesewas, booked at, paid at),
+    times as POSIX timestamps.
+    """
+    seed, prefix, index, trips, passengers, now = job
+    rng = random.Random(f"{seed}:{prefix}:bookings:{index}")
+    statuses, weights = zip(*PAYMENT_STATUSES)
+    rows = []
+    for position, departure, quota in trips:
+        seat = 0
+        for _ in range(quota):
+            status = rng.choices(statuses, weights)[0]
+            if status in SEAT_HOLDING:
+                seat += 1
+            booked = min(departure - rng.randrange(3600, 21 * 86400), now - rng.randrange(60, 3600))
+            rows.append((
+                position, rng.randrange(passengers), status, seat if status in SEAT_HOLDING else None,
+                rng.randrange(500, 4000), booked, min(booked + rng.randrange(0, 900), now),
+            ))
+    return rows
+
+
+def _trip_chunks(trip_rows, quotas, batch_size):
+    chunk, size = [], 0
+    for position, (trip, quota) in enumerate(zip(trip_rows, quotas)):
+        chunk.append((position, trip.start_time.timestamp(), quota))
+        size += quota
+        if size >= batch_size:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def _generated(jobs, workers):
+    """Run generate_bookings over ``jobs`` in order, at most two chunks per worker ahead of the writer."""
+    if workers <= 1:
+        yield from map(generate_bookings, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(generate_bookings, job))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _seed_bookings(rng, seed, prefix, trip_rows, passenger_rows, bookings, now, batch_size, workers, log):
+    capacities = [trip.bus.capacity for trip in trip_rows]
+    quotas = _booking_quotas(rng, capacities, bookings)
+    sold = [0] * len(trip_rows)
+    created = {"bookings": 0, "tickets": 0, "payments": 0}
+    chunks = _trip_chunks(trip_rows, quotas, batch_size)
+    jobs = ((seed, prefix, index, chunk, len(passenger_rows), now.timestamp()) for index, chunk in enumerate(chunks))
+
+    for rows in _generated(jobs, workers):
+        booking_rows = Booking.objects.bulk_create(
+            [Booking(passenger=passenger_rows[passenger], trip=trip_rows[position],
+                     booking_time=datetime.fromtimestamp(booked, dt_timezone.utc))
+             for position, passenger, _, _, _, booked, _ in rows],
+            batch_size=batch_size,
+        )
+        tickets, payments = [], []
+        for booking, (position, _, status, seat, amount, _, paid) in zip(booking_rows, rows):
+            if seat is not None:
+                tickets.append(Ticket(trip_id=booking.trip_id, booking=booking, seat_number=str(seat)))
+                sold[position] = max(sold[position], seat)
+            payments.append(Payment(
+                booking=booking, amount=Decimal(amount) / 100, status=status,
+                payment_date=datetime.fromtimestamp(paid, dt_timezone.utc),
+            ))
+        Ticket.objects.bulk_create(tickets, batch_size=batch_size)
+        Payment.objects.bulk_create(payments, batch_size=batch_size)
+        created["bookings"] += len(booking_rows)
+        created["tickets"] += len(tickets)
+        created["payments"] += len(payments)
+        log(f"Seeded {created['bookings']} bookings.")
+
+    SeatInventory.objects.bulk_create(
+        [
+            SeatInventory(
+                trip=trip, capacity=capacity, seats_sold=seats, seat_map=("1" * seats).ljust(capacity, "0"),
+            )
+            for trip, capacity, seats in zip(trip_rows, capacities, sold)
+        ],
+        batch_size=batch_size,
+    )
+    return created
+
+
+def flush(prefix="", log=None):
+    """
+    Delete a dataset created by ``seed(prefix=...)`` and everything that
+    references it. Rows are removed with plain DELETE statements (no
+    per-row signals), then the rollups, versions and caches are refreshed.
+    Returns the number of rows deleted per model.
+    """
+    log = log or (lambda message: None)
+    users = User.objects.filter(email__endswith=f"@{seed_domain(prefix)}")
+    routes = Route.objects.filter(name__contains=_route_tag(prefix))
+    trips = Trip.objects.filter(conductor__user__in=users) | Trip.objects.filter(route__in=routes)
+    bookings = Booking.objects.filter(trip__in=trips) | Booking.objects.filter(passenger__user__in=users)
+    weather = Weather.objects.filter(pk__in=trips.exclude(weather=None).values("weather_id"))
+    deleted = {}
+
+    with transaction.atomic():
+        weather_ids = list(weather.values_list("pk", flat=True))
+        # Children first, so each filter still reaches its (not yet deleted) parents
+        for name, queryset in (
+            ("tickets", Ticket.objects.filter(booking__in=bookings)),
+            ("payments", Payment.objects.filter(booking__in=bookings)),
+            ("bookings", bookings),
+            ("seat_inventories", SeatInventory.objects.filter(trip__in=trips)),
+            ("trips", trips),
+            ("weather", Weather.objects.filter(pk__in=weather_ids, trips__isnull=True)),
+            ("buses", Bus.objects.filter(conductor__user__in=users)),
+            ("conductors", Conductor.objects.filter(user__in=users)),
+            ("passengers", Passenger.objects.filter(user__in=users)),
+            ("routes", routes),
+            ("admin_log_entries", LogEntry.objects.filter(user__in=users)),
+            ("group_memberships", User.groups.through.objects.filter(user__in=users)),
+            ("user_permissions", User.user_permissions.through.objects.filter(user__in=users)),
+            ("users", users),
+        ):
+            deleted[name] = queryset._raw_delete(queryset.db)
+            log(f"Deleted {deleted[name]} {name}.")
+        analytics.rebuild_revenue()
+        versions.bump(versions.ROUTES, versions.BUSES, versions.WEATHER)
+        response_cache.invalidate(*response_cache.NAMESPACES)
+    return deleted
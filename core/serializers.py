@@ -3,18 +3,96 @@ from django.db import transaction
 from rest_framework.exceptions import ValidationError
 from .models import (
     User, Role, Passenger, Conductor,
-    Bus, Route, Trip, Booking, Ticket, Payment, Weather
+    Bus, Route, Trip, Booking, Ticket, Payment, Weather, SeatInventory
 )
+from . import seats
+from .instrumentation import serializer_timer
+from .seats import ensure_inventory
+
+
+def split_paths(paths):
+    """Group dotted paths by their first segment: ["a.b", "a", "c"] -> {"a": ["b"], "c": []}."""
+    tree = {}
+    for path in paths or ():
+        head, _, tail = path.partition(".")
+        tree.setdefault(head, [])
+        if tail:
+            tree[head].append(tail)
+    return tree
+
+
+class ExpandableFieldsMixin:
+    """
+    Sparse fieldsets and on-demand nesting.
+
+    Related objects listed in ``expandable_fields`` render as primary keys
+    unless named in ``expand``; ``fields`` restricts the readable fields.
+    Both take dotted paths (``expand=["booking.passenger"]``,
+    ``fields=["seat_number", "booking.passenger.full_name"]``) and a dotted
+    field path implies expanding its prefix.
+
+    ``related_fields`` maps plain (non-expandable) fields to the ORM path
+    they read, so it is joined whenever the field is rendered.
+    """
+    expandable_fields = {}
+    related_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        field_tree = split_paths(fields) if fields else None
+        expand_tree = self.expansions(fields, expand)
+
+        if field_tree is not None:
+            for name in list(self.fields):
+                if name not in field_tree and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+        for name, tails in expand_tree.items():
+            nested_fields = field_tree.get(name) if field_tree else None
+            self.fields[name] = self.expandable_fields[name](
+                read_only=True, fields=nested_fields or None, expand=tails
+            )
+
+    def to_representation(self, instance):
+        # Counted towards the request's serializer time (core.middleware)
+        with serializer_timer():
+            return super().to_representation(instance)
+
+    @classmethod
+    def expansions(cls, fields=None, expand=None):
+        """Return {field: nested expand paths} for the expandable fields that will render nested."""
+        field_tree = split_paths(fields) if fields else None
+        tree = split_paths(expand)
+        if field_tree:
+            for name, tails in field_tree.items():
+                if tails:
+                    tree.setdefault(name, [])
+        return {
+            name: tails for name, tails in tree.items()
+            if name in cls.expandable_fields and (field_tree is None or name in field_tree)
+        }
+
+    @classmethod
+    def select_related_for(cls, fields=None, expand=None):
+        """ORM ``select_related`` paths needed to render the requested shape without N+1."""
+        field_tree = split_paths(fields) if fields else {}
+        paths = [path for name, path in cls.related_fields.items() if not field_tree or name in field_tree]
+        for name, tails in cls.expansions(fields, expand).items():
+            nested = cls.expandable_fields[name].select_related_for(field_tree.get(name) or None, tails)
+            paths.extend(f"{name}__{path}" for path in nested)
+            if not nested:
+                paths.append(name)
+        return paths
 
 
 # Role & User
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = ("id", "name")
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     # allow creating/updating password via this serializer (write-only)
     password = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
@@ -50,8 +128,9 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # Passenger & Conductor
-class PassengerSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class PassengerSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"user": UserSerializer}
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source="user", write_only=True
     )
@@ -61,8 +140,9 @@ class PassengerSerializer(serializers.ModelSerializer):
         fields = ("passenger_id", "user", "user_id", "full_name", "username", "contact_number")
 
 
-class ConductorSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class ConductorSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"user": UserSerializer}
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), source="user", write_only=True
     )
@@ -73,8 +153,9 @@ class ConductorSerializer(serializers.ModelSerializer):
 
 
 # Transport Models
-class BusSerializer(serializers.ModelSerializer):
-    conductor = ConductorSerializer(read_only=True)
+class BusSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"conductor": ConductorSerializer}
+    conductor = serializers.PrimaryKeyRelatedField(read_only=True)
     conductor_id = serializers.PrimaryKeyRelatedField(
         queryset=Conductor.objects.all(), source="conductor", write_only=True, required=False, allow_null=True
     )
@@ -89,33 +170,41 @@ class BusSerializer(serializers.ModelSerializer):
         return value
 
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Route
         fields = ("route_id", "name", "start_point", "end_point")
 
-class WeatherSerializer(serializers.ModelSerializer):
+class WeatherSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Weather
         fields = ("weather_id", "condition", "temperature", "timestamp")
 
-class TripSerializer(serializers.ModelSerializer):
-    bus = BusSerializer(read_only=True)
+class TripSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "bus": BusSerializer,
+        "route": RouteSerializer,
+        "conductor": ConductorSerializer,
+        "weather": WeatherSerializer,
+    }
+    related_fields = {"remaining_seats": "seat_inventory"}
+    bus = serializers.PrimaryKeyRelatedField(read_only=True)
     bus_id = serializers.PrimaryKeyRelatedField(
         queryset=Bus.objects.all(), source="bus", write_only=True
     )
-    route = RouteSerializer(read_only=True)
+    route = serializers.PrimaryKeyRelatedField(read_only=True)
     route_id = serializers.PrimaryKeyRelatedField(
         queryset=Route.objects.all(), source="route", write_only=True
     )
-    conductor = ConductorSerializer(read_only=True)
+    conductor = serializers.PrimaryKeyRelatedField(read_only=True)
     conductor_id = serializers.PrimaryKeyRelatedField(
         queryset=Conductor.objects.all(), source="conductor", write_only=True, required=False, allow_null=True
     )
-    weather = WeatherSerializer(read_only=True)
+    weather = serializers.PrimaryKeyRelatedField(read_only=True)
     weather_id = serializers.PrimaryKeyRelatedField(
         queryset=Weather.objects.all(), source="weather", write_only=True, required=False, allow_null=True
     )
+    remaining_seats = serializers.SerializerMethodField()
 
     class Meta:
         model = Trip
@@ -126,8 +215,13 @@ class TripSerializer(serializers.ModelSerializer):
             "conductor", "conductor_id",
             "weather", "weather_id",
             "start_time", "end_time",
+            "remaining_seats",
         )
 
+    def get_remaining_seats(self, obj):
+        inventory = getattr(obj, "seat_inventory", None)
+        return inventory.remaining if inventory else None
+
     def validate(self, attrs):
         start = attrs.get("start_time")
         end = attrs.get("end_time")
@@ -136,9 +230,31 @@ class TripSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class TripSearchSerializer(serializers.Serializer):
+    """Query parameters accepted by the trip listing."""
+    start_point = serializers.CharField(required=False, source="route__start_point")
+    end_point = serializers.CharField(required=False, source="route__end_point")
+    depart_after = serializers.DateTimeField(required=False, source="start_time__gte")
+    depart_before = serializers.DateTimeField(required=False, source="start_time__lt")
+    has_seats = serializers.BooleanField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # "from" and "to" are Python keywords, so rename the fields after declaration
+        self.fields["from"] = self.fields.pop("start_point")
+        self.fields["to"] = self.fields.pop("end_point")
+
+    def validate(self, attrs):
+        after, before = attrs.get("start_time__gte"), attrs.get("start_time__lt")
+        if after and before and before <= after:
+            raise ValidationError("depart_before must be after depart_after.")
+        return attrs
+
+
 # Booking, Ticket, Payment
-class BookingSerializer(serializers.ModelSerializer):
-    passenger = PassengerSerializer(read_only=True)
+class BookingSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"passenger": PassengerSerializer}
+    passenger = serializers.PrimaryKeyRelatedField(read_only=True)
     trip_id = serializers.PrimaryKeyRelatedField(
         queryset=Trip.objects.all(), source="trip", write_only=True
     )
@@ -174,26 +290,68 @@ class BookingSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class TicketSerializer(serializers.ModelSerializer):
-    booking = BookingSerializer(read_only=True)
+class TicketSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"booking": BookingSerializer}
+    booking = serializers.PrimaryKeyRelatedField(read_only=True)
     booking_id = serializers.PrimaryKeyRelatedField(
         queryset=Booking.objects.all(), source="booking", write_only=True
     )
 
     class Meta:
         model = Ticket
-        fields = ("ticket_id", "booking", "booking_id", "seat_number")
+        fields = ("ticket_id", "trip", "booking", "booking_id", "seat_number")
+        read_only_fields = ("trip",)
 
     def validate(self, attrs):
-        booking = attrs.get("booking")
-        seat = attrs.get("seat_number")
-        if booking and seat and Ticket.objects.filter(booking__trip=booking.trip, seat_number=seat).exists():
-            raise ValidationError("This seat is already taken for the selected trip.")
+        booking = attrs.get("booking", getattr(self.instance, "booking", None))
+        seat = attrs.get("seat_number", getattr(self.instance, "seat_number", None))
+        if not booking:
+            return attrs
+
+        # Tickets always belong to their booking's trip
+        attrs["trip"] = booking.trip
+        if self.instance and (self.instance.trip_id, self.instance.seat_number) == (booking.trip_id, seat):
+            return attrs
+
+        inventory = ensure_inventory(booking.trip)
+        if inventory.seat_index(seat) is None:
+            raise ValidationError(f"Seat number must be between 1 and {inventory.capacity}.")
+        # Cheap pre-check; the authoritative one happens under the lock in seats.claim()
+        if inventory.is_taken(seat):
+            raise seats.SeatUnavailable(inventory, [seat])
         return attrs
 
+    def create(self, validated_data):
+        return seats.claim(
+            validated_data["trip"], validated_data["seat_number"],
+            lambda: super(TicketSerializer, self).create(validated_data),
+        )
+
+    def update(self, instance, validated_data):
+        trip = validated_data.get("trip", instance.trip)
+        seat = validated_data.get("seat_number", instance.seat_number)
+        if (trip.pk, seat) == (instance.trip_id, instance.seat_number):
+            return super().update(instance, validated_data)
+        return seats.claim(
+            trip, seat,
+            lambda: super(TicketSerializer, self).update(instance, validated_data),
+            new_ticket=trip.pk != instance.trip_id,
+        )
+
+
+class SeatInventorySerializer(serializers.ModelSerializer):
+    remaining = serializers.IntegerField(read_only=True)
+    taken = serializers.ListField(source="taken_seats", read_only=True)
+    available = serializers.ListField(source="available_seats", read_only=True)
+
+    class Meta:
+        model = SeatInventory
+        fields = ("trip_id", "capacity", "seats_sold", "remaining", "taken", "available")
+
 
-class PaymentSerializer(serializers.ModelSerializer):
-    booking = BookingSerializer(read_only=True)
+class PaymentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"booking": BookingSerializer}
+    booking = serializers.PrimaryKeyRelatedField(read_only=True)
     booking_id = serializers.PrimaryKeyRelatedField(
         queryset=Booking.objects.all(), source="booking", write_only=True
     )
@@ -207,3 +365,58 @@ class PaymentSerializer(serializers.ModelSerializer):
         if value <= 0:
             raise ValidationError("Payment amount must be positive.")
         return value
+
+
+# Checkout
+class CheckoutSerializer(serializers.Serializer):
+    """Booking, its tickets and payment created together in one transaction."""
+    trip_id = serializers.PrimaryKeyRelatedField(queryset=Trip.objects.select_related("bus"), source="trip")
+    seat_numbers = serializers.ListField(child=serializers.CharField(max_length=10), min_length=1, max_length=50)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    # Payments start unpaid; only the payment flow may move them on
+    status = serializers.CharField(read_only=True)
+
+    def validate_seat_numbers(self, value):
+        if len(set(value)) != len(value):
+            raise ValidationError("Seat numbers must be unique.")
+        return value
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise ValidationError("Payment amount must be positive.")
+        return value
+
+    def validate(self, attrs):
+        passenger = self.context["passenger"]
+        trip = attrs["trip"]
+        if Booking.objects.filter(passenger=passenger, trip=trip).exists():
+            raise ValidationError("This passenger already has a booking for the selected trip.")
+
+        inventory = ensure_inventory(trip)
+        invalid = [seat for seat in attrs["seat_numbers"] if inventory.seat_index(seat) is None]
+        if invalid:
+            raise ValidationError(f"Seat numbers must be between 1 and {inventory.capacity}.")
+        return attrs
+
+    def create(self, validated_data):
+        trip = validated_data["trip"]
+        seat_numbers = validated_data["seat_numbers"]
+
+        def write():
+            booking = Booking.objects.create(passenger=self.context["passenger"], trip=trip)
+            tickets = Ticket.objects.bulk_create(
+                [Ticket(trip=trip, booking=booking, seat_number=seat) for seat in seat_numbers]
+            )
+            payment = Payment.objects.create(
+                booking=booking, amount=validated_data["amount"], status="PENDING"
+            )
+            return {"booking": booking, "tickets": tickets, "payment": payment}
+
+        return seats.claim_many(trip, seat_numbers, write)
+
+    def to_representation(self, instance):
+        return {
+            "booking": BookingSerializer(instance["booking"]).data,
+            "tickets": TicketSerializer(instance["tickets"], many=True).data,
+            "payment": PaymentSerializer(instance["payment"]).data,
+        }
@@ -1,8 +1,191 @@
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 import requests
 from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from . import metrics, response_cache, versions
+from .models import Trip, Weather
 
 OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
 
+logger = logging.getLogger(__name__)
+
+
+# Backends
+class OpenWeatherBackend:
+    """
+    OpenWeather over one pooled, keep-alive session.
+
+    Every call is bounded by ``settings.WEATHER_TIMEOUT`` (connect, read)
+    so a slow upstream cannot pin a worker.
+    """
+
+    def __init__(self, session=None):
+        self.session = session or self._build_session()
+        self.timeout = getattr(settings, "WEATHER_TIMEOUT", (2.0, 3.0))
+
+    @staticmethod
+    def _build_session():
+        session = requests.Session()
+        pool_size = getattr(settings, "WEATHER_POOL_SIZE", 10)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get(self, path, params):
+        params = {**params, "appid": settings.OPENWEATHER_API_KEY, "units": "metric"}
+        response = self.session.get(f"{OPENWEATHER_BASE_URL}/{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def current(self, city):
+        return self._get("weather", {"q": city})
+
+    def forecast(self, lat, lon):
+        return self._get("onecall", {"lat": lat, "lon": lon, "exclude": "minutely,hourly,alerts"})
+
+
+class StubWeatherBackend:
+    """Canned OpenWeather-shaped payloads for offline development and tests."""
+
+    def current(self, city):
+        return {
+            "name": city,
+            "dt": int(timezone.now().timestamp()),
+            "main": {"temp": 29.0, "feels_like": 32.0, "humidity": 74},
+            "weather": [{"main": "Clouds", "description": "scattered clouds"}],
+            "wind": {"speed": 3.6},
+        }
+
+    def forecast(self, lat, lon):
+        today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        return {
+            "lat": lat,
+            "lon": lon,
+            "daily": [
+                {
+                    "dt": int((today + timedelta(days=day)).timestamp()),
+                    "temp": {"day": 29.0 + day % 3},
+                    "weather": [{"main": "Rain" if day % 2 else "Clouds", "description": "forecast"}],
+                }
+                for day in range(7)
+            ],
+        }
+
+
+# Caching client
+class WeatherClient:
+    """
+    Per-key TTL cache in front of a weather backend.
+
+    Fresh entries (younger than ``ttl``) are served as-is. Stale entries
+    (within a further ``stale_ttl``) are served immediately while one
+    background refresh runs. Misses block on an upstream call, and
+    concurrent requests for the same key share that single call.
+    """
+
+    def __init__(self, backend, ttl=600, stale_ttl=3600, clock=time.monotonic):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def current(self, city):
+        key = ("current", city.strip().lower())
+        return self._get(key, lambda: self.backend.current(city))
+
+    def forecast(self, lat, lon):
+        key = ("forecast", round(float(lat), 2), round(float(lon), 2))
+        return self._get(key, lambda: self.backend.forecast(lat, lon))
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _get(self, key, fetch):
+        with self._lock:
+            entry = self._cache.get(key)
+            age = self.clock() - entry[0] if entry else None
+            if entry and age < self.ttl:
+                metrics.registry.inc("lightpath_weather_cache_requests_total", ("fresh",))
+                return entry[1]
+            future, leader = self._join(key)
+            stale = entry and age < self.ttl + self.stale_ttl
+            metrics.registry.inc("lightpath_weather_cache_requests_total", ("stale" if stale else "miss",))
+            if stale:
+                if leader:
+                    threading.Thread(target=self._fetch, args=(key, fetch, future), daemon=True).start()
+                return entry[1]
+        if leader:
+            self._fetch(key, fetch, future)
+        return future.result()
+
+    def _join(self, key):
+        """Return the in-flight fetch for ``key``, registering a new one if needed (call with lock held)."""
+        if key in self._inflight:
+            return self._inflight[key], False
+        future = self._inflight[key] = Future()
+        return future, True
+
+    def _fetch(self, key, fetch, future):
+        started = time.perf_counter()
+        try:
+            data = fetch()
+        except Exception as exc:
+            metrics.registry.observe(
+                "lightpath_weather_upstream_duration_seconds", (key[0], "error"), time.perf_counter() - started,
+            )
+            logger.warning(f"Weather fetch for {key} failed: {exc}")
+            future.set_exception(exc)
+        else:
+            metrics.registry.observe(
+                "lightpath_weather_upstream_duration_seconds", (key[0], "ok"), time.perf_counter() - started,
+            )
+            with self._lock:
+                self._cache[key] = (self.clock(), data)
+            future.set_result(data)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_weather_client():
+    """Process-wide WeatherClient built from the WEATHER_* settings."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            backend = import_string(getattr(settings, "WEATHER_BACKEND", "core.services.OpenWeatherBackend"))()
+            _client = WeatherClient(
+                backend,
+                ttl=getattr(settings, "WEATHER_CACHE_TTL", 600),
+                stale_ttl=getattr(settings, "WEATHER_STALE_TTL", 3600),
+            )
+        return _client
+
+
+def reset_weather_client():
+    """Drop the shared client so the next call rebuilds it from settings."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
 def get_current_weather(city: str = None):
     """
     Fetch current weather for a given city.
@@ -10,30 +193,97 @@ def get_current_weather(city: str = None):
     """
     if city is None:
         city = getattr(settings, "DEFAULT_CITY", "Accra")
-
-    url = f"{OPENWEATHER_BASE_URL}/weather"
-    params = {
-        "q": city,
-        "appid": settings.OPENWEATHER_API_KEY,
-        "units": "metric",
-    }
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    return get_weather_client().current(city)
 
 
 def get_weather_forecast(lat: float, lon: float):
     """
     Fetch 7-day weather forecast for a given latitude and longitude.
     """
-    url = f"{OPENWEATHER_BASE_URL}/onecall"
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "exclude": "minutely,hourly,alerts",
-        "appid": settings.OPENWEATHER_API_KEY,
-        "units": "metric",
+    return get_weather_client().forecast(lat, lon)
+
+
+# Ingestion
+def _weather_row(timestamp, temperature, conditions):
+    return Weather(
+        condition=conditions[0]["main"] if conditions else "Unknown",
+        temperature=temperature,
+        timestamp=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+    )
+
+
+def ingest_weather(city=None, lat=None, lon=None):
+    """
+    Store the current observation and the daily forecast as Weather rows.
+
+    Rows are matched on timestamp, so re-ingesting refreshes forecasts in
+    place rather than duplicating them. Returns (created, updated).
+    """
+    city = city or getattr(settings, "DEFAULT_CITY", "Accra")
+    lat = getattr(settings, "WEATHER_LATITUDE", 5.6037) if lat is None else lat
+    lon = getattr(settings, "WEATHER_LONGITUDE", -0.1870) if lon is None else lon
+
+    current = get_current_weather(city)
+    rows = [_weather_row(current["dt"], current["main"]["temp"], current.get("weather"))]
+    forecast = get_weather_forecast(lat, lon)
+    rows += [_weather_row(day["dt"], day["temp"]["day"], day.get("weather")) for day in forecast.get("daily", [])]
+
+    existing = {
+        weather.timestamp: weather
+        for weather in Weather.objects.filter(timestamp__in=[row.timestamp for row in rows])
     }
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    to_create, to_update = [], []
+    for row in rows:
+        match = existing.get(row.timestamp)
+        if match is None:
+            to_create.append(row)
+        elif (match.condition, match.temperature) != (row.condition, row.temperature):
+            match.condition, match.temperature = row.condition, row.temperature
+            to_update.append(match)
+    Weather.objects.bulk_create(to_create)
+    Weather.objects.bulk_update(to_update, ["condition", "temperature"])
+    # Bulk writes skip the model signals that normally bump the version
+    if to_create or to_update:
+        versions.bump(versions.WEATHER)
+        response_cache.invalidate(response_cache.TRIPS, response_cache.CURRENT_WEATHER)
+    return len(to_create), len(to_update)
+
+
+def attach_weather_to_trips(horizon=timedelta(days=7), batch_size=500):
+    """
+    Point each upcoming trip at the Weather row closest to its start time.
+
+    The candidate rows come from one timestamp-indexed range scan; each
+    trip is then matched by binary search and changed trips are written
+    back with bulk_update. Returns the number of trips relinked.
+    """
+    now = timezone.now()
+    trips = Trip.objects.filter(start_time__gte=now, start_time__lt=now + horizon)
+    window = Weather.objects.filter(
+        timestamp__gte=now - timedelta(days=1), timestamp__lt=now + horizon + timedelta(days=1)
+    ).order_by("timestamp").values_list("timestamp", "weather_id")
+    stamps, ids = [], []
+    for stamp, weather_id in window:
+        stamps.append(stamp)
+        ids.append(weather_id)
+    if not stamps:
+        return 0
+
+    changed = []
+    relinked = 0
+    for trip in trips.only("trip_id", "start_time", "weather_id").iterator(chunk_size=batch_size):
+        i = bisect.bisect_left(stamps, trip.start_time)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(stamps)]
+        nearest = min(candidates, key=lambda j: abs(stamps[j] - trip.start_time))
+        if trip.weather_id != ids[nearest]:
+            trip.weather_id = ids[nearest]
+            changed.append(trip)
+        if len(changed) >= batch_size:
+            Trip.objects.bulk_update(changed, ["weather"])
+            relinked += len(changed)
+            changed = []
+    Trip.objects.bulk_update(changed, ["weather"])
+    relinked += len(changed)
+    if relinked:
+        response_cache.invalidate(response_cache.TRIPS)
+    return relinked
@@ -1,9 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import Conductor, Passenger, Role
+from .models import Booking, Bus, Conductor, Passenger, Payment, Role, Route, SeatInventory, Ticket, Trip, Weather
+from . import analytics, response_cache, seats, versions
+from .authentication import invalidate_cached_user
+from .outbox import enqueue_email
+from .provisioning import bulk_provisioned
 import logging
 
 User = get_user_model()
@@ -15,23 +18,200 @@ def user_created(sender, instance, created, **kwargs):
         # Log user creation
         logger.info(f"New user created: {instance.email}")
 
-        # Only send email if DEBUG is False (production)
+        # Only send email if DEBUG is False (production). The outbox row is
+        # written in the creating transaction and sent by `manage.py send_outbox`.
         if not settings.DEBUG:
-            try:
-                send_mail(
-                    subject='Welcome to LightPath Lite',
-                    message='Thank you for registering with LightPath Lite.',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[instance.email],
-                    fail_silently=False,
-                )
-                logger.info(f"Welcome email sent to: {instance.email}")
-            except Exception as e:
-                logger.error(f"Error sending welcome email to {instance.email}: {e}")
+            enqueue_email(
+                recipient=instance.email,
+                subject='Welcome to LightPath Lite',
+                body='Thank you for registering with LightPath Lite.',
+            )
+            logger.info(f"Welcome email queued for: {instance.email}")
 
+@receiver(pre_save, sender=User)
+def assign_default_role(sender, instance, **kwargs):
+    # Set before the insert so new users are written once
+    if instance._state.adding and not instance.role_id:
+        try:
+            instance.role = Role.objects.get_cached("Passenger")
+        except Role.DoesNotExist:
+            instance.role, _ = Role.objects.get_or_create(name="Passenger")
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def drop_cached_roles(sender, **kwargs):
+    Role.objects.clear_cache()
+
+
+@receiver(bulk_provisioned)
+def notify_bulk_provisioned(sender, conductors, buses, routes, requested_by=None, **kwargs):
+    # One summary for the whole import instead of a welcome email per user
+    summary = f"Provisioned {len(conductors)} conductors, {len(buses)} buses and {len(routes)} routes."
+    logger.info(summary)
+    if requested_by is not None and not settings.DEBUG:
+        enqueue_email(recipient=requested_by.email, subject='LightPath Lite provisioning complete', body=summary)
+
+
+@receiver(bulk_provisioned)
+def bump_provisioned_versions(sender, buses, routes, **kwargs):
+    if buses:
+        versions.bump(versions.BUSES)
+    if routes:
+        versions.bump(versions.ROUTES)
+        response_cache.invalidate(response_cache.ROUTES)
+
+
+# Collection versions for conditional GETs (core.versions)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def bump_routes_version(sender, **kwargs):
+    versions.bump(versions.ROUTES)
+
+
+# Bus responses can embed their conductor (?expand=conductor)
+@receiver(post_save, sender=Bus)
+@receiver(post_delete, sender=Bus)
+@receiver(post_save, sender=Conductor)
+@receiver(post_delete, sender=Conductor)
+def bump_buses_version(sender, **kwargs):
+    versions.bump(versions.BUSES)
+
+
+@receiver(post_save, sender=Weather)
+@receiver(post_delete, sender=Weather)
+def bump_weather_version(sender, **kwargs):
+    versions.bump(versions.WEATHER)
+
+
+# Server-side response cache (core.response_cache). Trip payloads can embed
+# the route, bus, conductor and weather. Remaining seats are overlaid on
+# each cache hit (TripListCreateView.from_cache), so ticket sales do not
+# retire the namespace.
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_cached_routes(sender, **kwargs):
+    response_cache.invalidate(response_cache.ROUTES, response_cache.TRIPS)
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+@receiver(post_save, sender=Bus)
+@receiver(post_delete, sender=Bus)
+@receiver(post_save, sender=Conductor)
+@receiver(post_delete, sender=Conductor)
+def invalidate_cached_trips(sender, **kwargs):
+    response_cache.invalidate(response_cache.TRIPS)
+
+
+@receiver(post_save, sender=Weather)
+@receiver(post_delete, sender=Weather)
+def invalidate_cached_weather(sender, **kwargs):
+    response_cache.invalidate(response_cache.TRIPS, response_cache.CURRENT_WEATHER)
+
+
+# Cached authenticated users (core.authentication)
 @receiver(post_save, sender=User)
-def assign_default_role(sender, instance, created, **kwargs):
-    if created and not instance.role:
-        passenger_role, _ = Role.objects.get_or_create(name="Passenger")
-        instance.role = passenger_role
-        instance.save()
\ No newline at end of file
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    versions = {instance.token_version, getattr(instance, "_revoked_token_version", instance.token_version)}
+    invalidate_cached_user(instance.pk, *versions)
+
+
+@receiver(post_save, sender=Passenger)
+@receiver(post_delete, sender=Passenger)
+@receiver(post_save, sender=Conductor)
+@receiver(post_delete, sender=Conductor)
+def drop_cached_profile_owner(sender, instance, **kwargs):
+    # The owner is usually already loaded (e.g. Passenger.objects.create(user=user)); else its version is looked up
+    user = sender.user.field.get_cached_value(instance, default=None)
+    invalidate_cached_user(instance.user_id, *([user.token_version] if user else []))
+
+
+# Seat inventory
+@receiver(post_save, sender=Trip)
+def sync_trip_inventory(sender, instance, created, **kwargs):
+    if created:
+        SeatInventory.objects.create(trip=instance, capacity=instance.bus.capacity)
+    else:
+        SeatInventory.objects.filter(trip=instance).update(capacity=instance.bus.capacity)
+
+
+@receiver(post_save, sender=Bus)
+def sync_bus_capacity(sender, instance, created, **kwargs):
+    if not created:
+        SeatInventory.objects.filter(trip__bus=instance).update(capacity=instance.capacity)
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_previous_seat(sender, instance, **kwargs):
+    instance._previous_seat = None
+    if instance.pk:
+        instance._previous_seat = Ticket.objects.filter(pk=instance.pk).values_list("trip_id", "seat_number").first()
+
+
+@receiver(post_save, sender=Ticket)
+def occupy_seat(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_seat", None)
+    if previous == (instance.trip_id, instance.seat_number):
+        return
+    if previous:
+        seats.release(*previous)
+    seats.occupy(instance.trip_id, instance.seat_number)
+
+
+@receiver(post_delete, sender=Ticket)
+def release_seat(sender, instance, **kwargs):
+    seats.release(instance.trip_id, instance.seat_number)
+
+
+# Revenue rollup (core.analytics)
+@receiver(pre_save, sender=Payment)
+@receiver(pre_delete, sender=Payment)
+def remember_previous_payment(sender, instance, **kwargs):
+    instance._previous_rollup = analytics.stored_payment_key(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Payment)
+def roll_up_payment(sender, instance, **kwargs):
+    analytics.record_payment_change(
+        getattr(instance, "_previous_rollup", None), analytics.stored_payment_key(instance.pk)
+    )
+
+
+@receiver(post_delete, sender=Payment)
+def roll_back_payment(sender, instance, **kwargs):
+    analytics.record_payment_change(getattr(instance, "_previous_rollup", None), None)
+
+
+# A booking moved to another trip, or a trip to another route, takes its
+# payments' rollup buckets along. Queryset .update() bypasses this; run
+# rebuild_rollups after such bulk edits.
+@receiver(pre_save, sender=Booking)
+def remember_previous_booking_trip(sender, instance, update_fields=None, **kwargs):
+    instance._previous_trip = None
+    if instance.pk and (update_fields is None or {"trip", "trip_id"} & set(update_fields)):
+        instance._previous_trip = Booking.objects.filter(pk=instance.pk).values_list("trip_id", "trip__route_id").first()
+
+
+@receiver(post_save, sender=Booking)
+def move_booking_revenue(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_trip", None)
+    if previous is None or previous[0] == instance.trip_id:
+        return
+    route_id = Trip.objects.filter(pk=instance.trip_id).values_list("route_id", flat=True).first()
+    analytics.move_revenue(Payment.objects.filter(booking=instance), previous[1], route_id)
+
+
+@receiver(pre_save, sender=Trip)
+def remember_previous_trip_route(sender, instance, update_fields=None, **kwargs):
+    instance._previous_route_id = None
+    if instance.pk and (update_fields is None or {"route", "route_id"} & set(update_fields)):
+        instance._previous_route_id = Trip.objects.filter(pk=instance.pk).values_list("route_id", flat=True).first()
+
+
+@receiver(post_save, sender=Trip)
+def move_trip_revenue(sender, instance, **kwargs):
+    analytics.move_revenue(
+        Payment.objects.filter(booking__trip=instance), getattr(instance, "_previous_route_id", None), instance.route_id
+    )
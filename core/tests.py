@@ -1,8 +1,55 @@
-from django.test import TestCase
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, connections
+from django.db.models import Sum
+from django.core import mail
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.contrib import admin as django_admin
+from django.urls import reverse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import skipUnless
 from django.contrib.auth import get_user_model
-from .models import Role, Bus, Trip, Conductor, Passenger, Booking, Ticket
-from .serializers import UserSerializer, BusSerializer, TripSerializer
+from decimal import Decimal
+from .models import (
+    Role, Bus, Route, Trip, Conductor, Passenger, Booking, Ticket, Payment, Weather, SeatInventory, EmailOutbox,
+    RouteRevenueDaily, RequestProfile, CollectionVersion,
+)
+from .authentication import RoleRefreshToken
+from .benchmark import InProcessClient, Scenario, compare, default_scenarios, percentile, run_scenario
+from .db_routers import (
+    ReplicaRouter, activate as activate_routing, deactivate as deactivate_routing, pin_to_primary, use_primary,
+)
+from .middleware import PerformanceMiddleware, ProfilingMiddleware, ReplicaRoutingMiddleware
+from .outbox import RETRY_BASE_SECONDS, backlog as outbox_backlog, drain, enqueue_email
+from . import metrics
+from . import response_cache
+from .provisioning import ProvisioningError, bulk_provisioned, provision
+from .profiling import issue_token
+from .seeding import SEED_PASSWORD, flush, seed, seed_email
+from .services import (
+    OpenWeatherBackend, StubWeatherBackend, WeatherClient,
+    attach_weather_to_trips, ingest_weather, reset_weather_client,
+)
+from .serializers import UserSerializer, BusSerializer, TripSerializer, TicketSerializer
+import requests
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 
 User = get_user_model()
@@ -156,4 +203,1759 @@ class PassengerPermissionTest(TestCase):
             f"/api/core/tickets/{self.ticket.id}/",
             {"seat_number": 5}
         )
-        self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST])
\ No newline at end of file
+        self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST])
+
+# Query Budget Tests
+def make_trip(index, route=None, weather=None):
+    """Create a trip with its own conductor, bus and (optionally shared) route."""
+    conductor_user = User.objects.create_user(
+        email=f"conductor{index}@example.com", password="condpass",
+        role=Role.objects.get(name="Conductor"),
+    )
+    conductor = Conductor.objects.create(user=conductor_user, full_name=f"Conductor {index}")
+    bus = Bus.objects.create(registration_number=f"GR-{index}", capacity=40, conductor=conductor)
+    route = route or Route.objects.create(name=f"Route {index}", start_point="Circle", end_point="Madina")
+    return Trip.objects.create(bus=bus, route=route, conductor=conductor, weather=weather)
+
+
+class QueryBudgetTest(TestCase):
+    """Each endpoint issues a fixed number of queries regardless of how many rows it returns."""
+
+    ROWS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="budget-admin@example.com", password="adminpass",
+            role=Role.objects.get(name="Admin"),
+        )
+        cls.passenger_user = User.objects.create_user(
+            email="budget-passenger@example.com", password="passpass",
+            role=Role.objects.get(name="Passenger"),
+        )
+        cls.passenger = Passenger.objects.create(user=cls.passenger_user, full_name="Ama")
+        weather = Weather.objects.create(condition="Rain", temperature=24.0)
+        for i in range(cls.ROWS):
+            trip = make_trip(i, weather=weather)
+            booking = Booking.objects.create(passenger=cls.passenger, trip=trip)
+            Ticket.objects.create(trip=trip, booking=booking, seat_number="1")
+            Payment.objects.create(booking=booking, amount=Decimal("12.50"), status="PAID")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    # Fully expanded shape of each resource; the budget must hold for it too.
+    FULL_EXPAND = {
+        "trips": "bus.conductor.user,route,conductor.user,weather",
+        "buses": "conductor.user",
+        "conductors": "user",
+        "bookings": "passenger.user",
+        "tickets": "booking.passenger.user",
+        "payments": "booking.passenger.user",
+    }
+
+    def assertQueryBudget(self, user, url, budget):
+        expand = self.FULL_EXPAND[url.split("/")[3]]
+        for shaped_url in (url, f"{url}?expand={expand}"):
+            # Re-fetch the user so every request starts from the same cold state.
+            self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+            with self.assertNumQueries(budget):
+                response = self.client.get(shaped_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_admin_list_endpoints(self):
+        budgets = {
+            "/api/core/trips/": 1,
+            # +1 for the collection version behind the ETag
+            "/api/core/buses/": 3,
+            "/api/core/conductors/": 2,
+            "/api/core/bookings/": 2,
+            "/api/core/tickets/": 2,
+            "/api/core/payments/": 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                response = self.assertQueryBudget(self.admin, url, budget)
+                self.assertGreaterEqual(len(response.data["results"]), self.ROWS)
+
+    def test_passenger_list_endpoints(self):
+        for url in ("/api/core/bookings/", "/api/core/tickets/", "/api/core/payments/"):
+            with self.subTest(url=url):
+                response = self.assertQueryBudget(self.passenger_user, url, 3)
+                self.assertEqual(len(response.data["results"]), self.ROWS)
+
+    def test_detail_endpoints(self):
+        trip = Trip.objects.first()
+        booking = Booking.objects.first()
+        budgets = {
+            f"/api/core/trips/{trip.pk}/": 1,
+            f"/api/core/buses/{trip.bus_id}/": 3,
+            f"/api/core/conductors/{trip.conductor_id}/": 2,
+            f"/api/core/bookings/{booking.pk}/": 2,
+            f"/api/core/tickets/{booking.tickets.get().pk}/": 2,
+            f"/api/core/payments/{booking.payments.get().pk}/": 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.admin, url, budget)
+
+    def test_trip_list_budget_is_independent_of_row_count(self):
+        make_trip(self.ROWS + 1)
+        self.assertQueryBudget(self.admin, "/api/core/trips/", 1)
+
+
+# Pagination Tests
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="pager-admin@example.com", password="adminpass",
+            role=Role.objects.get(name="Admin"),
+        )
+        route = Route.objects.create(name="Ring Road", start_point="Circle", end_point="Osu")
+        cls.trips = [make_trip(i, route=route) for i in range(5)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_walks_trips_by_start_time_without_count(self):
+        seen = []
+        url = "/api/core/trips/?page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(any("COUNT(" in q["sql"].upper() for q in ctx.captured_queries))
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(trip["trip_id"] for trip in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, [trip.trip_id for trip in self.trips])
+
+    def test_trips_sharing_a_start_time_are_paged_by_trip_id(self):
+        tied = timezone.now() + timedelta(days=1)
+        route = self.trips[0].route
+        extra = [make_trip(10 + i, route=route) for i in range(7)]
+        Trip.objects.filter(pk__in=[trip.pk for trip in extra]).update(start_time=tied)
+        expected = [trip.trip_id for trip in self.trips] + [trip.trip_id for trip in extra]
+
+        seen, url, pages = [], "/api/core/trips/?page_size=2", []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertFalse(any("OFFSET" in q["sql"].upper() for q in ctx.captured_queries))
+            pages.append(response.data)
+            seen.extend(trip["trip_id"] for trip in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(seen, expected)
+
+        back, url = [], pages[-1]["previous"]
+        while url:
+            response = self.client.get(url)
+            back = [trip["trip_id"] for trip in response.data["results"]] + back
+            url = response.data["previous"]
+        self.assertEqual(back + [trip["trip_id"] for trip in pages[-1]["results"]], expected)
+
+    def test_page_size_is_capped(self):
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "MAX_PAGE_SIZE": 3}):
+            response = self.client.get("/api/core/trips/?page_size=100")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/core/buses/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# Sparse Fieldset Tests
+class SparseFieldsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="sparse-admin@example.com", password="adminpass",
+            role=Role.objects.get(name="Admin"),
+        )
+        passenger_user = User.objects.create_user(
+            email="sparse-passenger@example.com", password="passpass",
+            role=Role.objects.get(name="Passenger"),
+        )
+        cls.passenger = Passenger.objects.create(user=passenger_user, full_name="Kofi")
+        cls.trip = make_trip(1)
+        booking = Booking.objects.create(passenger=cls.passenger, trip=cls.trip)
+        cls.ticket = Ticket.objects.create(trip=cls.trip, booking=booking, seat_number="7")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.get(pk=self.admin.pk))
+
+    def test_nested_objects_default_to_ids(self):
+        response = self.client.get(f"/api/core/trips/{self.trip.pk}/")
+        self.assertEqual(response.data["bus"], self.trip.bus_id)
+        self.assertEqual(response.data["route"], self.trip.route_id)
+
+    def test_expand_nests_requested_objects(self):
+        response = self.client.get(f"/api/core/trips/{self.trip.pk}/?expand=bus.conductor,route")
+        self.assertEqual(response.data["bus"]["conductor"]["full_name"], "Conductor 1")
+        self.assertEqual(response.data["bus"]["conductor"]["user"], self.trip.conductor.user_id)
+        self.assertEqual(response.data["route"]["name"], "Route 1")
+        self.assertEqual(response.data["conductor"], self.trip.conductor_id)
+
+    def test_dotted_fields_select_a_flat_summary(self):
+        url = f"/api/core/tickets/{self.ticket.pk}/?fields=seat_number,booking.passenger.full_name"
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data, {"seat_number": "7", "booking": {"passenger": {"full_name": "Kofi"}}})
+
+    def test_queryset_joins_follow_requested_shape(self):
+        self.assertEqual(TicketSerializer.select_related_for(), [])
+        self.assertEqual(
+            TicketSerializer.select_related_for(expand=["booking.passenger.user"]),
+            ["booking__passenger__user"],
+        )
+        self.assertEqual(
+            TicketSerializer.select_related_for(fields=["seat_number", "booking.passenger.full_name"]),
+            ["booking__passenger"],
+        )
+
+
+# Seat Inventory Tests
+class SeatInventoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = make_trip(1)
+        Bus.objects.filter(pk=cls.trip.bus_id).update(capacity=3)
+        SeatInventory.objects.filter(trip=cls.trip).update(capacity=3)
+        cls.passenger_user = User.objects.create_user(
+            email="seat-passenger@example.com", password="passpass",
+            role=Role.objects.get(name="Passenger"),
+        )
+        passenger = Passenger.objects.create(user=cls.passenger_user, full_name="Esi")
+        cls.booking = Booking.objects.create(passenger=passenger, trip=cls.trip)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.get(pk=self.passenger_user.pk))
+
+    def book(self, seat):
+        return self.client.post("/api/core/tickets/", {"booking_id": self.booking.pk, "seat_number": seat})
+
+    def test_inventory_created_with_trip(self):
+        inventory = make_trip(2).seat_inventory
+        self.assertEqual(inventory.capacity, 40)
+        self.assertEqual(inventory.remaining, 40)
+
+    def test_ticket_writes_update_seat_map(self):
+        response = self.book("2")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["trip"], self.trip.pk)
+
+        response = self.client.get(f"/api/core/trips/{self.trip.pk}/seats/")
+        self.assertEqual(response.data["taken"], ["2"])
+        self.assertEqual(response.data["available"], ["1", "3"])
+        self.assertEqual(response.data["remaining"], 2)
+
+        Ticket.objects.get(trip=self.trip, seat_number="2").delete()
+        self.assertEqual(SeatInventory.objects.get(trip=self.trip).remaining, 3)
+
+    def test_rejects_taken_and_out_of_range_seats(self):
+        self.assertEqual(self.book("1").status_code, status.HTTP_201_CREATED)
+        response = self.book("1")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["available_seats"], ["2", "3"])
+        response = self.book("4")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("between 1 and 3", str(response.data))
+
+    def test_moving_a_ticket_frees_the_old_seat(self):
+        ticket = Ticket.objects.create(trip=self.trip, booking=self.booking, seat_number="1")
+        ticket.seat_number = "3"
+        ticket.save()
+        self.assertEqual(SeatInventory.objects.get(trip=self.trip).taken_seats(), ["3"])
+
+    def test_trip_listing_reports_remaining_seats_without_scanning_tickets(self):
+        Ticket.objects.create(trip=self.trip, booking=self.booking, seat_number="1")
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/core/trips/")
+        self.assertEqual(response.data["results"][0]["remaining_seats"], 2)
+
+
+# Seat Contention Tests
+class SeatContentionTest(TransactionTestCase):
+    """Hammer one trip from many threads; every seat sells exactly once and losers get a 409."""
+
+    CAPACITY = 12
+    WORKERS = 16
+    # Keep the seeded roles for test cases that run after this one
+    serialized_rollback = True
+
+    def setUp(self):
+        self.trip = make_trip(1)
+        Bus.objects.filter(pk=self.trip.bus_id).update(capacity=self.CAPACITY)
+        SeatInventory.objects.filter(trip=self.trip).update(capacity=self.CAPACITY)
+        self.bookings = []
+        for i in range(self.WORKERS):
+            user = User.objects.create_user(
+                email=f"rush{i}@example.com", password="passpass",
+                role=Role.objects.get(name="Passenger"),
+            )
+            passenger = Passenger.objects.create(user=user)
+            self.bookings.append(Booking.objects.create(passenger=passenger, trip=self.trip))
+
+    def rush(self, booking, results):
+        client = APIClient()
+        client.force_authenticate(user=booking.passenger.user)
+        seat = "1"
+        try:
+            while True:
+                response = client.post("/api/core/tickets/", {"booking_id": booking.pk, "seat_number": seat})
+                results.append(response.status_code)
+                if response.status_code != status.HTTP_409_CONFLICT or not response.data["available_seats"]:
+                    return
+                seat = response.data["available_seats"][0]
+        finally:
+            connection.close()
+
+    def test_concurrent_claims_never_oversell(self):
+        results = []
+        threads = [threading.Thread(target=self.rush, args=(booking, results)) for booking in self.bookings]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sold = results.count(status.HTTP_201_CREATED)
+        throughput = f"{self.WORKERS} workers: {sold} seats in {elapsed:.2f}s ({sold / elapsed:.1f} allocations/s)"
+        self.assertEqual(set(results) - {status.HTTP_201_CREATED, status.HTTP_409_CONFLICT}, set(), throughput)
+        self.assertEqual(sold, self.CAPACITY, throughput)
+        self.assertEqual(Ticket.objects.filter(trip=self.trip).count(), self.CAPACITY)
+        inventory = SeatInventory.objects.get(trip=self.trip)
+        self.assertEqual(inventory.remaining, 0)
+        self.assertEqual(len(inventory.taken_seats()), self.CAPACITY)
+
+
+# Checkout Tests
+class CheckoutTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = make_trip(1)
+        cls.passenger_user = User.objects.create_user(
+            email="family@example.com", password="passpass",
+            role=Role.objects.get(name="Passenger"),
+        )
+        cls.passenger = Passenger.objects.create(user=cls.passenger_user, full_name="Mensah")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def checkout(self, seats, trip=None, **extra):
+        self.client.force_authenticate(user=User.objects.get(pk=self.passenger_user.pk))
+        return self.client.post(
+            "/api/core/checkout/",
+            {"trip_id": (trip or self.trip).pk, "seat_numbers": seats, "amount": "60.00", **extra},
+            format="json",
+        )
+
+    def test_group_checkout_creates_everything_at_once(self):
+        response = self.checkout(["1", "2", "3", "4", "5"])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([t["seat_number"] for t in response.data["tickets"]], ["1", "2", "3", "4", "5"])
+        self.assertEqual(response.data["payment"]["booking"], response.data["booking"]["booking_id"])
+        self.assertEqual(Ticket.objects.filter(booking__passenger=self.passenger).count(), 5)
+        self.assertEqual(SeatInventory.objects.get(trip=self.trip).taken_seats(), ["1", "2", "3", "4", "5"])
+
+    def test_query_count_does_not_grow_with_group_size(self):
+        other_trip = make_trip(2)
+        with CaptureQueriesContext(connection) as single:
+            self.assertEqual(self.checkout(["1"]).status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as group:
+            self.assertEqual(self.checkout(["1", "2", "3", "4", "5", "6"], trip=other_trip).status_code, 201)
+        self.assertEqual(len(group), len(single))
+
+    def test_conflict_rolls_back_the_whole_checkout(self):
+        other = Passenger.objects.create(user=User.objects.create_user(email="x@example.com", password="x"))
+        booking = Booking.objects.create(passenger=other, trip=self.trip)
+        Ticket.objects.create(trip=self.trip, booking=booking, seat_number="2")
+
+        response = self.checkout(["1", "2"])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["available_seats"], ["1", "3", "4", "5", "6"])
+        self.assertFalse(Booking.objects.filter(passenger=self.passenger).exists())
+        self.assertFalse(Payment.objects.exists())
+
+    def test_client_cannot_set_the_payment_status(self):
+        response = self.checkout(["1"], status="COMPLETED")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["payment"]["status"], "PENDING")
+        self.assertEqual(Payment.objects.get(booking__passenger=self.passenger).status, "PENDING")
+
+    def test_rejects_duplicate_and_out_of_range_seats(self):
+        self.assertEqual(self.checkout(["1", "1"]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.checkout(["41"]).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Trip Search Tests
+class TripSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="searcher@example.com", password="passpass",
+            role=Role.objects.get(name="Passenger"),
+        )
+        cls.madina = Route.objects.create(name="Madina", start_point="Circle", end_point="Madina")
+        cls.osu = Route.objects.create(name="Osu", start_point="Circle", end_point="Osu")
+        base = timezone.now().replace(microsecond=0)
+        cls.morning = make_trip(1, route=cls.madina)
+        cls.evening = make_trip(2, route=cls.madina)
+        cls.osu_trip = make_trip(3, route=cls.osu)
+        for trip, hours in ((cls.morning, 2), (cls.evening, 10), (cls.osu_trip, 3)):
+            Trip.objects.filter(pk=trip.pk).update(start_time=base + timedelta(hours=hours))
+        cls.base = base
+        SeatInventory.objects.filter(trip=cls.evening).update(seats_sold=40)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, **params):
+        response = self.client.get("/api/core/trips/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [trip["trip_id"] for trip in response.data["results"]]
+
+    def test_filters_by_route_endpoints(self):
+        self.assertEqual(self.search(**{"from": "Circle", "to": "Madina"}), [self.morning.pk, self.evening.pk])
+        self.assertEqual(self.search(to="Osu"), [self.osu_trip.pk])
+
+    def test_filters_by_departure_window(self):
+        params = {
+            "depart_after": (self.base + timedelta(hours=1)).isoformat(),
+            "depart_before": (self.base + timedelta(hours=5)).isoformat(),
+        }
+        self.assertEqual(self.search(**params), [self.morning.pk, self.osu_trip.pk])
+
+    def test_filters_by_seat_availability(self):
+        self.assertEqual(self.search(to="Madina", has_seats="true"), [self.morning.pk])
+        self.assertEqual(self.search(has_seats="false"), [self.evening.pk])
+
+    def test_rejects_invalid_window(self):
+        response = self.client.get("/api/core/trips/", {"depart_after": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == "sqlite", "planner choices on near-empty tables are SQLite-specific")
+class IndexUsageTest(TestCase):
+    """The query planner picks the search indexes for the hot filters."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_trip_search_uses_route_start_index(self):
+        queryset = Trip.objects.filter(route_id=1, start_time__gte=timezone.now())
+        self.assertUsesIndex(queryset, "trip_route_start_idx")
+
+    def test_route_lookup_uses_endpoint_index(self):
+        self.assertUsesIndex(Route.objects.filter(start_point="Circle", end_point="Madina"), "route_endpoints_idx")
+        self.assertUsesIndex(Route.objects.filter(end_point="Madina"), "route_end_point_idx")
+
+    def test_booking_lookup_uses_passenger_trip_index(self):
+        self.assertUsesIndex(Booking.objects.filter(passenger_id=1, trip_id=1), "booking_passenger_trip_idx")
+
+    def test_payment_report_uses_status_date_index(self):
+        queryset = Payment.objects.filter(status="PAID", payment_date__gte=timezone.now())
+        self.assertUsesIndex(queryset, "payment_status_date_idx")
+
+    def test_ticket_lookup_uses_booking_index(self):
+        self.assertUsesIndex(Ticket.objects.filter(booking_id=1), "core_ticket_booking_id")
+
+
+# Weather Client Tests
+class CountingBackend(StubWeatherBackend):
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+        self.fail = False
+
+    def current(self, city):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise requests.ConnectionError("upstream down")
+        data = super().current(city)
+        data["call"] = self.calls
+        return data
+
+
+class WeatherClientTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.backend = CountingBackend()
+        self.weather = WeatherClient(self.backend, ttl=60, stale_ttl=300, clock=lambda: self.now)
+
+    def wait_for_refresh(self):
+        while self.weather._inflight:
+            time.sleep(0.01)
+
+    def test_fresh_entries_are_served_from_cache(self):
+        self.weather.current("Accra")
+        self.now += 30
+        self.assertEqual(self.weather.current(" accra ")["call"], 1)
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_stale_entries_are_served_while_refreshing(self):
+        self.weather.current("Accra")
+        self.now += 120
+        self.assertEqual(self.weather.current("Accra")["call"], 1)
+        self.wait_for_refresh()
+        self.assertEqual(self.weather.current("Accra")["call"], 2)
+
+    def test_expired_entries_block_on_upstream(self):
+        self.weather.current("Accra")
+        self.now += 1000
+        self.assertEqual(self.weather.current("Accra")["call"], 2)
+
+    def test_failed_refresh_keeps_stale_entry(self):
+        self.weather.current("Accra")
+        self.now += 120
+        self.backend.fail = True
+        self.weather.current("Accra")
+        self.wait_for_refresh()
+        self.assertEqual(self.weather.current("Accra")["call"], 1)
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        self.backend.delay = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.weather.current("Kumasi"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_openweather_backend_uses_pooled_session_with_timeouts(self):
+        class FakeSession:
+            def get(self, url, params, timeout):
+                self.timeout = timeout
+                response = requests.Response()
+                response.status_code = 200
+                response._content = b'{"name": "Accra"}'
+                return response
+
+        session = FakeSession()
+        with self.settings(WEATHER_TIMEOUT=(1.0, 2.5)):
+            backend = OpenWeatherBackend(session=session)
+        self.assertEqual(backend.current("Accra"), {"name": "Accra"})
+        self.assertEqual(session.timeout, (1.0, 2.5))
+        pooled = OpenWeatherBackend._build_session()
+        self.assertEqual(pooled.get_adapter("https://api.openweathermap.org")._pool_maxsize, settings.WEATHER_POOL_SIZE)
+
+
+class CurrentWeatherViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_weather_client()
+        self.addCleanup(reset_weather_client)
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(email="sky@example.com", password="x"))
+
+    def test_serves_stub_backend_offline(self):
+        with self.settings(WEATHER_BACKEND="core.services.StubWeatherBackend"):
+            response = self.client.get("/api/core/weather/current/", {"city": "Tema"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["city"], "Tema")
+        self.assertEqual(response.data["weather"], "scattered clouds")
+
+
+# Weather Ingestion Tests
+@override_settings(WEATHER_BACKEND="core.services.StubWeatherBackend")
+class WeatherIngestionTest(TestCase):
+    def setUp(self):
+        reset_weather_client()
+        self.addCleanup(reset_weather_client)
+
+    def test_ingest_is_idempotent(self):
+        created, updated = ingest_weather()
+        self.assertEqual((created, updated), (8, 0))
+        self.assertEqual(ingest_weather(), (0, 0))
+        self.assertEqual(Weather.objects.count(), 8)
+
+    def test_upcoming_trips_link_to_nearest_record(self):
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        near = Weather.objects.create(condition="Rain", temperature=24, timestamp=noon + timedelta(days=2))
+        Weather.objects.create(condition="Sun", temperature=31, timestamp=noon + timedelta(days=3))
+        trip = make_trip(1)
+        past = make_trip(2)
+        Trip.objects.filter(pk=trip.pk).update(start_time=noon + timedelta(days=2, hours=5))
+        Trip.objects.filter(pk=past.pk).update(start_time=noon - timedelta(days=2))
+
+        self.assertEqual(attach_weather_to_trips(), 1)
+        trip.refresh_from_db()
+        past.refresh_from_db()
+        self.assertEqual(trip.weather, near)
+        self.assertIsNone(past.weather)
+        self.assertEqual(attach_weather_to_trips(), 0)
+
+    def test_command_ingests_and_links(self):
+        trip = make_trip(1)
+        Trip.objects.filter(pk=trip.pk).update(start_time=timezone.now() + timedelta(days=1))
+        out = StringIO()
+        call_command("ingest_weather", stdout=out)
+        self.assertIn("8 created", out.getvalue())
+        trip.refresh_from_db()
+        self.assertIsNotNone(trip.weather)
+
+
+# Role Claim Tests
+class RoleClaimsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/core/auth/register/", {"email": "claims@example.com", "password": "s3cret-pass"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.tokens = response.data["token"]
+        self.user = User.objects.get(email="claims@example.com")
+
+    def authenticate(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_tokens_carry_role_and_profile_claims(self):
+        access = AccessToken(self.tokens["access"])
+        self.assertEqual(access["role"], "passenger")
+        self.assertEqual(access["passenger_id"], self.user.passenger_profile.pk)
+        self.assertIsNone(access["conductor_id"])
+
+        response = self.client.post(
+            "/api/core/auth/login/", {"email": "claims@example.com", "password": "s3cret-pass"}, format="json"
+        )
+        self.assertEqual(AccessToken(response.data["access"])["role"], "passenger")
+
+    def test_permission_checks_skip_role_and_profile_queries(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/bookings/")
+        # The user comes from the auth cache; only the page of bookings is queried
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/core/bookings/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_miss_loads_user_role_and_profiles_together(self):
+        cache.clear()
+        self.authenticate(self.tokens["access"])
+        with self.assertNumQueries(1):
+            self.client.get("/api/core/auth/profile/")
+
+    def test_profile_is_served_from_the_cached_projection(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/auth/profile/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/core/auth/profile/")
+        self.assertEqual(response.data["email"], "claims@example.com")
+        self.assertEqual(response.data["username"], self.user.passenger_profile.username)
+
+    def test_profile_changes_invalidate_cached_user(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/auth/profile/")
+        Passenger.objects.filter(user=self.user).update(full_name="Stale")
+        passenger = Passenger.objects.get(user=self.user)
+        passenger.full_name = "Akosua"
+        passenger.save()
+        self.assertEqual(self.client.get("/api/core/auth/profile/").data["full_name"], "Akosua")
+
+    def test_cache_holds_a_slim_projection_keyed_by_token_version(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/bookings/")
+        cached = cache.get(f"auth-user:{self.user.pk}:{self.user.token_version}")
+        self.assertEqual(cached["passenger_profile"]["passenger_id"], self.user.passenger_profile.pk)
+        self.assertEqual(cached["role"], "Passenger")
+        self.assertNotIn("password", cached)
+        self.assertFalse(any(self.user.password in str(value) for value in cached.values()))
+
+    def test_stale_entry_for_an_old_token_version_is_dropped_on_role_change(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/bookings/")
+        self.user.role = Role.objects.get(name="Conductor")
+        self.user.save()
+        self.assertIsNone(cache.get(f"auth-user:{self.user.pk}:{self.user.token_version - 1}"))
+        self.assertEqual(self.client.get("/api/core/bookings/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected_despite_cache(self):
+        self.authenticate(self.tokens["access"])
+        self.client.get("/api/core/bookings/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/core/bookings/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_conductor_trip_creation_uses_claims(self):
+        trip = make_trip(0)
+        conductor = Conductor.objects.get(user__email="conductor0@example.com")
+        other = make_trip(1).conductor
+        self.authenticate(str(RoleRefreshToken.for_user(conductor.user).access_token))
+        self.client.get("/api/core/bookings/")
+        payload = {"bus_id": trip.bus_id, "route_id": trip.route_id, "conductor_id": other.pk}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/core/trips/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data["conductor"], conductor.pk)
+        # Neither the role nor the caller's conductor profile is looked up
+        lookups = ('"core_role"', '"core_conductor"."user_id" =')
+        self.assertFalse([q for q in ctx.captured_queries if any(lookup in q["sql"] for lookup in lookups)])
+
+    def test_saves_without_a_role_change_do_not_reread_the_role(self):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            user.last_login = timezone.now()
+            user.save(update_fields=["last_login"])
+            user.is_staff = True
+            user.save()
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith("SELECT")])
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, self.user.token_version)
+
+    def test_role_change_with_update_fields_still_revokes(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.role = Role.objects.get(name="Conductor")
+        user.save(update_fields=["role"])
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, self.user.token_version + 1)
+        self.authenticate(self.tokens["access"])
+        self.assertEqual(self.client.get("/api/core/bookings/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_revokes_tokens(self):
+        self.user.role = Role.objects.get(name="Conductor")
+        self.user.save()
+        self.authenticate(self.tokens["access"])
+        self.assertEqual(self.client.get("/api/core/bookings/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        response = self.client.post("/api/core/auth/token/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# Registration Outbox Tests
+class RegistrationOutboxTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def register(self, email):
+        return self.client.post("/api/core/auth/register/", {"email": email, "password": "pw-123456"}, format="json")
+
+    def test_registration_queues_welcome_email_instead_of_sending(self):
+        self.assertEqual(self.register("new@example.com").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual(queued.recipient, "new@example.com")
+        self.assertIsNone(queued.sent_at)
+
+    def test_user_is_written_once_with_default_role(self):
+        with CaptureQueriesContext(connection) as ctx:
+            user = User.objects.create_user(email="plain@example.com", password="x")
+        self.assertEqual(user.role.name, "Passenger")
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith(("INSERT", "UPDATE")) and "core_user" in q["sql"]]
+        self.assertEqual(len(writes), 1)
+
+    def test_duplicate_email_is_rejected_without_partial_writes(self):
+        self.register("dup@example.com")
+        response = self.register("dup@example.com")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_missing_email_is_a_validation_error(self):
+        response = self.client.post("/api/core/auth/register/", {"password": "pw-123456"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "A valid email is required.")
+        self.assertFalse(User.objects.exists())
+
+    def test_other_integrity_errors_are_not_reported_as_duplicate_email(self):
+        with mock.patch.object(Passenger.objects, "create", side_effect=IntegrityError("profile clash")):
+            with self.assertRaisesMessage(IntegrityError, "profile clash"):
+                self.register("clash@example.com")
+        self.assertFalse(User.objects.filter(email="clash@example.com").exists())
+
+    def test_worker_sends_batches_over_one_connection(self):
+        for i in range(3):
+            self.register(f"batch{i}@example.com")
+        opened = []
+        real_open = locmem.EmailBackend.open
+
+        def tracking_open(backend):
+            opened.append(backend)
+            return real_open(backend)
+
+        out = StringIO()
+        with mock.patch.object(locmem.EmailBackend, "open", tracking_open):
+            call_command("send_outbox", stdout=out)
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn("3 sent", out.getvalue())
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failed_sends_are_retried_later(self):
+        self.register("flaky@example.com")
+        with mock.patch.object(locmem.EmailBackend, "send_messages", side_effect=OSError("smtp down")):
+            self.assertEqual(drain(), (0, 1))
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.attempts, queued.last_error), (1, "smtp down"))
+        # Backing off: not retried straight away, but still counted as pending
+        self.assertEqual(drain(), (0, 0))
+        self.assertEqual(outbox_backlog()["pending"], 1)
+
+        later = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS + 1)
+        with mock.patch("django.utils.timezone.now", return_value=later), \
+                mock.patch.object(locmem.EmailBackend, "send_messages", side_effect=OSError("smtp down")):
+            self.assertEqual(drain(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.next_attempt_at, later + timedelta(seconds=2 * RETRY_BASE_SECONDS))
+        with mock.patch("django.utils.timezone.now", return_value=queued.next_attempt_at):
+            self.assertEqual(drain(), (1, 0))
+
+    def test_unreachable_mail_server_fails_the_batch_without_crashing(self):
+        for i in range(2):
+            self.register(f"down{i}@example.com")
+        with mock.patch.object(locmem.EmailBackend, "open", side_effect=ConnectionRefusedError("refused")):
+            self.assertEqual(drain(), (0, 2))
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list("attempts", "last_error")), {(1, "refused")},
+        )
+        self.assertFalse(EmailOutbox.objects.filter(next_attempt_at__isnull=True).exists())
+
+    def test_looping_worker_pauses_after_a_failed_batch(self):
+        self.register("outage@example.com")
+        sleeps = []
+
+        def stop(seconds):
+            sleeps.append(seconds)
+            raise KeyboardInterrupt
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", side_effect=OSError("smtp down")), \
+                mock.patch("core.management.commands.send_outbox.time.sleep", side_effect=stop):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("send_outbox", loop=True, interval=7, stdout=StringIO())
+        self.assertEqual(sleeps, [7])
+        self.assertEqual(EmailOutbox.objects.get().attempts, 1)
+
+
+class ProfileIdentifierTest(TestCase):
+    def test_profiles_get_identifiers_without_lookups(self):
+        user = User.objects.create_user(email="ident@example.com", password="pass1234")
+        with CaptureQueriesContext(connection) as ctx:
+            passenger = Passenger.objects.create(user=user)
+        # Only the INSERT; the savepoint guarding it against collisions aside
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(passenger.username.startswith("passenger_"))
+
+    def test_colliding_generated_identifier_is_redrawn(self):
+        taken = Passenger.objects.create(user=User.objects.create_user(email="first@example.com", password="p"))
+        user = User.objects.create_user(email="second@example.com", password="p")
+        with mock.patch("core.models.generate_passenger_username", return_value="passenger_0123456789abcdef"):
+            passenger = Passenger.objects.create(user=user, username=taken.username)
+        self.assertEqual(passenger.username, "passenger_0123456789abcdef")
+        self.assertEqual(Passenger.objects.count(), 2)
+
+        conductor = Conductor.objects.create(user=User.objects.create_user(email="c1@example.com", password="p"))
+        with mock.patch("core.models.generate_employee_id", return_value=conductor.employee_id):
+            with self.assertRaises(IntegrityError):
+                Conductor.objects.create(
+                    user=User.objects.create_user(email="c2@example.com", password="p"),
+                    employee_id=conductor.employee_id,
+                )
+
+    def test_bulk_create_assigns_unique_identifiers(self):
+        users = User.objects.bulk_create(
+            [User(email=f"bulk{i}@example.com") for i in range(200)]
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            Conductor.objects.bulk_create([Conductor(user=user) for user in users])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        ids = set(Conductor.objects.values_list("employee_id", flat=True))
+        self.assertEqual(len(ids), 200)
+        self.assertTrue(all(employee_id.startswith("conductor_") for employee_id in ids))
+
+    def test_cleared_identifier_is_regenerated_on_save(self):
+        user = User.objects.create_user(email="blank@example.com", password="pass1234")
+        passenger = Passenger.objects.create(user=user, username="")
+        self.assertTrue(passenger.username.startswith("passenger_"))
+
+
+class BulkProvisioningTest(TestCase):
+    def conductors_csv(self, count, start=0, prefix=""):
+        lines = ["email,full_name,employee_id"]
+        lines += [
+            f"{prefix}c{i}@depot.example.com,Conductor {i},EMP-{prefix}{i}" for i in range(start, start + count)
+        ]
+        return "\n".join(lines).encode()
+
+    def buses_csv(self, count, prefix=""):
+        lines = ["registration_number,capacity,conductor"]
+        lines += [f"GR-{prefix}{i},30,EMP-{prefix}{i}" for i in range(count)]
+        return "\n".join(lines).encode()
+
+    def test_queries_do_not_grow_with_rows(self):
+        routes = "name,start_point,end_point\n" + "\n".join(f"R{i},Accra,Kumasi" for i in range(300))
+        with CaptureQueriesContext(connection) as small:
+            provision(
+                conductors=self.conductors_csv(5), buses=self.buses_csv(5),
+                routes="\n".join(routes.splitlines()[:6]).encode(),
+            )
+        with CaptureQueriesContext(connection) as large:
+            report = provision(
+                conductors=self.conductors_csv(300, prefix="L"),
+                buses=self.buses_csv(300, prefix="L"),
+                routes=routes.encode(),
+                batch_size=1000,
+            )
+        # Only SQLite's bound-parameter limit splits the larger INSERTs
+        self.assertLess(len(large.captured_queries), len(small.captured_queries) + 10)
+        self.assertEqual(report["rows"], 900)
+        self.assertEqual(Bus.objects.count(), 305)
+        conductor = Conductor.objects.select_related("user__role", "bus").get(employee_id="EMP-L7")
+        self.assertEqual(conductor.user.role.name, "Conductor")
+        self.assertEqual(conductor.bus.registration_number, "GR-L7")
+        self.assertFalse(conductor.user.has_usable_password())
+
+    def test_invalid_rows_are_reported_and_nothing_is_written(self):
+        User.objects.create_user(email="c1@depot.example.com", password="pass1234")
+        buses = b"registration_number,capacity,conductor\nGR-0,0,EMP-2\nGR-1,30,nobody@example.com"
+        with self.assertRaises(ProvisioningError) as ctx:
+            provision(conductors=self.conductors_csv(3), buses=buses)
+        self.assertIn("conductors line 3: email 'c1@depot.example.com' already exists", ctx.exception.errors)
+        self.assertFalse(Conductor.objects.exists())
+
+        with self.assertRaises(ProvisioningError) as ctx:
+            provision(conductors=self.conductors_csv(3, start=2), buses=buses)
+        self.assertEqual(ctx.exception.errors, [
+            "buses line 2: capacity must be a positive integer",
+            "buses line 3: unknown conductor 'nobody@example.com'",
+        ])
+        self.assertFalse(Bus.objects.exists())
+
+    def test_one_aggregated_notification(self):
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs)
+        bulk_provisioned.connect(handler)
+        self.addCleanup(bulk_provisioned.disconnect, handler)
+        with self.captureOnCommitCallbacks(execute=True):
+            provision(conductors=self.conductors_csv(20), buses=self.buses_csv(20))
+        self.assertEqual(len(received), 1)
+        self.assertEqual((len(received[0]["conductors"]), len(received[0]["buses"])), (20, 20))
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_command_reports_throughput(self):
+        routes = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        routes.write("name,start_point,end_point\nR1,Accra,Tema\n")
+        routes.close()
+        self.addCleanup(os.remove, routes.name)
+        out = StringIO()
+        call_command("provision_csv", routes=routes.name, dry_run=True, stdout=out)
+        self.assertIn("Validated 0 conductors, 0 buses and 1 routes", out.getvalue())
+        self.assertIn("rows/minute", out.getvalue())
+        self.assertFalse(Route.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("provision_csv")
+
+    def test_admin_endpoint(self):
+        admin = User.objects.create_superuser(email="root@example.com", password="adminpass")
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        response = client.post("/api/core/admin/provision/", {
+            "conductors": SimpleUploadedFile("conductors.csv", self.conductors_csv(2)),
+            "buses": SimpleUploadedFile("buses.csv", self.buses_csv(2)),
+        }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data["conductors"], response.data["buses"]), (2, 2))
+
+        response = client.post("/api/core/admin/provision/", {
+            "buses": SimpleUploadedFile("buses.csv", self.buses_csv(1)),
+        }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("buses line 2: conductor 'EMP-0' already has a bus", response.data["rows"])
+
+        # A staff account without the Admin role is refused
+        client.force_authenticate(user=User.objects.create_user(
+            email="staff-passenger@example.com", password="pass1234", is_staff=True,
+            role=Role.objects.get(name="Passenger"),
+        ))
+        response = client.post("/api/core/admin/provision/", {
+            "routes": SimpleUploadedFile("routes.csv", b"name,start_point,end_point\nR1,Accra,Tema\n"),
+        }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_concurrent_conflicts_are_reported_as_row_errors(self):
+        # Another import takes the email between validation and the INSERT
+        with mock.patch("core.provisioning._validate_conductors"):
+            User.objects.create_user(email="c0@depot.example.com", password="pass1234")
+            with self.assertRaises(ProvisioningError) as ctx:
+                provision(conductors=self.conductors_csv(2))
+        self.assertEqual(len(ctx.exception.errors), 1)
+        self.assertIn("conflicts with rows written since validation", ctx.exception.errors[0])
+        self.assertFalse(Conductor.objects.exists())
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = make_trip(1)
+        cls.admin = User.objects.create_user(
+            email="finance@example.com", password="adminpass", role=Role.objects.get(name="Admin")
+        )
+        passenger = Passenger.objects.create(
+            user=User.objects.create_user(email="rider@example.com", password="passpass"), full_name="Ama"
+        )
+        for seat, payment_status in enumerate(["COMPLETED", "PENDING", "COMPLETED"], start=1):
+            booking = Booking.objects.create(passenger=passenger, trip=cls.trip)
+            Ticket.objects.create(trip=cls.trip, booking=booking, seat_number=str(seat))
+            Payment.objects.create(
+                booking=booking, amount=Decimal("12.50"), status=payment_status,
+                payment_date=timezone.now() - timedelta(days=seat),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def body(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_payments_stream_as_csv_with_filters(self):
+        since = (timezone.now() - timedelta(days=2, hours=1)).date().isoformat()
+        response = self.client.get(f"/api/core/admin/exports/payments.csv?status=COMPLETED&since={since}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self.body(response).splitlines()
+        self.assertEqual(lines[0], "payment_id,booking_id,passenger_id,trip_id,amount,status,payment_date")
+        self.assertEqual(len(lines), 2)
+        self.assertIn(",12.50,COMPLETED,", lines[1])
+
+    def test_bookings_stream_as_ndjson_filtered_by_payment_status(self):
+        response = self.client.get("/api/core/admin/exports/bookings.ndjson?status=PENDING")
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]["passenger_name"], rows[0]["route"]), ("Ama", self.trip.route.name))
+
+    def test_one_query_per_chunk_without_serializers(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.body(self.client.get("/api/core/admin/exports/tickets.csv"))
+        self.assertEqual(len([q for q in ctx.captured_queries if "core_ticket" in q["sql"]]), 1)
+
+    def test_rejects_bad_input_and_non_admins(self):
+        self.assertEqual(self.client.get("/api/core/admin/exports/buses.csv").status_code, 404)
+        self.assertEqual(self.client.get("/api/core/admin/exports/payments.csv?since=soon").status_code, 400)
+        self.client.force_authenticate(user=User.objects.get(email="rider@example.com"))
+        self.assertEqual(self.client.get("/api/core/admin/exports/payments.csv").status_code, 403)
+
+    def test_command_writes_export(self):
+        out = StringIO()
+        call_command("export_records", "tickets", "--format", "ndjson", "--chunk-size", "2", stdout=out)
+        self.assertEqual([json.loads(line)["seat_number"] for line in out.getvalue().splitlines()], ["1", "2", "3"])
+
+
+class RollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = make_trip(1)
+        cls.other_trip = make_trip(2, route=cls.trip.route)
+        cls.admin = User.objects.create_user(
+            email="analyst@example.com", password="adminpass", role=Role.objects.get(name="Admin")
+        )
+        cls.passenger = Passenger.objects.create(
+            user=User.objects.create_user(email="payer@example.com", password="passpass")
+        )
+
+    def pay(self, amount, payment_status="COMPLETED", trip=None, seat="1"):
+        booking = Booking.objects.create(passenger=self.passenger, trip=trip or self.trip)
+        Ticket.objects.create(trip=booking.trip, booking=booking, seat_number=seat)
+        return Payment.objects.create(booking=booking, amount=Decimal(amount), status=payment_status)
+
+    def buckets(self):
+        return sorted(
+            (row.status, row.amount, row.payments)
+            for row in RouteRevenueDaily.objects.filter(route=self.trip.route, payments__gt=0)
+        )
+
+    def test_payment_writes_update_the_rollup(self):
+        first = self.pay("20.00", "PENDING")
+        self.pay("15.50", trip=self.other_trip)
+        self.assertEqual(self.buckets(), [("COMPLETED", Decimal("15.50"), 1), ("PENDING", Decimal("20.00"), 1)])
+
+        first.status = "COMPLETED"
+        first.amount = Decimal("25.00")
+        first.save()
+        self.assertEqual(self.buckets(), [("COMPLETED", Decimal("40.50"), 2)])
+
+        first.delete()
+        self.assertEqual(self.buckets(), [("COMPLETED", Decimal("15.50"), 1)])
+
+    def test_moving_bookings_and_trips_moves_their_revenue(self):
+        payment = self.pay("12.00")
+        elsewhere = make_trip(3)
+        booking = payment.booking
+        booking.trip = elsewhere
+        booking.save()
+        self.assertEqual(self.buckets(), [])
+        moved = RouteRevenueDaily.objects.get(route=elsewhere.route, status="COMPLETED")
+        self.assertEqual((moved.amount, moved.payments), (Decimal("12.00"), 1))
+
+        elsewhere.route = self.trip.route
+        elsewhere.save()
+        self.assertEqual(self.buckets(), [("COMPLETED", Decimal("12.00"), 1)])
+        self.assertFalse(RouteRevenueDaily.objects.filter(route=moved.route, payments__gt=0).exists())
+
+    def test_rebuild_matches_incremental_rollup(self):
+        for i, amount in enumerate(["10.00", "12.00", "7.25"], start=1):
+            self.pay(amount, "COMPLETED" if i % 2 else "FAILED", seat=str(i))
+        incremental = self.buckets()
+        RouteRevenueDaily.objects.update(amount=0, payments=0)
+        SeatInventory.objects.update(seats_sold=0, seat_map="")
+        out = StringIO()
+        call_command("rebuild_rollups", stdout=out)
+        self.assertIn("Occupancy: 2 trips rebuilt.", out.getvalue())
+        self.assertEqual(self.buckets(), incremental)
+        self.assertEqual(SeatInventory.objects.get(trip=self.trip).taken_seats(), ["1", "2", "3"])
+
+    def test_analytics_endpoints_read_rollups_only(self):
+        self.pay("30.00")
+        self.pay("10.00", seat="2")
+        self.pay("20.00", trip=self.other_trip)
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            revenue = client.get("/api/core/admin/analytics/revenue/", {"status": "COMPLETED"})
+        self.assertFalse([q for q in ctx.captured_queries if "core_payment" in q["sql"]])
+        self.assertEqual(len(revenue.data["results"]), 1)
+        row = revenue.data["results"][0]
+        self.assertEqual((row["route_id"], row["amount"], row["payments"]), (self.trip.route_id, Decimal("60.00"), 3))
+
+        occupancy = client.get("/api/core/admin/analytics/occupancy/", {"bus": self.trip.bus_id})
+        self.assertEqual(occupancy.data["results"][0]["seats_sold"], 2)
+        self.assertAlmostEqual(occupancy.data["results"][0]["load_factor"], 2 / 40)
+
+        self.assertEqual(client.get("/api/core/admin/analytics/revenue/", {"since": "May"}).status_code, 400)
+        client.force_authenticate(user=User.objects.get(email="payer@example.com"))
+        self.assertEqual(client.get("/api/core/admin/analytics/revenue/").status_code, 403)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.route = Route.objects.create(name="Coastal", start_point="Accra", end_point="Cape Coast")
+        cls.reader = User.objects.create_user(email="reader@example.com", password="readpass")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+
+    def test_repeat_fetch_is_not_modified_without_touching_routes(self):
+        first = self.client.get("/api/core/routes/")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn("no-cache", first["Cache-Control"])
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get("/api/core/routes/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again["ETag"], first["ETag"])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("core_route", ctx.captured_queries[0]["sql"])
+
+        by_date = self.client.get(f"/api/core/routes/{self.route.pk}/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(by_date.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_change_the_validators(self):
+        etag = self.client.get("/api/core/routes/")["ETag"]
+        self.route.name = "Coastal Express"
+        self.route.save()
+        response = self.client.get("/api/core/routes/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["name"], "Coastal Express")
+
+    def test_bulk_weather_ingest_changes_the_validators(self):
+        etag = self.client.get("/api/core/weather/")["ETag"]
+        with override_settings(WEATHER_BACKEND="core.services.StubWeatherBackend"):
+            reset_weather_client()
+            self.addCleanup(reset_weather_client)
+            ingest_weather()
+        self.assertEqual(self.client.get("/api/core/weather/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unchanged_collections_keep_their_validators(self):
+        etag = self.client.get("/api/core/weather/")["ETag"]
+        self.route.save()
+        self.assertEqual(self.client.get("/api/core/weather/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ResponseCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.trip = make_trip(1)
+        cls.reader = User.objects.create_user(
+            email="cached@example.com", password="readpass", role=Role.objects.get(name="Passenger")
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.reader)
+
+    def test_repeat_listing_is_served_from_cache(self):
+        first = self.client.get("/api/core/trips/", {"expand": "route"})
+        # Only the page's seat counts are read on a hit
+        with self.assertNumQueries(1):
+            again = self.client.get("/api/core/trips/", {"expand": "route"})
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(response_cache.stats()["trips"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_keys_vary_by_query_and_role(self):
+        self.client.get("/api/core/routes/")
+        self.client.get("/api/core/routes/", {"fields": "name"})
+        self.client.force_authenticate(user=User.objects.create_user(
+            email="cached-admin@example.com", password="adminpass", role=Role.objects.get(name="Admin")
+        ))
+        self.client.get("/api/core/routes/")
+        self.assertEqual(response_cache.stats()["routes"]["misses"], 3)
+
+    def test_writes_invalidate_dependent_listings(self):
+        self.client.get("/api/core/trips/", {"expand": "route"})
+        route = self.trip.route
+        route.name = "Renamed"
+        route.save()
+        response = self.client.get("/api/core/trips/", {"expand": "route"})
+        self.assertEqual(response.data["results"][0]["route"]["name"], "Renamed")
+        self.assertEqual(response_cache.stats()["trips"]["hits"], 0)
+
+    def test_ticket_sales_keep_the_cache_but_report_fresh_seats(self):
+        self.client.get("/api/core/trips/", {"expand": "route"})
+        booking = Booking.objects.create(
+            passenger=Passenger.objects.create(user=self.reader), trip=self.trip
+        )
+        Ticket.objects.create(trip=self.trip, booking=booking, seat_number="1")
+        response = self.client.get("/api/core/trips/", {"expand": "route"})
+        self.assertEqual(response.data["results"][0]["remaining_seats"], 39)
+        self.assertEqual(response_cache.stats()["trips"]["hits"], 1)
+
+        sparse = self.client.get("/api/core/trips/", {"fields": "remaining_seats"})
+        self.client.get("/api/core/trips/", {"fields": "remaining_seats"})
+        self.assertEqual(sparse.data["results"], [{"remaining_seats": 39}])
+        self.assertEqual(response_cache.stats()["trips"]["hits"], 2)
+
+    def test_seat_filtered_searches_expire_quickly(self):
+        with self.settings(RESPONSE_CACHE_SEATS_TTL=7), mock.patch("core.response_cache.cache.set") as store:
+            self.client.get("/api/core/trips/", {"has_seats": "true"})
+        self.assertEqual(store.call_args.args[2], 7)
+
+    def test_keys_vary_by_host(self):
+        self.client.get("/api/core/trips/", {"page_size": 1}, HTTP_HOST="a.example.com")
+        self.client.get("/api/core/trips/", {"page_size": 1}, HTTP_HOST="b.example.com")
+        self.assertEqual(response_cache.stats()["trips"]["misses"], 2)
+
+    def test_current_weather_is_cached_per_city(self):
+        with self.settings(WEATHER_BACKEND="core.services.StubWeatherBackend"):
+            reset_weather_client()
+            self.addCleanup(reset_weather_client)
+            self.client.get("/api/core/weather/current/", {"city": "Tema"})
+            with mock.patch("core.views.get_current_weather") as fetch:
+                response = self.client.get("/api/core/weather/current/", {"city": "Tema"})
+            fetch.assert_not_called()
+        self.assertEqual(response.data["city"], "Tema")
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get("/api/core/admin/cache/").status_code, 403)
+        self.client.force_authenticate(user=User.objects.create_user(
+            email="ops@example.com", password="adminpass", role=Role.objects.get(name="Admin")
+        ))
+        self.assertIn("current-weather", self.client.get("/api/core/admin/cache/").data)
+
+
+class AdminChangelistTest(TestCase):
+    """Changelist query counts stay flat as the tables grow."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser(email="staff@example.com", password="adminpass")
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def add_rows(self, start, count):
+        passenger = Passenger.objects.create(
+            user=User.objects.create_user(email=f"admin-rows{start}@example.com", password="x"), full_name="Esi"
+        )
+        for i in range(start, start + count):
+            trip = make_trip(i, weather=Weather.objects.create(condition="Rain"))
+            booking = Booking.objects.create(passenger=passenger, trip=trip)
+            Ticket.objects.create(trip=trip, booking=booking, seat_number="1")
+            Payment.objects.create(booking=booking, amount=Decimal("5.00"), status="PAID")
+        EmailOutbox.objects.create(recipient="ops@example.com", subject="Report", body="...")
+
+    def changelist_queries(self):
+        counts = {}
+        for model in django_admin.site._registry:
+            if model._meta.app_label != "core":
+                continue
+            url = reverse(f"admin:core_{model._meta.model_name}_changelist")
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_rows(0, 2)
+        few = self.changelist_queries()
+        self.add_rows(2, 8)
+        self.assertEqual(self.changelist_queries(), few)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_large_tables_use_estimated_counts(self):
+        self.add_rows(0, 3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("admin:core_payment_changelist"))
+        self.assertContains(response, "3 Payments")
+        self.assertContains(response, "?status=REFUNDED")
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT(*)" in q["sql"]])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("admin:core_payment_changelist"), {"status": "PAID"})
+        self.assertTrue([q for q in ctx.captured_queries if "COUNT(*)" in q["sql"]])
+
+
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            make_trip(i)
+        cls.user = User.objects.create_user(email="timed@example.com", password="timepass")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_and_structured_log(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        with self.assertLogs("core.performance", level="INFO") as logs:
+            response = self.client.get("/api/core/trips/", {"expand": "route"})
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", serialize;dur=[\d.]+, total;dur=')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "core:trip-list-create")
+        self.assertEqual((record["status"], record["db_queries"]), (200, 1))
+        self.assertEqual(record["bytes"], len(response.content))
+        self.assertGreater(record["serializer_ms"], 0)
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_server_timing_is_opt_in(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/api/core/trips/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_log_their_top_queries(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        with self.assertLogs("core.performance.slow", level="WARNING") as logs:
+            self.client.get("/api/core/trips/")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertIn("core_trip", record["top_queries"][0]["sql"])
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_disabled_middleware_leaves_the_stack(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            PerformanceMiddleware(lambda request: None)
+
+
+class SeedingTest(TestCase):
+    SIZES = dict(conductors=3, routes=2, trips=6, passengers=5, bookings=200, days=30, batch_size=50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.own_trip = make_trip(0)
+        cls.counts = seed(**cls.SIZES)
+
+    def snapshot(self):
+        return list(
+            Payment.objects.order_by("booking_id").values_list(
+                "booking__trip__route__name", "booking__trip__bus__registration_number",
+                "booking__passenger__user__email", "status", "amount", "booking__tickets__seat_number",
+            )
+        )
+
+    def test_seeded_data_is_consistent(self):
+        self.assertEqual(self.counts["bookings"], Booking.objects.count())
+        self.assertEqual(Payment.objects.count(), 200)
+        self.assertEqual(Payment.objects.filter(status__in=("COMPLETED", "PENDING")).count(), Ticket.objects.count())
+        for inventory in SeatInventory.objects.exclude(trip=self.own_trip):
+            seats = sorted(int(seat) for seat in inventory.trip.tickets.values_list("seat_number", flat=True))
+            self.assertEqual(seats, list(range(1, inventory.seats_sold + 1)))
+            self.assertLessEqual(inventory.seats_sold, inventory.capacity)
+        self.assertFalse(Trip.objects.exclude(pk=self.own_trip.pk).filter(weather=None).exists())
+        self.assertLess(Booking.objects.earliest("booking_time").booking_time, timezone.now() - timedelta(days=1))
+        completed = Payment.objects.filter(status="COMPLETED").aggregate(total=Sum("amount"))["total"]
+        rolled_up = RouteRevenueDaily.objects.filter(status="COMPLETED").aggregate(total=Sum("amount"))["total"]
+        self.assertEqual(completed, rolled_up)
+
+    def test_empty_booking_or_trip_counts(self):
+        self.assertEqual(seed(**{**self.SIZES, "bookings": 0}, prefix="nb")["bookings"], 0)
+        self.assertEqual(seed(**{**self.SIZES, "trips": 0, "bookings": 0}, prefix="nt")["trips"], 0)
+
+    def test_output_is_deterministic_across_worker_counts(self):
+        before = self.snapshot()
+        flush()
+        seed(**self.SIZES, workers=2)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_flush_removes_only_the_seeded_dataset(self):
+        seed(**self.SIZES, prefix="eu")
+        deleted = flush(prefix="eu")
+        self.assertEqual(deleted["bookings"], 200)
+        self.assertEqual(Booking.objects.count(), 200)
+        self.assertEqual(flush()["trips"], 6)
+        self.assertEqual(list(Trip.objects.all()), [self.own_trip])
+        self.assertFalse(User.objects.filter(email__endswith=".lightpath.test").exists())
+        self.assertFalse(RouteRevenueDaily.objects.exists())
+
+    @override_settings(DEBUG=True)
+    def test_command_reports_oversized_or_duplicate_datasets(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_lightpath", trips=1, bookings=1000, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("seed_lightpath", **self.SIZES, workers=1, stdout=StringIO())
+        out = StringIO()
+        call_command("seed_lightpath", **self.SIZES, workers=1, prefix="b2", stdout=out)
+        self.assertIn("passenger0@b2.seed.lightpath.test", out.getvalue())
+
+    def test_command_refuses_production_and_never_uses_a_known_password(self):
+        with self.assertRaisesMessage(CommandError, "--allow-production"):
+            call_command("seed_lightpath", **self.SIZES, workers=1, prefix="p1", stdout=StringIO())
+        self.assertFalse(User.objects.filter(email__endswith="@p1.seed.lightpath.test").exists())
+
+        out = StringIO()
+        call_command("seed_lightpath", **self.SIZES, workers=1, prefix="p1", allow_production=True, stdout=out)
+        password = re.search(r"generated password '([^']+)'", out.getvalue()).group(1)
+        admin = User.objects.get(email="admin0@p1.seed.lightpath.test")
+        self.assertTrue(admin.check_password(password))
+        self.assertFalse(admin.check_password(SEED_PASSWORD))
+
+        with override_settings(DEBUG=True):
+            call_command("seed_lightpath", **self.SIZES, workers=1, prefix="p2", password="chosen-pw", stdout=StringIO())
+        self.assertTrue(User.objects.get(email="admin0@p2.seed.lightpath.test").check_password("chosen-pw"))
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = seed(conductors=3, routes=2, trips=6, passengers=5, bookings=200)
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.get(email=seed_email("passenger", 0))
+        self.token = str(RoleRefreshToken.for_user(user).access_token)
+
+    def test_scenarios_report_latency_and_queries(self):
+        scenarios = {scenario.name: scenario for scenario in default_scenarios()}
+        listing = run_scenario(scenarios["trips_list"], lambda: InProcessClient(self.token), requests=5, concurrency=1)
+        self.assertEqual((listing["requests"], listing["errors"]), (5, 0))
+        self.assertIsNotNone(listing["p95_ms"])
+        self.assertIsNotNone(listing["queries_per_request"])
+
+        tickets_before = Ticket.objects.count()
+        purchase = run_scenario(scenarios["ticket_create"], lambda: InProcessClient(self.token), requests=3, concurrency=1)
+        self.assertEqual(purchase["errors"], 0)
+        self.assertEqual(Ticket.objects.count(), tickets_before + 3)
+
+        # Closing the scenarios restores the seeded dataset for the next run
+        for scenario in scenarios.values():
+            scenario.close()
+        self.assertEqual(Booking.objects.count(), self.counts["bookings"])
+        self.assertEqual(Ticket.objects.count(), tickets_before)
+        self.assertEqual(SeatInventory.objects.aggregate(sold=Sum("seats_sold"))["sold"], tickets_before)
+
+        missing = Scenario("missing", "get", "/api/core/trips/999999/")
+        self.assertEqual(run_scenario(missing, lambda: InProcessClient(self.token), requests=2, concurrency=1)["errors"], 2)
+
+    def test_percentiles_and_comparison(self):
+        self.assertEqual(percentile(list(range(1, 101)), 0.95), 95)
+        self.assertEqual(percentile([7], 0.99), 7)
+        before = {"scenarios": {"trips_list": {"p95_ms": 10.0, "throughput_rps": 100}}}
+        after = {"scenarios": {"trips_list": {"p95_ms": 12.0, "throughput_rps": 90}, "login": {"p95_ms": 5.0}}}
+        self.assertEqual(compare(before, after), {
+            "trips_list": {"p95_ms": (10.0, 12.0), "p95_change_pct": 20.0, "throughput_rps": (100, 90)},
+        })
+
+
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_trip(0)
+        cls.admin = User.objects.create_user(
+            email="profiler@example.com", password="adminpass", role=Role.objects.get(name="Admin"),
+        )
+        cls.passenger = User.objects.create_user(email="curious@example.com", password="passpass")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.token = self.client.post("/api/core/admin/profiles/token/").data["token"]
+
+    def test_admin_request_is_profiled_and_downloadable(self):
+        response = self.client.get("/api/core/trips/", {"expand": "route"}, HTTP_X_PROFILE_TOKEN=self.token)
+        self.assertEqual(response.status_code, 200)
+        record = RequestProfile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual((record.view_name, record.status_code), ("core:trip-list-create", 200))
+        self.assertTrue(any("core_trip" in query["sql"] for query in record.queries))
+
+        detail = self.client.get(f"/api/core/admin/profiles/{record.pk}/")
+        self.assertIn("(dispatch)", detail.data["functions"])
+        self.assertEqual(self.client.get(f"/api/core/admin/profiles/{record.pk}/", {"sort": "x"}).status_code, 400)
+        self.assertEqual(detail.data["query_count"], record.query_count)
+        download = self.client.get(f"/api/core/admin/profiles/{record.pk}/download/")
+        with tempfile.NamedTemporaryFile(suffix=".prof") as handle:
+            handle.write(download.content)
+            handle.flush()
+            self.assertTrue(pstats.Stats(handle.name).total_calls)
+        listed = self.client.get("/api/core/admin/profiles/").data["results"]
+        self.assertEqual([row["profile_id"] for row in listed], [record.pk])
+
+    def test_token_in_query_string_works_too(self):
+        response = self.client.get("/api/core/routes/", {"profile_token": self.token})
+        self.assertTrue(RequestProfile.objects.filter(pk=response["X-Profile-Id"]).exists())
+
+    def test_requests_without_a_valid_token_or_admin_are_not_profiled(self):
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/core/trips/"))
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/core/trips/", HTTP_X_PROFILE_TOKEN=self.token + "x"))
+        # Someone else replaying the admin's token, or a non-admin's own token
+        other = APIClient()
+        other.force_authenticate(user=self.passenger)
+        self.assertNotIn("X-Profile-Id", other.get("/api/core/trips/", HTTP_X_PROFILE_TOKEN=self.token))
+        self.assertNotIn(
+            "X-Profile-Id", other.get("/api/core/trips/", HTTP_X_PROFILE_TOKEN=issue_token(self.passenger)),
+        )
+        self.assertEqual(other.post("/api/core/admin/profiles/token/").status_code, 403)
+        self.assertEqual(other.get("/api/core/admin/profiles/").status_code, 403)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_TOKEN_MAX_AGE=-1)
+    def test_expired_tokens_are_ignored(self):
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/core/trips/", HTTP_X_PROFILE_TOKEN=self.token))
+
+    @override_settings(PROFILE_MAX_STORED=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        ids = [int(self.client.get("/api/core/routes/", HTTP_X_PROFILE_TOKEN=self.token)["X-Profile-Id"]) for _ in range(3)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list("pk", flat=True)), ids[1:])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_middleware_leaves_the_stack(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+
+@override_settings(METRICS_TOKEN="s3cret")
+class MetricsTest(TestCase):
+    TRIPS = 'lightpath_http_requests_total{view="core:trip-list-create",method="GET",status="200"}'
+
+    @classmethod
+    def setUpTestData(cls):
+        make_trip(0)
+        cls.user = User.objects.create_user(email="scraped@example.com", password="scrapepass")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def scrape(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return response.content.decode()
+
+    @staticmethod
+    def sample(body, series):
+        for line in body.splitlines():
+            if line.startswith(series + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_requests_are_counted_per_url_name(self):
+        before = self.scrape()
+        self.client.get("/api/core/trips/")
+        self.client.get("/api/core/trips/")
+        body = self.scrape()
+        self.assertEqual(self.sample(body, self.TRIPS) - self.sample(before, self.TRIPS), 2)
+        bucket = 'lightpath_http_request_duration_seconds_bucket{view="core:trip-list-create",le="+Inf"}'
+        self.assertEqual(self.sample(body, bucket) - self.sample(before, bucket), 2)
+        queries = 'lightpath_db_queries_total{view="core:trip-list-create"}'
+        self.assertGreater(self.sample(body, queries), self.sample(before, queries))
+        self.assertIn("# TYPE lightpath_http_request_duration_seconds histogram", body)
+        self.client.get("/nowhere/")
+        self.assertIn('lightpath_http_requests_total{view="unmatched",method="GET",status="404"}', self.scrape())
+
+    def test_cache_weather_and_outbox_series(self):
+        before = self.scrape()
+        self.client.get("/api/core/routes/")
+        self.client.get("/api/core/routes/")
+        WeatherClient(StubWeatherBackend()).current("Accra")
+        enqueue_email("late@example.com", "Hello", "Body")
+        body = self.scrape()
+        for series, delta in (
+            ('lightpath_response_cache_requests_total{namespace="routes",result="miss"}', 1),
+            ('lightpath_response_cache_requests_total{namespace="routes",result="hit"}', 1),
+            ('lightpath_weather_cache_requests_total{result="miss"}', 1),
+            ('lightpath_weather_upstream_duration_seconds_count{operation="current",outcome="ok"}', 1),
+            ("lightpath_outbox_pending", 1),
+        ):
+            self.assertEqual(self.sample(body, series) - self.sample(before, series), delta, series)
+
+    def test_samples_from_other_workers_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.get("/api/core/trips/")
+            mine = self.sample(self.scrape(), self.TRIPS)
+            with open(os.path.join(directory, "999999.json"), "w", encoding="utf-8") as handle:
+                json.dump({"lightpath_http_requests_total": {
+                    json.dumps(["core:trip-list-create", "GET", "200"]): 5,
+                }}, handle)
+            self.assertEqual(self.sample(self.scrape(), self.TRIPS), mine + 5)
+            self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+
+    def test_token_guards_the_endpoint(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertIn("lightpath_http_requests_total", self.scrape())
+
+    @override_settings(METRICS_TOKEN="")
+    def test_endpoint_is_hidden_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(metrics._labels(("view",), ['a"b\\c']), '{view="a\\"b\\\\c"}')
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRouterTest(TransactionTestCase):
+    """Routing decisions; TransactionTestCase so reads are not inside a primary transaction."""
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(email="reader@example.com", password="readpass")
+
+    def route_reads(self, method, user=None):
+        request = getattr(RequestFactory(), method.lower())("/api/core/trips/")
+        request.user = user or self.user
+        token = activate_routing(request)
+        try:
+            return {model.__name__: self.router.db_for_read(model) for model in (Trip, Route, Bus, Weather, Booking)}
+        finally:
+            deactivate_routing(token)
+
+    def test_safe_catalog_reads_go_to_a_replica(self):
+        reads = self.route_reads("GET")
+        self.assertIn(reads.pop("Trip"), {"replica1", "replica2"})
+        self.assertTrue(set(reads.values()) - {None} <= {"replica1", "replica2"})
+        self.assertIsNone(reads["Booking"])
+
+    def test_one_replica_serves_the_whole_request(self):
+        request = RequestFactory().get("/api/core/routes/")
+        request.user = self.user
+        token = activate_routing(request)
+        try:
+            aliases = {self.router.db_for_read(model) for model in (Route, CollectionVersion) for _ in range(10)}
+            with use_primary():
+                self.assertIsNone(self.router.db_for_read(Route))
+            aliases.add(self.router.db_for_read(Trip))
+        finally:
+            deactivate_routing(token)
+        self.assertEqual(len(aliases), 1)
+        self.assertTrue(aliases <= {"replica1", "replica2"})
+
+    def test_response_cache_misses_are_read_from_the_primary(self):
+        # replica1/replica2 are not configured connections, so any read routed to them would fail
+        make_trip(0)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        for _ in range(2):
+            response = client.get("/api/core/trips/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response_cache.stats()["trips"]["hits"], 1)
+
+    def test_everything_else_uses_the_primary(self):
+        self.assertEqual(set(self.route_reads("POST").values()), {None})
+        self.assertIsNone(self.router.db_for_read(Trip))
+        self.assertEqual(self.router.db_for_write(Trip), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "core"))
+        self.assertIsNone(self.router.allow_migrate("default", "core"))
+
+    def test_writers_are_pinned_to_the_primary(self):
+        def write(request):
+            self.router.db_for_write(Route)
+            return HttpResponse(status=201)
+
+        middleware = ReplicaRoutingMiddleware(write)
+        request = RequestFactory().get("/api/core/routes/")
+        request.user = self.user
+        middleware(request)
+        self.assertIn(self.route_reads("GET")["Trip"], {"replica1", "replica2"})
+
+        request = RequestFactory().post("/api/core/routes/")
+        request.user = self.user
+        middleware(request)
+        self.assertIsNone(self.route_reads("GET")["Trip"])
+        other = User.objects.create_user(email="other-reader@example.com", password="readpass")
+        self.assertIsNotNone(self.route_reads("GET", user=other)["Trip"])
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_pinning_expires(self):
+        pin_to_primary(self.user)
+        self.assertIsNotNone(self.route_reads("GET")["Trip"])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_middleware_is_dropped_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(lambda request: None)
+
+
+@skipUnless("replica1" in settings.DATABASES, "set DATABASE_REPLICA_URLS to run against a replica alias")
+class ReplicaRoutingIntegrationTest(TransactionTestCase):
+    databases = {"default", "replica1"} & set(settings.DATABASES)
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        make_trip(0)
+        self.admin = User.objects.create_user(
+            email="replica-admin@example.com", password="adminpass", role=Role.objects.get(name="Admin"),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def replica_queries(self, *args, **kwargs):
+        with CaptureQueriesContext(connections["replica1"]) as replica:
+            response = kwargs.pop("method", self.client.get)(*args, **kwargs)
+        return response, [query["sql"] for query in replica.captured_queries]
+
+    def test_listings_read_from_the_replica_until_the_user_writes(self):
+        response, queries = self.replica_queries("/api/core/buses/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any("core_bus" in sql for sql in queries))
+        self.assertTrue(any("core_collectionversion" in sql for sql in queries))
+
+        response, queries = self.replica_queries(
+            "/api/core/routes/", {"name": "New", "start_point": "Osu", "end_point": "Tema"},
+            method=self.client.post, format="json",
+        )
+        self.assertEqual((response.status_code, queries), (201, []))
+        response, queries = self.replica_queries("/api/core/routes/")
+        self.assertEqual(queries, [])
+        self.assertIn("New", [route["name"] for route in response.data["results"]])
+
+    def test_response_cache_is_filled_from_the_primary(self):
+        response, queries = self.replica_queries("/api/core/trips/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("core_trip" in sql for sql in queries))
+        response, queries = self.replica_queries("/api/core/trips/")
+        self.assertEqual((response.status_code, queries), (200, []))
+        self.assertEqual(response_cache.stats()["trips"]["hits"], 1)
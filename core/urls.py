@@ -4,8 +4,8 @@ from .views import (
     BusListCreateView, BusRetrieveUpdateDestroyView,
     RouteListCreateView, RouteRetrieveUpdateDestroyView,
     AdminRouteListCreateView, WeatherRetrieveUpdateDestroyView,
-    TripListCreateView, TripRetrieveUpdateDestroyView,
-    BookingListCreateView, BookingRetrieveUpdateDestroyView,
+    TripListCreateView, TripRetrieveUpdateDestroyView, TripSeatsView,
+    BookingListCreateView, BookingRetrieveUpdateDestroyView, CheckoutView,
     TicketListCreateView, TicketRetrieveUpdateDestroyView,
     PaymentListCreateView, PaymentRetrieveUpdateDestroyView,
     ConductorListCreateView, ConductorRetrieveUpdateDestroyView,
@@ -34,14 +34,25 @@ urlpatterns = [
     path('routes/', RouteListCreateView.as_view(), name='routes-list-create'),
     path('routes/<int:pk>/', RouteRetrieveUpdateDestroyView.as_view(), name='routes-detail'),
     path('admin/routes/<int:pk>/', AdminRouteRetrieveUpdateDestroyView.as_view(), name='admin-route-detail'),
+    path('admin/provision/', views.provision_csv, name='admin-provision'),
+    path('admin/exports/<slug:kind>.<slug:extension>', views.export_records, name='admin-export'),
+    path('admin/analytics/revenue/', views.revenue_analytics, name='admin-revenue'),
+    path('admin/analytics/occupancy/', views.occupancy_analytics, name='admin-occupancy'),
+    path('admin/cache/', views.cache_stats, name='admin-cache-stats'),
+    path('admin/profiles/', views.profile_list, name='admin-profiles'),
+    path('admin/profiles/token/', views.profile_token, name='admin-profile-token'),
+    path('admin/profiles/<int:pk>/', views.profile_detail, name='admin-profile-detail'),
+    path('admin/profiles/<int:pk>/download/', views.profile_download, name='admin-profile-download'),
 
     # Trip
     path("trips/", TripListCreateView.as_view(), name="trip-list-create"),
     path("trips/<int:pk>/", TripRetrieveUpdateDestroyView.as_view(), name="trip-detail"),
+    path("trips/<int:pk>/seats/", TripSeatsView.as_view(), name="trip-seats"),
 
     # Booking
     path("bookings/", BookingListCreateView.as_view(), name="booking-list-create"),
     path("bookings/<int:pk>/", BookingRetrieveUpdateDestroyView.as_view(), name="booking-detail"),
+    path("checkout/", CheckoutView.as_view(), name="checkout"),
 
     # Ticket
     path("tickets/", TicketListCreateView.as_view(), name="ticket-list-create"),
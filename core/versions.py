@@ -0,0 +1,30 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CollectionVersion
+
+ROUTES = "routes"
+BUSES = "buses"
+WEATHER = "weather"
+
+
+def current(name):
+    """
+    (version, updated_at) of a collection, read from its single version
+    row. A plain read, so under core.db_routers it comes from the same
+    replica as the collection it validates.
+    """
+    try:
+        row = CollectionVersion.objects.get(name=name)
+    except CollectionVersion.DoesNotExist:
+        row, _ = CollectionVersion.objects.get_or_create(name=name)
+    return row.version, row.updated_at
+
+
+def bump(*names):
+    """Mark collections as changed; call in the writing transaction."""
+    now = timezone.now()
+    for name in names:
+        updated = CollectionVersion.objects.filter(name=name).update(version=F("version") + 1, updated_at=now)
+        if not updated:
+            CollectionVersion.objects.get_or_create(name=name, defaults={"updated_at": now})
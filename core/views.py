@@ -1,24 +1,45 @@
-from django.http import JsonResponse
+import hmac
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import generics, status, permissions
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from .services import get_current_weather
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
 from django.shortcuts import render
-from .models import Bus, Role, Route, Trip, Booking, Ticket, Payment, Conductor, Weather, Passenger
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from .models import (
+    Bus, Role, Route, Trip, Booking, Ticket, Payment, Conductor, Weather, Passenger, SeatInventory, RequestProfile,
+)
 from .serializers import (
     BusSerializer, RouteSerializer, TripSerializer,
     BookingSerializer, TicketSerializer, PaymentSerializer,
-    ConductorSerializer, WeatherSerializer
+    ConductorSerializer, WeatherSerializer, SeatInventorySerializer,
+    CheckoutSerializer, TripSearchSerializer
 )
 from .permissions import (
     IsAdmin, IsConductor, IsPassenger, IsOwnerOrAdmin,
-    IsAdminOrReadOnly, IsAdminOrConductorOrReadOnly
+    IsAdminOrReadOnly, IsAdminOrConductorOrReadOnly, _claim, _role_name
 )
+from .authentication import RoleRefreshToken
+from .provisioning import ProvisioningError, provision
+from .exports import EXPORTS, FORMATS, export_queryset, parse_bound, stream_rows
+from .analytics import occupancy_report, revenue_report
+from . import db_routers, profiling, response_cache, versions
+from .metrics import pool_gauges, render as render_metrics
+from .outbox import backlog as outbox_backlog
 
 User = get_user_model()
 
@@ -26,26 +47,38 @@ User = get_user_model()
 @permission_classes([AllowAny])
 def register(request):
     data = request.data
-    if User.objects.filter(email=data.get("email")).exists():
-        return Response({"error": "Email already exists"}, status=status.HTTP_400_BAD_REQUEST)
-    
+
     # Get the Role instance
     role_name = data.get("role", "passenger")
     try:
-        role_instance = Role.objects.get(name__iexact=role_name)
+        role_instance = Role.objects.get_cached(role_name)
     except Role.DoesNotExist:
         return Response({"error": f"Role '{role_name}' does not exist."}, status=400)
-    
-    user = User.objects.create(
-        email=data.get("email"),
-        password=make_password(data.get("password")),
-        role=role_instance
-    )
 
-    if role_instance.name.lower() == "passenger":
-        Passenger.objects.create(user=user)
+    email = User.objects.normalize_email((data.get("email") or "").strip())
+    try:
+        validate_email(email)
+    except DjangoValidationError:
+        return Response({"error": "A valid email is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    refresh = RefreshToken.for_user(user)
+    # The unique email constraint replaces a separate exists() check; the
+    # welcome email is queued in the same transaction (see core.signals).
+    try:
+        with transaction.atomic():
+            user = User.objects.create(
+                email=email,
+                password=make_password(data.get("password")),
+                role=role_instance
+            )
+            if role_instance.name.lower() == "passenger":
+                Passenger.objects.create(user=user)
+    except IntegrityError:
+        # Only a clash on the email is the client's fault; anything else is a server error
+        if User.objects.filter(email=email).exists():
+            return Response({"error": "Email already exists"}, status=status.HTTP_400_BAD_REQUEST)
+        raise
+
+    refresh = RoleRefreshToken.for_user(user)
 
     return Response({
         "message": "User registered successfully",
@@ -102,89 +135,246 @@ def profile(request):
 # Helper Mixins
 class RoleMixin:
     def get_role_name(self):
-        user = self.request.user
-        role = getattr(user, "role", None)
-        return getattr(role, "name", "").lower() if role else ""
+        return _role_name(self.request)
+
+    def get_passenger_id(self):
+        # Prefer the signed token claim; fall back to the profile relation
+        passenger_id = _claim(self.request, "passenger_id")
+        if passenger_id is None:
+            passenger = getattr(self.request.user, "passenger_profile", None)
+            passenger_id = passenger.pk if passenger else None
+        return passenger_id
+
+    def get_conductor_id(self):
+        conductor_id = _claim(self.request, "conductor_id")
+        if conductor_id is None:
+            conductor = getattr(self.request.user, "conductor_profile", None)
+            conductor_id = conductor.pk if conductor else None
+        return conductor_id
+
+
+def _csv_param(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+
+class SparseFieldsMixin:
+    """
+    Pass ``?fields=`` / ``?expand=`` to the serializer and join only the
+    related rows the requested shape renders.
+    """
+    def get_sparse_fields(self):
+        params = self.request.query_params
+        return {"fields": _csv_param(params.get("fields")), "expand": _csv_param(params.get("expand"))}
+
+    def get_serializer(self, *args, **kwargs):
+        for key, value in self.get_sparse_fields().items():
+            kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        related = self.get_serializer_class().select_related_for(**self.get_sparse_fields())
+        return queryset.select_related(*related) if related else queryset
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified for slowly-changing collections. Validators come
+    from the collection's version row (core.versions), so a 304 costs one
+    primary-key lookup and never touches the model table or serializer.
+    The row is read before the body and from the same database, so the
+    body is never older than the ETag it is sent with.
+    """
+    version_collection = None
+
+    def get(self, request, *args, **kwargs):
+        version, updated_at = versions.current(self.version_collection)
+        etag = quote_etag(f"{self.version_collection}-{version}-{request.accepted_renderer.format}")
+        last_modified = int(updated_at.timestamp())
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def _cache_scope(request):
+    # role_id is a column on the user, so scoping by role costs no query
+    return f"role-{getattr(request.user, 'role_id', None)}"
+
+
+class ResponseCacheMixin:
+    """
+    Serve GETs from the shared cache, keyed by query string and role.
+    Writes to the underlying models retire the namespace (core.signals).
+    A miss is read from the primary: a lagging replica would otherwise
+    refill the cache with rows from before the write that retired it.
+    """
+    cache_namespace = None
+
+    def get(self, request, *args, **kwargs):
+        key = response_cache.key_for(self.cache_namespace, request, scope=_cache_scope(request))
+        cached = response_cache.lookup(self.cache_namespace, key)
+        if cached is not None:
+            return Response(self.from_cache(cached))
+        with db_routers.use_primary():
+            response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.store(key, self.to_cache(response.data), timeout=self.get_cache_timeout())
+        return response
+
+    def to_cache(self, data):
+        return data
+
+    def from_cache(self, cached):
+        return cached
+
+    def get_cache_timeout(self):
+        """Seconds to keep this response; None for ``RESPONSE_CACHE_TTL``."""
+        return None
 
 
 # Bus Views (Admin only)
-class BusListCreateView(RoleMixin, generics.ListCreateAPIView):
+class BusListCreateView(RoleMixin, ConditionalGetMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Bus.objects.all()
     serializer_class = BusSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    version_collection = versions.BUSES
+    ordering = "bus_id"
 
 
-class BusRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class BusRetrieveUpdateDestroyView(RoleMixin, ConditionalGetMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Bus.objects.all()
     serializer_class = BusSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    version_collection = versions.BUSES
 
 
 # Route Views (Admins create; authenticated read)
-class AdminRouteListCreateView(generics.ListCreateAPIView):
+class AdminRouteListCreateView(ConditionalGetMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [permissions.IsAdminUser]
+    version_collection = versions.ROUTES
+    ordering = "route_id"
 
-class AdminRouteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class AdminRouteRetrieveUpdateDestroyView(ConditionalGetMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [permissions.IsAdminUser]
+    version_collection = versions.ROUTES
  
-class RouteListCreateView(RoleMixin, generics.ListCreateAPIView):
+class RouteListCreateView(RoleMixin, ConditionalGetMixin, ResponseCacheMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    version_collection = versions.ROUTES
+    cache_namespace = response_cache.ROUTES
+    ordering = "route_id"
 
 
-class RouteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class RouteRetrieveUpdateDestroyView(ConditionalGetMixin, ResponseCacheMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    version_collection = versions.ROUTES
+    cache_namespace = response_cache.ROUTES
 
 
 # Trip Views (Admin or Conductor can manage; auth can read)
-class TripListCreateView(RoleMixin, generics.ListCreateAPIView):
+class TripListCreateView(RoleMixin, ResponseCacheMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Trip.objects.all()
     serializer_class = TripSerializer
     permission_classes = [IsAuthenticated, IsAdminOrConductorOrReadOnly]
+    cache_namespace = response_cache.TRIPS
+    ordering = ("start_time", "trip_id")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != "GET":
+            return queryset
+        # ?from=&to=&depart_after=&depart_before=&has_seats=
+        search = TripSearchSerializer(data=self.request.query_params.dict())
+        search.is_valid(raise_exception=True)
+        filters = dict(search.validated_data)
+        has_seats = filters.pop("has_seats", None)
+        queryset = queryset.filter(**filters)
+        if has_seats is not None:
+            seats_left = Q(seat_inventory__seats_sold__lt=F("seat_inventory__capacity"))
+            queryset = queryset.filter(seats_left if has_seats else ~seats_left)
+        return queryset
+
+    # Seat counts change with every sale, so they are not part of the cached
+    # body: each hit overlays them from the inventory rows of the page.
+    def to_cache(self, data):
+        return {"body": data, "trip_ids": [trip.pk for trip in getattr(self.paginator, "page", None) or ()]}
+
+    def from_cache(self, cached):
+        body, trip_ids = cached["body"], cached["trip_ids"]
+        results = body.get("results", ()) if isinstance(body, dict) else body
+        if trip_ids and results and "remaining_seats" in results[0]:
+            remaining = {
+                trip_id: capacity - sold
+                for trip_id, capacity, sold in SeatInventory.objects.filter(trip_id__in=trip_ids)
+                .values_list("trip_id", "capacity", "seats_sold")
+            }
+            for trip_id, item in zip(trip_ids, results):
+                item["remaining_seats"] = remaining.get(trip_id)
+        return body
+
+    def get_cache_timeout(self):
+        # Which trips match ?has_seats= moves with sales, not with trip edits.
+        if "has_seats" in self.request.query_params:
+            return settings.RESPONSE_CACHE_SEATS_TTL
+        return None
 
     def perform_create(self, serializer):
-        user = self.request.user
-        role = getattr(user, "role", None)
-        role_name = getattr(role, "name", "").lower() if role else ""
+        role_name = self.get_role_name()
         if role_name == "admin":
             serializer.save()
         elif role_name == "conductor":
-            conductor_profile = getattr(user, "conductor_profile", None)
-            if not conductor_profile:
+            conductor_id = self.get_conductor_id()
+            if not conductor_id:
                 raise PermissionDenied("Conductor profile not found for this user.")
             # ensure conductor cannot assign trips to someone else
-            serializer.save(conductor=conductor_profile)
+            serializer.validated_data.pop("conductor", None)
+            serializer.save(conductor_id=conductor_id)
         else:
             raise PermissionDenied("Only Admins or Conductors can create trips.")
 
 
-class TripRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class TripRetrieveUpdateDestroyView(RoleMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Trip.objects.all()
     serializer_class = TripSerializer
     permission_classes = [IsAuthenticated, IsAdminOrConductorOrReadOnly]
 
 
+class TripSeatsView(generics.RetrieveAPIView):
+    """Seat map for a trip, read from its inventory row rather than its tickets."""
+    queryset = SeatInventory.objects.all()
+    serializer_class = SeatInventorySerializer
+    permission_classes = [IsAuthenticated]
+
+
 # Booking Views (Passengers)
-class BookingListCreateView(RoleMixin, generics.ListCreateAPIView):
+class BookingListCreateView(RoleMixin, SparseFieldsMixin, generics.ListCreateAPIView):
+    queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    ordering = "-booking_id"
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Booking.objects.all()
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Booking.objects.filter(passenger=passenger)
-        return Booking.objects.none()
+            return queryset
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(passenger_id=passenger_id)
+        return queryset.none()
 
     def perform_create(self, serializer):
         role_name = self.get_role_name()
@@ -198,41 +388,58 @@ class BookingListCreateView(RoleMixin, generics.ListCreateAPIView):
             serializer.save(passenger=passenger)
 
 
-class BookingRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class BookingRetrieveUpdateDestroyView(RoleMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Booking.objects.all()
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Booking.objects.filter(passenger=passenger)
-        return Booking.objects.none()
+            return queryset
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(passenger_id=passenger_id)
+        return queryset.none()
+
+
+# Checkout (Passengers): booking + tickets + payment in one round trip
+class CheckoutView(generics.CreateAPIView):
+    serializer_class = CheckoutSerializer
+    permission_classes = [IsAuthenticated, IsPassenger]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        passenger = getattr(self.request.user, "passenger_profile", None)
+        if not passenger:
+            raise PermissionDenied("Only passengers can check out.")
+        context["passenger"] = passenger
+        return context
 
 
 # Ticket Views
-class TicketListCreateView(RoleMixin, generics.ListCreateAPIView):
+class TicketListCreateView(RoleMixin, SparseFieldsMixin, generics.ListCreateAPIView):
+    queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = [IsAuthenticated]
+    ordering = "-ticket_id"
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Ticket.objects.all()
+            return queryset
         if role_name == "conductor":
-            conductor = getattr(user, "conductor_profile", None)
-            if conductor:
-                return Ticket.objects.filter(booking__trip__conductor=conductor)
-            return Ticket.objects.none()
+            conductor_id = self.get_conductor_id()
+            if conductor_id:
+                return queryset.filter(booking__trip__conductor_id=conductor_id)
+            return queryset.none()
         # passenger
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Ticket.objects.filter(booking__passenger=passenger)
-        return Ticket.objects.none()
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(booking__passenger_id=passenger_id)
+        return queryset.none()
 
     def perform_create(self, serializer):
         role_name = self.get_role_name()
@@ -249,40 +456,43 @@ class TicketListCreateView(RoleMixin, generics.ListCreateAPIView):
             raise PermissionDenied("You do not have permission to create tickets.")
 
 
-class TicketRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class TicketRetrieveUpdateDestroyView(RoleMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Ticket.objects.all()
+            return queryset
         if role_name == "conductor":
-            conductor = getattr(user, "conductor_profile", None)
-            if conductor:
-                return Ticket.objects.filter(booking__trip__conductor=conductor)
-            return Ticket.objects.none()
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Ticket.objects.filter(booking__passenger=passenger)
-        return Ticket.objects.none()
+            conductor_id = self.get_conductor_id()
+            if conductor_id:
+                return queryset.filter(booking__trip__conductor_id=conductor_id)
+            return queryset.none()
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(booking__passenger_id=passenger_id)
+        return queryset.none()
 
 
 # Payment Views
-class PaymentListCreateView(RoleMixin, generics.ListCreateAPIView):
+class PaymentListCreateView(RoleMixin, SparseFieldsMixin, generics.ListCreateAPIView):
+    queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    ordering = "-payment_id"
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Payment.objects.all()
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Payment.objects.filter(booking__passenger=passenger)
-        return Payment.objects.none()
+            return queryset
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(booking__passenger_id=passenger_id)
+        return queryset.none()
 
     def perform_create(self, serializer):
         role_name = self.get_role_name()
@@ -298,49 +508,188 @@ class PaymentListCreateView(RoleMixin, generics.ListCreateAPIView):
         raise PermissionDenied("You do not have permission to create payments.")
 
 
-class PaymentRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class PaymentRetrieveUpdateDestroyView(RoleMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         role_name = self.get_role_name()
-        user = self.request.user
         if role_name == "admin":
-            return Payment.objects.all()
-        passenger = getattr(user, "passenger_profile", None)
-        if passenger:
-            return Payment.objects.filter(booking__passenger=passenger)
-        return Payment.objects.none()
+            return queryset
+        passenger_id = self.get_passenger_id()
+        if passenger_id:
+            return queryset.filter(booking__passenger_id=passenger_id)
+        return queryset.none()
 
 
 # Conductor Views (Admin-managed)
-class ConductorListCreateView(RoleMixin, generics.ListCreateAPIView):
+class ConductorListCreateView(RoleMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Conductor.objects.all()
     serializer_class = ConductorSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    ordering = "conductor_id"
 
 
-class ConductorRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class ConductorRetrieveUpdateDestroyView(RoleMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Conductor.objects.all()
     serializer_class = ConductorSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
 
 
 # Weather Views (Admin-managed)
-class WeatherListCreateView(RoleMixin, generics.ListCreateAPIView):
+class WeatherListCreateView(RoleMixin, ConditionalGetMixin, SparseFieldsMixin, generics.ListCreateAPIView):
     queryset = Weather.objects.all()
     serializer_class = WeatherSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    version_collection = versions.WEATHER
+    ordering = "weather_id"
 
 
-class WeatherRetrieveUpdateDestroyView(RoleMixin, generics.RetrieveUpdateDestroyAPIView):
+class WeatherRetrieveUpdateDestroyView(RoleMixin, ConditionalGetMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Weather.objects.all()
     serializer_class = WeatherSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    version_collection = versions.WEATHER
+
+# Bulk provisioning (Admin): multipart upload of conductors/buses/routes CSVs
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdmin])
+@parser_classes([MultiPartParser])
+def provision_csv(request):
+    files = {name: request.FILES.get(name) for name in ("conductors", "buses", "routes")}
+    if not any(files.values()):
+        return Response(
+            {"error": "Upload at least one of conductors, buses or routes."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        report = provision(
+            **files,
+            dry_run=request.query_params.get("dry_run") in ("1", "true"),
+            requested_by=request.user,
+        )
+    except ProvisioningError as e:
+        return Response({"error": str(e), "rows": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report, status=status.HTTP_201_CREATED)
+
+
+# Finance exports (Admin): streamed CSV/NDJSON, filtered by date range and status
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def export_records(request, kind, extension):
+    if kind not in EXPORTS or extension not in FORMATS:
+        return Response({"error": "Unknown export."}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        rows = export_queryset(
+            kind,
+            since=parse_bound(request.query_params.get("since")),
+            until=parse_bound(request.query_params.get("until"), end=True),
+            status=request.query_params.get("status"),
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(stream_rows(kind, rows, extension), content_type=FORMATS[extension])
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{extension}"'
+    return response
+
+
+# Analytics (Admin): read from the rollups, so cost follows days/trips, not payments
+def _date_range(request):
+    bounds = []
+    for name in ("since", "until"):
+        value = request.query_params.get(name)
+        day = parse_date(value) if value else None
+        if value and day is None:
+            raise ValueError(f"Invalid date for {name}: {value}")
+        bounds.append(day)
+    return bounds
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def revenue_analytics(request):
+    try:
+        since, until = _date_range(request)
+        rows = list(revenue_report(
+            since=since, until=until,
+            route_id=request.query_params.get("route"), status=request.query_params.get("status"),
+        ))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"results": rows})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def occupancy_analytics(request):
+    try:
+        since, until = _date_range(request)
+        rows = list(occupancy_report(since=since, until=until, bus_id=request.query_params.get("bus")))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"results": rows})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def cache_stats(request):
+    return Response(response_cache.stats())
+
+
+# On-demand profiling (Admin): a token turns on cProfile + SQL capture for the admin's own requests
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def profile_token(request):
+    return Response({
+        "token": profiling.issue_token(request.user),
+        "header": profiling.TOKEN_HEADER,
+        "query_param": profiling.TOKEN_PARAM,
+        "expires_in": settings.PROFILE_TOKEN_MAX_AGE,
+    }, status=status.HTTP_201_CREATED)
+
+
+_PROFILE_FIELDS = ("profile_id", "created_at", "method", "path", "view_name", "status_code", "duration_ms", "query_count")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def profile_list(request):
+    return Response({"results": list(RequestProfile.objects.values(*_PROFILE_FIELDS))})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def profile_detail(request, pk):
+    record = RequestProfile.objects.filter(pk=pk).first()
+    if record is None:
+        return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+    sort = request.query_params.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "calls"):
+        return Response({"error": "sort must be cumulative, tottime or calls."}, status=status.HTTP_400_BAD_REQUEST)
+    data = {name: getattr(record, name) for name in _PROFILE_FIELDS}
+    data.update(functions=profiling.top_functions(record, sort=sort), queries=record.queries)
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def profile_download(request, pk):
+    record = RequestProfile.objects.filter(pk=pk).first()
+    if record is None:
+        return Response({"error": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+    response = HttpResponse(bytes(record.stats), content_type="application/octet-stream")
+    response["Content-Disposition"] = f'attachment; filename="profile-{record.pk}.prof"'
+    return response
+
 
 @api_view(['GET'])
 def current_weather(request):
     city = request.GET.get('city', 'Accra')
+    key = response_cache.key_for(response_cache.CURRENT_WEATHER, request, scope=_cache_scope(request))
+    cached = response_cache.lookup(response_cache.CURRENT_WEATHER, key)
+    if cached is not None:
+        return Response(cached)
     try:
         data = get_current_weather(city)
         result = {
@@ -351,7 +700,10 @@ def current_weather(request):
             "weather": data["weather"][0]["description"],
             "wind_speed": data["wind"]["speed"]
         }
+        response_cache.store(key, result, timeout=getattr(settings, "WEATHER_CACHE_TTL", 600))
         return Response(result)
+    except requests.RequestException as e:
+        return Response({"error": f"Weather service unavailable: {e}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
         return Response({"error": str(e)}, status=400)
     
@@ -363,13 +715,37 @@ def core_root(request):
             "buses": "/api/core/buses/",
             "routes": "/api/core/routes/",
             "trips": "/api/core/trips/",
+            "trip_seats": "/api/core/trips/<id>/seats/",
             "bookings": "/api/core/bookings/",
+            "checkout": "/api/core/checkout/",
             "tickets": "/api/core/tickets/",
             "payments": "/api/core/payments/",
             "conductors": "/api/core/conductors/",
-            "weather": "/api/core/weather/"
+            "weather": "/api/core/weather/",
+            "admin_provision": "/api/core/admin/provision/",
+            "admin_exports": "/api/core/admin/exports/<bookings|tickets|payments>.<csv|ndjson>",
+            "admin_revenue": "/api/core/admin/analytics/revenue/",
+            "admin_occupancy": "/api/core/admin/analytics/occupancy/",
+            "admin_cache_stats": "/api/core/admin/cache/"
         }
     })
 
+def metrics(request):
+    """Prometheus scrape target; 404 unless ``METRICS_TOKEN`` is set, then requires it as a Bearer token."""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    queue = outbox_backlog()
+    body = render_metrics(gauges=(
+        ("lightpath_outbox_pending", "Queued emails waiting to be sent.", queue["pending"]),
+        ("lightpath_outbox_oldest_pending_seconds", "Age of the oldest queued email.", queue["oldest_pending_seconds"]),
+        ("lightpath_outbox_failed", "Queued emails given up on after repeated failures.", queue["failed"]),
+        *pool_gauges(),
+    ))
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 def home(request):
     return render(request, "index.html", {})
\ No newline at end of file
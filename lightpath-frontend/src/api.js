@@ -64,11 +64,11 @@ export const login = async (email, password) => {
 };
 
 // Bus-related API calls
-export const getBuses = () => get("buses");
+export const getBuses = () => get("buses?expand=conductor");
 
 // Trip-related API calls
 export const getTrips = (busId) => {
-  const endpoint = busId ? `trips?bus=${busId}` : "trips";
+  const endpoint = busId ? `trips?expand=route&bus=${busId}` : "trips?expand=route";
   return get(endpoint);
 };
 